@@ -1,14 +1,22 @@
 import os
 import sys
 import json
-from dotenv import load_dotenv
-from label_studio_sdk import LabelStudio
-
-# Carga variables de entorno
-load_dotenv()
-
-LABEL_STUDIO_URL = os.getenv('LABEL_STUDIO_URL')
-LABEL_STUDIO_LEGACY_API_KEY = os.getenv('LABEL_STUDIO_LEGACY_API_KEY')
+from ls_client import get_client, list_projects, require_credentials
+from task_sources import DEFAULT_BATCH_SIZE, TaskSource, TaskSourceError
+from import_journal import ImportJournal
+from task_import import (
+    IMPORT_CONCURRENCY, IMPORT_MAX_RETRIES, BatchPlanner, dead_letter_path, import_tasks_in_batches
+)
+from task_dedup import dedup_review_path, load_project_fingerprints
+from task_pages import fetch_task_page
+from task_preannotate import preannotate_source
+from task_upsert import UPSERT_CONCURRENCY, UPSERT_KEY, upsert_tasks
+
+# Omitir las filas cuyo data ya existe en el proyecto (IMPORT_DEDUP=0 para desactivar)
+IMPORT_DEDUP = os.getenv('IMPORT_DEDUP', '1') != '0'
+# Agregar predictions del gazetteer de spans ya etiquetados: PREANNOTATE=1 siempre,
+# PREANNOTATE=0 nunca; sin definir se pregunta al crear tasks (por defecto no)
+PREANNOTATE = os.getenv('PREANNOTATE', '').strip()
 
 # Definir rutas base
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -16,12 +24,10 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 PROJECTS_DIR = os.path.join(BASE_DIR, 'projects')
 PROJECTS_JSON_PATH = os.path.join(PROJECTS_DIR, 'projects_index.json')
 
-if not LABEL_STUDIO_URL or not LABEL_STUDIO_LEGACY_API_KEY:
-    print("❌ Error: LABEL_STUDIO_URL y LABEL_STUDIO_LEGACY_API_KEY deben estar definidos en .env")
-    sys.exit(1)
+require_credentials()
 
-# Instancia cliente
-client = LabelStudio(base_url=LABEL_STUDIO_URL, api_key=LABEL_STUDIO_LEGACY_API_KEY)
+# Cliente compartido (pool de conexiones, se crea en el primer uso)
+client = get_client()
 
 # Cargar configuración de proyectos
 try:
@@ -33,7 +39,7 @@ except Exception as e:
 
 # Obtener proyectos existentes
 try:
-    existing_projects = client.projects.list()
+    existing_projects = list_projects(fresh=True)
     existing_projects_map = {p.title: p for p in existing_projects}
 except Exception as e:
     print(f"❌ Error obteniendo proyectos existentes: {e}")
@@ -85,19 +91,18 @@ else:
 print(f"\n✅ Proyecto seleccionado: '{selected_project_title}' (ID: {project_id})")
 print(f"ℹ️ Archivo de datos: '{data_file_path}'")
 
-if not os.path.isfile(data_file_path):
+if not os.path.isfile(data_file_path) and not os.path.isdir(data_file_path):
     print(f"❌ Error: No se encontró el archivo de datos en la ruta especificada: {data_file_path}")
     sys.exit(1)
 
 # Verificar si el proyecto tiene tasks existentes
 try:
-    tasks_pager = client.tasks.list(project=project_id, page_size=1)
-    has_existing_tasks = next(iter(tasks_pager), None) is not None
+    has_existing_tasks = bool(fetch_task_page(client, project_id, 1, page_size=1, include='id'))
 
     if has_existing_tasks:
         print("\n⚠️ ADVERTENCIA: Este proyecto ya tiene tasks existentes.")
-        print("1. Crear nuevas tasks (puede duplicar datos)")
-        print("2. Actualizar tasks existentes (requiere que el número de tasks coincida)")
+        print("1. Crear nuevas tasks (omite las que ya existen; permite reanudar una importación cortada)")
+        print("2. Sincronizar tasks existentes (actualiza las que cambiaron y crea las que faltan)")
         print("3. Cancelar")
 
         while True:
@@ -120,117 +125,136 @@ if action_choice == 3:
     print("ℹ️ Operación cancelada por el usuario.")
     sys.exit(0)
 
-# Cargar datos
+# Cargar datos (en streaming: nunca se mantiene el archivo completo en memoria)
 try:
     # Añadir una verificación explícita para archivos vacíos, que son una causa común de JSONDecodeError
-    if os.path.getsize(data_file_path) == 0:
+    if os.path.isfile(data_file_path) and os.path.getsize(data_file_path) == 0:
         print(f"❌ Error: El archivo de datos está vacío (0 bytes): {data_file_path}. No se pueden importar tasks.")
         sys.exit(1)
 
-    with open(data_file_path, 'r', encoding='utf-8') as f:
-        tasks_data = json.load(f)
-
-    if not isinstance(tasks_data, list):
-        print(f"❌ Error: El archivo de datos debe contener una lista de tasks (e.g., [...]): {data_file_path}")
-        sys.exit(1)
-
-    if not tasks_data: # Esto significa que es una lista vacía
-        print(f"⚠️ Advertencia: El archivo de datos contiene una lista vacía de tasks: {data_file_path}. No hay tasks para procesar.")
-        sys.exit(0) # Salir de forma controlada si la lista está vacía
+    source = TaskSource(data_file_path)
+    batch_size = DEFAULT_BATCH_SIZE
 
-    total_tasks = len(tasks_data)
-    batch_size = max(1, total_tasks // 20)  # 5% del total
-
-    print(f"\n📦 Total de tasks a procesar: {total_tasks}")
-    print(f"ℹ️ Tamaño de lote para importación: {batch_size}")
+    print(f"\n📦 Leyendo tasks en streaming ({source.format.upper()}, {source.size:,} bytes)")
 
     if action_choice == 1:
         # CREAR NUEVAS TASKS
-        print("🚀 Creando nuevas tasks...")
-        created_count = 0
-
-        for i in range(0, total_tasks, batch_size):
-            batch = tasks_data[i:i + batch_size]
+        # El journal registra los lotes confirmados para poder reanudar si se corta
+        journal = ImportJournal(DATA_DIR, project_id, data_file_path)
+        if journal.completed:
+            print("\n⚠️ Este archivo ya se importó completo a este proyecto.")
+            if input("¿Importarlo de nuevo de todas formas? (s/n): ").strip().lower() != 's':
+                print("ℹ️ Operación cancelada por el usuario.")
+                sys.exit(0)
+            journal.start()
+        elif journal.committed_count:
+            print(f"\n🔁 Importación previa incompleta: {journal.committed_count} tasks ya confirmadas en este proyecto.")
+            if input("¿Reanudar y enviar solo las que faltan? (s/n): ").strip().lower() == 's':
+                print("▶️ Reanudando importación...")
+            else:
+                journal.start()
+        else:
+            journal.start()
+
+        dedup = None
+        if IMPORT_DEDUP:
+            print("🔍 Leyendo las tasks existentes para descartar duplicados...")
+            dedup = load_project_fingerprints(client, project_id, review_path=dedup_review_path(DATA_DIR, project_id))
+            print(f"  ✅ {dedup.existing} tasks existentes ({dedup.kind}, ~{dedup.memory_bytes / 1024 / 1024:.1f} MB)")
+
+        preannotated = None
+        use_preannotation = PREANNOTATE == '1'
+        if not PREANNOTATE:
+            answer = input("¿Agregar pre-anotaciones del gazetteer (predictions)? (s/n) [n]: ")
+            use_preannotation = answer.strip().lower() == 's'
+        if use_preannotation:
             try:
-                result = client.projects.import_tasks(id=project_id, request=batch)
-                created_count += len(batch)
-                progress = (created_count / total_tasks) * 100
-                print(f"  ✅ Lote {i//batch_size + 1}: {len(batch)} tasks importadas. Progreso: {created_count}/{total_tasks} ({progress:.1f}%)")
+                label_config = client.projects.get(id=project_id).label_config
+                preannotated = preannotate_source(source, label_config)
             except Exception as e:
-                print(f"  ❌ Error en lote {i//batch_size + 1}: {e}")
-                # Continuar con el siguiente lote incluso si uno falla
-                continue
+                print(f"⚠️ Sin pre-anotación: {e}")
+            if preannotated:
+                source = preannotated
 
-        print(f"✅ Se crearon {created_count} nuevas tasks en el proyecto '{selected_project_title}'.")
+        planner = BatchPlanner(initial_tasks=batch_size)
+        print(f"ℹ️ Lotes adaptativos: {planner.batch_tasks} tasks iniciales, máx. {planner.max_bytes / 1024 / 1024:.1f} MB por lote")
+        print(f"ℹ️ Lotes en vuelo: {IMPORT_CONCURRENCY}, reintentos por lote: {IMPORT_MAX_RETRIES}")
+        print("🚀 Creando nuevas tasks...")
+        stats = import_tasks_in_batches(client, project_id, source, planner,
+                                        dead_letter_path=dead_letter_path(DATA_DIR, project_id),
+                                        journal=journal, task_filter=dedup)
+
+        if stats['skipped']:
+            print(f"⏭️ Se omitieron {stats['skipped']} tasks ya importadas en la corrida anterior.")
+        if dedup:
+            dedup.close()
+            if dedup.duplicates:
+                print(f"♻️ Se descartaron {dedup.duplicates} tasks cuyo data ya existe en el proyecto.")
+            if dedup.repeated:
+                print(f"♻️ Se descartaron {dedup.repeated} filas repetidas dentro del archivo (IMPORT_DEDUP_WITHIN_FILE=1).")
+            if dedup.reviewed:
+                print(f"🔎 Filtro de Bloom: las {dedup.reviewed} filas descartadas quedaron en {dedup.review_path} "
+                      f"(revísalas; si alguna es nueva, reimpórtala con IMPORT_DEDUP=0)")
+        if stats['read'] == 0:
+            print(f"⚠️ Advertencia: El archivo de datos contiene una lista vacía de tasks: {data_file_path}. No hay tasks para procesar.")
+            sys.exit(0)
+
+        print(f"✅ Se crearon {stats['imported']}/{stats['read']} nuevas tasks en el proyecto '{selected_project_title}' "
+              f"en {stats['seconds']:.1f}s ({stats['imported'] / max(stats['seconds'], 1e-9):.0f} tasks/s).")
+        if preannotated:
+            print(f"🏷️ {preannotated.annotated} tasks del archivo con pre-anotaciones ({preannotated.regions} regiones).")
+        if stats['failed']:
+            print(f"⚠️ {stats['failed']} tasks fallaron tras {IMPORT_MAX_RETRIES} reintentos; quedaron en: {stats['dead_letter_path']}")
         # Mostrar un resumen (head) de las primeras 2 tasks creadas
         print("\n📋 Ejemplo de tasks agregadas (head):")
-        head_num = min(2, len(tasks_data))
-        for idx in range(head_num):
+        for idx, task in enumerate(stats['head']):
             print(f"Task {idx+1}:")
-            print(json.dumps(tasks_data[idx], ensure_ascii=False, indent=2))
+            print(json.dumps(task, ensure_ascii=False, indent=2))
             print('-'*32)
 
     elif action_choice == 2:
-        # ACTUALIZAR TASKS EXISTENTES
-        print("🔄 Actualizando tasks existentes...")
-
-        # Obtener todas las tasks existentes
-        existing_tasks = list(client.tasks.list(project=project_id))
-        existing_tasks_map = {task.id: task for task in existing_tasks}
-
-        print(f"🔍 Tasks existentes encontradas en Label Studio: {len(existing_tasks)}")
-
-        if len(existing_tasks) != len(tasks_data):
-            print(f"⚠️ ADVERTENCIA: El número de tasks en el archivo ({len(tasks_data)}) no coincide con las existentes en Label Studio ({len(existing_tasks)}).")
-            confirm = input("¿Continuar con la actualización (puede llevar a errores si las IDs no coinciden)? (s/N): ").strip().lower()
-            if confirm != 's':
-                print("ℹ️ Operación de actualización cancelada por el usuario.")
-                sys.exit(0)
-
-        updated_count = 0
-        # La lógica actual asume una correspondencia 1:1 y ordenada entre tasks_data y existing_tasks.
-        # Si tasks_data no contiene IDs de tasks para mapear, esta lógica es frágil.
-        existing_task_ids = list(existing_tasks_map.keys())
-
-        for i in range(0, total_tasks, batch_size):
-            batch = tasks_data[i:i + batch_size]
-
-            for task_index, task_data in enumerate(batch):
-                if (i + task_index) < len(existing_task_ids):
-                    task_id_to_update = existing_task_ids[i + task_index]
-                    try:
-                        # Actualizar task existente
-                        client.tasks.update(id=task_id_to_update, data=task_data)
-                        updated_count += 1
-                    except Exception as e:
-                        print(f"  ❌ Error actualizando task {task_id_to_update}: {e}")
-                        continue
-                else:
-                    print(f"  ⚠️ Advertencia: No hay task existente correspondiente para el índice {i + task_index}. Saltando.")
-                    continue
-
-            progress = (min(i + batch_size, total_tasks) / total_tasks) * 100
-            print(f"  ✅ Lote {i//batch_size + 1}: Progreso: {min(i + batch_size, total_tasks)}/{total_tasks} tasks ({progress:.1f}%)")
-
-        print(f"✅ Se actualizaron {updated_count} tasks existentes en el proyecto '{selected_project_title}'.")
+        # SINCRONIZAR TASKS EXISTENTES (upsert por clave natural o hash de contenido)
+        upsert_key = selected_project_info.get("key") or UPSERT_KEY
+        if upsert_key:
+            print(f"ℹ️ Las filas se emparejan con las tasks por la clave: {upsert_key}")
+        else:
+            print("ℹ️ Sin 'key' en projects_index.json ni UPSERT_KEY: se emparejará por hash del contenido")
+            print("   (solo se crearán las filas que no existan; no se pueden detectar modificaciones)")
+        print(f"🔄 Sincronizando tasks existentes ({UPSERT_CONCURRENCY} actualizaciones en paralelo)...")
+
+        stats = upsert_tasks(client, project_id, source, key=upsert_key,
+                             dead_letter_path=dead_letter_path(DATA_DIR, project_id))
+
+        if stats['read'] == 0:
+            print(f"⚠️ Advertencia: El archivo de datos contiene una lista vacía de tasks: {data_file_path}. No hay tasks para procesar.")
+            sys.exit(0)
+
+        print(f"✅ Sincronización de '{selected_project_title}' completada en {stats['seconds']:.1f}s:")
+        print(f"   Filas leídas:     {stats['read']}")
+        print(f"   Sin cambios:      {stats['unchanged']}")
+        print(f"   Actualizadas:     {stats['updated']}")
+        print(f"   Creadas:          {stats['created']}")
+        if stats['failed']:
+            print(f"   ❌ Con error:      {stats['failed']}")
+        if stats['missing_key']:
+            print(f"   ⚠️ Sin la clave '{upsert_key}': {stats['missing_key']} (omitidas)")
+        if stats['repeated_in_file']:
+            print(f"   ⚠️ Clave repetida en el archivo: {stats['repeated_in_file']} (se usó la primera)")
+        if stats['not_in_file']:
+            print(f"   ℹ️ Tasks del proyecto que no están en el archivo: {stats['not_in_file']} (no se modifican)")
         # Mostrar un resumen (head) de las primeras 2 tasks del archivo
-        print("\n📋 Ejemplo de tasks actualizadas (head):")
-        head_num = min(2, len(tasks_data))
-        for idx in range(head_num):
+        print("\n📋 Ejemplo de tasks del archivo (head):")
+        for idx, task in enumerate(stats['head']):
             print(f"Task {idx+1}:")
-            print(json.dumps(tasks_data[idx], ensure_ascii=False, indent=2))
+            print(json.dumps(task, ensure_ascii=False, indent=2))
             print('-'*32)
 
-except json.JSONDecodeError as e:
-    error_message = str(e)
-    if "Expecting value: line 1 column 1 (char 0)" in error_message:
-        print(f"❌ Error: El archivo de datos '{data_file_path}' parece estar vacío o no contiene JSON válido al inicio.")
-        print("   Por favor, verifica que el archivo no esté vacío y que su contenido sea un JSON bien formado.")
-    else:
-        print(f"❌ Error decodificando JSON en {data_file_path}: {e}")
+except TaskSourceError as e:
+    print(f"❌ Error: {e}")
+    print("   Por favor, verifica que el archivo no esté vacío y que su contenido sea un JSON (o JSONL) bien formado.")
     sys.exit(1)
 except Exception as e:
     print(f"❌ Error inesperado al procesar tasks: {e}")
     sys.exit(1)
 
-print("🎉 Proceso completado!")
\ No newline at end of file
+print("🎉 Proceso completado!")
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Acuerdo entre anotadores y distribución de etiquetas de un snapshot.
+
+Las regiones se cargan (desde el JSON exportado o desde su versión columnar)
+a arreglos NumPy: tarea, anotador, offsets y códigos de etiqueta. Todas las
+métricas se calculan con operaciones vectorizadas sobre esos arreglos:
+
+    - Fleiss kappa global y por etiqueta (unidades = spans marcados por
+      alguno de los anotadores de la task; "ninguna" si un anotador no lo marcó)
+    - Cohen kappa por par de anotadores, global y por etiqueta
+    - F1 de spans entre pares de anotadores (coincidencia exacta y por solapamiento)
+    - Fleiss kappa de cada atributo de región (preparation_state, cooking_method, ...)
+    - Tablas de frecuencia de etiquetas y choices, por anotador
+
+Uso:
+    python3 annotation_agreement.py <snapshot.json[.gz] | dir columnar> [--json salida.json]
+"""
+
+import os
+import sys
+import json
+import time
+from itertools import combinations
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from export_columnar import SCHEMAS, empty_columns, flatten_task, iter_export_tasks, read_table
+
+
+# Columnas necesarias de cada tabla (el resto no se lee del formato columnar)
+COLUMNS = {
+    'annotations': ('annotation_id', 'task_id', 'completed_by', 'was_cancelled'),
+    'regions': ('annotation_id', 'task_id', 'completed_by', 'region_id', 'label',
+                'start_offset', 'end_offset', 'global_start', 'global_end'),
+    'region_choices': ('annotation_id', 'region_id', 'from_name', 'choice'),
+}
+
+
+def as_numpy(name, values):
+    """Columna a arreglo NumPy: enteros con -1 para nulos, booleanos con False, texto como object"""
+    field_type = SCHEMAS[name[0]].field(name[1]).type
+    if pa.types.is_integer(field_type):
+        if isinstance(values, pa.ChunkedArray):
+            return pc.fill_null(values, -1).to_numpy().astype(np.int64)
+        return np.array([-1 if value is None else value for value in values], dtype=np.int64)
+    if pa.types.is_boolean(field_type):
+        if isinstance(values, pa.ChunkedArray):
+            return pc.fill_null(values, False).to_numpy(zero_copy_only=False).astype(bool)
+        return np.array([bool(value) for value in values], dtype=bool)
+    if isinstance(values, pa.ChunkedArray):
+        return values.to_numpy(zero_copy_only=False)
+    return np.array(values, dtype=object)
+
+
+def load_columns(path):
+    """
+    Columnas de annotations/regions/region_choices como arreglos NumPy, desde
+    un directorio columnar (solo las columnas necesarias) o desde el JSON.
+    """
+    if os.path.isdir(path):
+        tables = {name: read_table(path, name, list(fields)) for name, fields in COLUMNS.items()}
+        raw = {name: {field: tables[name].column(field) for field in fields} for name, fields in COLUMNS.items()}
+    else:
+        raw = empty_columns()
+        for task in iter_export_tasks(path):
+            flatten_task(task, raw)
+    return {
+        name: {field: as_numpy((name, field), raw[name][field]) for field in fields}
+        for name, fields in COLUMNS.items()
+    }
+
+
+def encode(values):
+    """Códigos enteros de 'values' y su vocabulario ordenado"""
+    vocabulary, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.reshape(-1).astype(np.int64), vocabulary
+
+
+class RegionArrays:
+    """
+    Regiones de un snapshot como arreglos NumPy alineados.
+
+    task, rater, start, end, label    una posición por región con etiqueta
+    choice_*                          una posición por choice de región
+    task_raters                       pares (task, anotador) con anotación vigente
+    """
+
+    def __init__(self, columns):
+        annotations = columns['annotations']
+        ids = annotations['annotation_id']
+        self.task_ids, task_codes = np.unique(annotations['task_id'], return_inverse=True)
+        self.rater_ids, rater_codes = np.unique(annotations['completed_by'], return_inverse=True)
+        task_codes, rater_codes = task_codes.reshape(-1), rater_codes.reshape(-1)
+
+        # Una anotación por (task, anotador): la más reciente que no esté cancelada
+        active = np.flatnonzero(~annotations['was_cancelled'])
+        order = active[np.lexsort((-ids[active], rater_codes[active], task_codes[active]))]
+        pairs, first = np.unique(np.stack([task_codes[order], rater_codes[order]], axis=1), axis=0, return_index=True)
+        self.task_raters = pairs.reshape(-1, 2)
+        self.raters_per_task = np.bincount(self.task_raters[:, 0], minlength=len(self.task_ids))
+
+        regions = columns['regions']
+        in_kept = np.isin(regions['annotation_id'], ids[order[first]])
+        starts = np.where(regions['global_start'] >= 0, regions['global_start'], regions['start_offset'])
+        ends = np.where(regions['global_end'] >= 0, regions['global_end'], regions['end_offset'])
+        region_tasks = np.searchsorted(self.task_ids, regions['task_id'])
+        region_raters = np.searchsorted(self.rater_ids, regions['completed_by'])
+
+        labelled = in_kept & np.not_equal(regions['label'], None)
+        self.task = region_tasks[labelled]
+        self.rater = region_raters[labelled]
+        self.start = starts[labelled]
+        self.end = ends[labelled]
+        self.label, self.labels = encode(regions['label'][labelled])
+        # Sin offsets (-1) la región no tiene span: cuenta en las frecuencias pero no como unidad
+        self.positioned = (self.start >= 0) & (self.end >= 0)
+
+        # Cada choice toma el span de su región (misma anotación e id de región)
+        choices = columns['region_choices']
+        span_of = {key: position for position, key in
+                   enumerate(zip(regions['annotation_id'].tolist(), regions['region_id'].tolist()))}
+        positions = np.array(
+            [span_of[key] for key in zip(choices['annotation_id'].tolist(), choices['region_id'].tolist())],
+            dtype=np.int64,
+        )
+        keep = in_kept[positions]
+        positions = positions[keep]
+        self.choice_task = region_tasks[positions]
+        self.choice_rater = region_raters[positions]
+        self.choice_start = starts[positions]
+        self.choice_end = ends[positions]
+        self.choice_field, self.choice_fields = encode(choices['from_name'][keep])
+        self.choice_value, self.choice_values = encode(choices['choice'][keep])
+        self.choice_positioned = (self.choice_start >= 0) & (self.choice_end >= 0)
+
+
+def span_units(task, start, end):
+    """Índice de unidad (task, start, end) de cada región y la task de cada unidad"""
+    if len(task) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    keys, units = np.unique(np.stack([task, start, end], axis=1), axis=0, return_inverse=True)
+    return units.reshape(-1), keys[:, 0]
+
+
+def category_counts(units, rater, category, n_categories, n_raters_per_unit):
+    """
+    Matriz (unidades x categorías + 1) con cuántos anotadores asignaron cada
+    categoría; la última columna es "ninguna" (anotó la task pero no la unidad).
+    """
+    n_units = len(n_raters_per_unit)
+    # Un voto por anotador y unidad (si repitió el span, cuenta el primero)
+    pairs, first = np.unique(np.stack([units, rater], axis=1).reshape(-1, 2), axis=0, return_index=True)
+    marked = np.bincount(
+        pairs[:, 0] * n_categories + category[first], minlength=n_units * n_categories
+    ).reshape(n_units, n_categories)
+    none = np.clip(n_raters_per_unit - marked.sum(axis=1), 0, None)
+    return np.hstack([marked, none[:, None]])
+
+
+def fleiss_kappa(counts):
+    """Fleiss kappa (con número de anotadores variable por unidad) sobre una matriz de conteos"""
+    n = counts.sum(axis=1)
+    counts = counts[n >= 2]
+    n = n[n >= 2]
+    if len(n) == 0:
+        return float('nan')
+    agreement = ((counts ** 2).sum(axis=1) - n) / (n * (n - 1))
+    proportions = counts.sum(axis=0) / n.sum()
+    expected = (proportions ** 2).sum()
+    if expected >= 1:
+        return float('nan')
+    return float((agreement.mean() - expected) / (1 - expected))
+
+
+def cohen_kappa(a, b, n_categories):
+    """Cohen kappa entre dos vectores de categorías (0..n_categories-1)"""
+    if len(a) == 0:
+        return float('nan')
+    confusion = np.bincount(a * n_categories + b, minlength=n_categories ** 2).reshape(n_categories, n_categories)
+    total = confusion.sum()
+    observed = np.trace(confusion) / total
+    expected = (confusion.sum(axis=0) * confusion.sum(axis=1)).sum() / total ** 2
+    if expected >= 1:
+        return float('nan')
+    return float((observed - expected) / (1 - expected))
+
+
+def overlap_hits(src, dst, n_labels):
+    """
+    Cuántas regiones de 'src' se solapan con alguna región de 'dst' de la misma
+    task y etiqueta. src/dst son tuplas (task, label, start, end) de arreglos.
+    """
+    s_task, s_label, s_start, s_end = src
+    d_task, d_label, d_start, d_end = dst
+    if len(s_task) == 0 or len(d_task) == 0:
+        return 0
+    span = int(max(s_end.max(), d_end.max())) + 2
+    d_group = d_task * n_labels + d_label
+    order = np.lexsort((d_start, d_group))
+    d_key = d_group[order] * span + d_start[order]
+    # Máximo 'end' acumulado dentro de cada grupo (los grupos ocupan rangos disjuntos de la clave)
+    d_reach = np.maximum.accumulate(d_group[order] * span + d_end[order])
+    s_group = s_task * n_labels + s_label
+    position = np.searchsorted(d_key, s_group * span + s_end, side='left') - 1
+    valid = position >= 0
+    reach = np.where(valid, d_reach[np.clip(position, 0, None)], -1)
+    return int((valid & (reach - s_group * span > s_start)).sum())
+
+
+def pairwise_agreement(arrays):
+    """Cohen kappa y F1 de spans para cada par de anotadores con tasks en común"""
+    n_labels = len(arrays.labels)
+    results = []
+    rated = {rater: set(arrays.task_raters[arrays.task_raters[:, 1] == rater, 0])
+             for rater in np.unique(arrays.task_raters[:, 1])}
+    for a, b in combinations(sorted(rated), 2):
+        shared = np.array(sorted(rated[a] & rated[b]), dtype=np.int64)
+        if len(shared) == 0:
+            continue
+        mask = np.isin(arrays.task, shared) & arrays.positioned
+        in_a = mask & (arrays.rater == a)
+        in_b = mask & (arrays.rater == b)
+        both = in_a | in_b
+        units, _ = span_units(arrays.task[both], arrays.start[both], arrays.end[both])
+        n_units = int(units.max()) + 1 if len(units) else 0
+        labels_a = np.full(n_units, n_labels, dtype=np.int64)
+        labels_b = np.full(n_units, n_labels, dtype=np.int64)
+        labels_a[units[in_a[both]]] = arrays.label[in_a]
+        labels_b[units[in_b[both]]] = arrays.label[in_b]
+
+        exact = int(((labels_a == labels_b) & (labels_a < n_labels)).sum())
+        n_a, n_b = int(in_a.sum()), int(in_b.sum())
+        src_a = (arrays.task[in_a], arrays.label[in_a], arrays.start[in_a], arrays.end[in_a])
+        src_b = (arrays.task[in_b], arrays.label[in_b], arrays.start[in_b], arrays.end[in_b])
+        precision = overlap_hits(src_a, src_b, n_labels) / n_a if n_a else float('nan')
+        recall = overlap_hits(src_b, src_a, n_labels) / n_b if n_b else float('nan')
+        overlap_f1 = (2 * precision * recall / (precision + recall)) if precision + recall > 0 else 0.0
+
+        per_label = {}
+        for code, label in enumerate(arrays.labels):
+            per_label[str(label)] = cohen_kappa((labels_a == code).astype(np.int64), (labels_b == code).astype(np.int64), 2)
+        results.append({
+            'raters': [int(arrays.rater_ids[a]), int(arrays.rater_ids[b])],
+            'shared_tasks': int(len(shared)),
+            'units': n_units,
+            'cohen_kappa': cohen_kappa(labels_a, labels_b, n_labels + 1),
+            'cohen_kappa_per_label': per_label,
+            'span_f1_exact': (2 * exact / (n_a + n_b)) if n_a + n_b else float('nan'),
+            'span_f1_overlap': overlap_f1,
+        })
+    return results
+
+
+def label_agreement(arrays):
+    """Fleiss kappa global y por etiqueta sobre las unidades de span"""
+    n_labels = len(arrays.labels)
+    if n_labels == 0:
+        return {'fleiss_kappa': float('nan'), 'fleiss_kappa_per_label': {}, 'units': 0}
+    mask = arrays.positioned
+    units, unit_task = span_units(arrays.task[mask], arrays.start[mask], arrays.end[mask])
+    counts = category_counts(units, arrays.rater[mask], arrays.label[mask], n_labels,
+                             arrays.raters_per_task[unit_task])
+    per_label = {}
+    for code, label in enumerate(arrays.labels):
+        binary = np.stack([counts[:, code], counts.sum(axis=1) - counts[:, code]], axis=1)
+        per_label[str(label)] = fleiss_kappa(binary)
+    return {'fleiss_kappa': fleiss_kappa(counts), 'fleiss_kappa_per_label': per_label, 'units': int(len(unit_task))}
+
+
+def choice_agreement(arrays):
+    """Fleiss kappa de cada atributo de región (las unidades son los spans con ese atributo)"""
+    results = {}
+    for field_code, field in enumerate(arrays.choice_fields):
+        mask = (arrays.choice_field == field_code) & arrays.choice_positioned
+        units, unit_task = span_units(arrays.choice_task[mask], arrays.choice_start[mask], arrays.choice_end[mask])
+        values, categories = np.unique(arrays.choice_value[mask], return_inverse=True)
+        counts = category_counts(units, arrays.choice_rater[mask], categories.reshape(-1), len(values),
+                                 arrays.raters_per_task[unit_task])
+        results[str(field)] = {'fleiss_kappa': fleiss_kappa(counts), 'units': int(len(unit_task))}
+    return results
+
+
+def frequency_tables(arrays):
+    """Conteos de etiquetas (total y por anotador) y de choices por atributo"""
+    n_labels, n_raters = len(arrays.labels), len(arrays.rater_ids)
+    if n_labels == 0:
+        # Sin etiquetas (snapshot vacío o proyecto solo de choices) no hay nada que contar
+        per_rater = np.zeros((n_raters, 0), dtype=np.int64)
+    else:
+        per_rater = np.bincount(arrays.rater * n_labels + arrays.label, minlength=n_raters * n_labels)
+        per_rater = per_rater.reshape(n_raters, n_labels)
+    n_values, n_fields = len(arrays.choice_values), len(arrays.choice_fields)
+    if n_values == 0 or n_fields == 0:
+        per_field = np.zeros((n_fields, 0), dtype=np.int64)
+    else:
+        per_field = np.bincount(arrays.choice_field * n_values + arrays.choice_value,
+                                minlength=n_fields * n_values).reshape(n_fields, n_values)
+    return {
+        'labels': {str(label): int(count) for label, count in zip(arrays.labels, per_rater.sum(axis=0))},
+        'labels_per_rater': {
+            str(rater_id): {str(label): int(count) for label, count in zip(arrays.labels, row) if count}
+            for rater_id, row in zip(arrays.rater_ids, per_rater)
+        },
+        'choices': {
+            str(field): {str(value): int(count) for value, count in zip(arrays.choice_values, row) if count}
+            for field, row in zip(arrays.choice_fields, per_field)
+        },
+    }
+
+
+def analyze(path):
+    """Carga un snapshot y calcula todas las métricas. Retorna un dict serializable a JSON"""
+    started = time.perf_counter()
+    arrays = RegionArrays(load_columns(path))
+    loaded = time.perf_counter()
+    report = {
+        'snapshot': os.path.basename(os.path.normpath(path)),
+        'tasks': int(len(arrays.task_ids)),
+        'raters': [int(rater_id) for rater_id in arrays.rater_ids if rater_id >= 0],
+        'regions': int(len(arrays.task)),
+        'frequencies': frequency_tables(arrays),
+        'labels': label_agreement(arrays),
+        'pairs': pairwise_agreement(arrays),
+        'choices': choice_agreement(arrays),
+    }
+    report['seconds'] = {'load': loaded - started, 'metrics': time.perf_counter() - loaded}
+    return report
+
+
+def format_kappa(value):
+    return '  n/a' if value != value else f"{value:5.2f}"
+
+
+def print_report(report):
+    print(f"📊 {report['snapshot']}: {report['tasks']} tasks, {report['regions']} regiones, "
+          f"{len(report['raters'])} anotadores")
+    print(f"⏱️ Carga {report['seconds']['load']:.3f}s | métricas {report['seconds']['metrics']:.3f}s")
+
+    print("\n🏷️ Frecuencia de etiquetas:")
+    for label, count in sorted(report['frequencies']['labels'].items(), key=lambda item: -item[1]):
+        print(f"   {label:<20} {count:>7}")
+
+    labels = report['labels']
+    print(f"\n🤝 Fleiss kappa (spans, {labels['units']} unidades): {format_kappa(labels['fleiss_kappa'])}")
+    for label, kappa in labels['fleiss_kappa_per_label'].items():
+        print(f"   {label:<20} {format_kappa(kappa)}")
+
+    if report['pairs']:
+        print("\n👥 Pares de anotadores:")
+        for pair in report['pairs']:
+            a, b = pair['raters']
+            print(f"   {a} vs {b}: {pair['shared_tasks']} tasks | Cohen {format_kappa(pair['cohen_kappa'])} | "
+                  f"F1 exacto {pair['span_f1_exact']:.2f} | F1 solapamiento {pair['span_f1_overlap']:.2f}")
+    else:
+        print("\nℹ️ No hay tasks anotadas por más de un anotador")
+
+    if report['choices']:
+        print("\n🧩 Atributos de región (Fleiss kappa):")
+        for field, values in report['choices'].items():
+            print(f"   {field:<20} {format_kappa(values['fleiss_kappa'])} ({values['units']} unidades)")
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 1
+    json_path = None
+    if '--json' in argv:
+        index = argv.index('--json')
+        json_path = argv[index + 1] if index + 1 < len(argv) else None
+        argv = argv[:index] + argv[index + 2:]
+    reports = []
+    for path in argv:
+        report = analyze(path)
+        print_report(report)
+        reports.append(report)
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(reports if len(reports) > 1 else reports[0], f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Reporte guardado en {json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
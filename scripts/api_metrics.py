@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Métricas por request de las llamadas de los scripts a la API de Label Studio.
+
+ls_client instala un transporte (httpx, el del SDK) y un adapter (requests,
+las descargas directas) que registran cada request por endpoint normalizado
+(/api/projects/{id}/import):
+    - histograma de latencia (buckets fijos, en ms),
+    - bytes enviados y recibidos,
+    - errores por tipo (4xx, 5xx, red/timeout),
+    - reintentos: el mismo request repetido en el mismo hilo después de un
+      error (sirve tanto para los reintentos del SDK como para los nuestros).
+
+Al terminar el proceso se agregan filas a /monitoring/api_metrics_YYYYMMDD.csv
+(junto a los summary_*.csv del monitoreo horario) y se reescribe
+/monitoring/api_metrics.prom para el textfile collector de node_exporter, con
+contadores acumulados de todas las corridas.
+
+Uso:
+    python3 api_metrics.py          # resumen de hoy
+    python3 api_metrics.py 20251030 # resumen de un día
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import atexit
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+
+API_METRICS = os.getenv('API_METRICS', '1') != '0'
+API_METRICS_DIR = os.getenv('API_METRICS_DIR', '/monitoring')
+STATE_FILENAME = 'api_metrics_state.json'
+PROM_FILENAME = 'api_metrics.prom'
+
+# Límites superiores (ms) de los buckets del histograma; el último es +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+CSV_FIELDS = (
+    'timestamp', 'script', 'method', 'endpoint', 'requests', 'errors_4xx', 'errors_5xx',
+    'errors_network', 'retries', 'bytes_sent', 'bytes_received', 'total_ms', 'p50_ms', 'p95_ms',
+    'p99_ms', 'max_ms', 'hist_ms',
+)
+
+_ID_SEGMENT_RE = re.compile(r'/(\d+|[0-9a-f]{32}|[0-9a-f-]{36})(?=/|$)')
+
+
+def normalize_endpoint(url):
+    """Path del request sin query y con los ids reemplazados: /api/tasks/{id}/"""
+    path = urlsplit(str(url)).path or '/'
+    return _ID_SEGMENT_RE.sub('/{id}', path)
+
+
+def bucket_index(latency_ms):
+    for index, upper in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= upper:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def histogram_percentile(buckets, fraction):
+    """
+    Percentil estimado a partir de los conteos por bucket (no acumulados),
+    interpolando dentro del bucket. El bucket +Inf reporta su límite inferior.
+    """
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    target = fraction * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        if count and seen + count >= target:
+            lower = LATENCY_BUCKETS_MS[index - 1] if index else 0.0
+            if index == len(LATENCY_BUCKETS_MS):
+                return float(lower)
+            upper = LATENCY_BUCKETS_MS[index]
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def format_histogram(buckets):
+    """Conteos por bucket como 'limite:conteo;...;inf:conteo' (solo los no vacíos)"""
+    labels = [str(upper) for upper in LATENCY_BUCKETS_MS] + ['inf']
+    return ';'.join(f"{label}:{count}" for label, count in zip(labels, buckets) if count)
+
+
+def parse_histogram(text):
+    labels = [str(upper) for upper in LATENCY_BUCKETS_MS] + ['inf']
+    buckets = [0] * len(labels)
+    for part in filter(None, (text or '').split(';')):
+        label, _, count = part.partition(':')
+        buckets[labels.index(label)] += int(count)
+    return buckets
+
+
+def _new_endpoint():
+    return {'requests': 0, 'errors_4xx': 0, 'errors_5xx': 0, 'errors_network': 0, 'retries': 0,
+            'bytes_sent': 0, 'bytes_received': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+
+
+class MetricsRecorder:
+    """Acumula las métricas del proceso; seguro entre hilos"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, method, url, status, latency_s, bytes_sent=0, bytes_received=0, error=None):
+        """
+        Registra un request terminado. 'status' es el código HTTP (None si
+        falló la conexión) y 'error' el tipo de excepción de red, si hubo.
+        """
+        key = (method.upper(), normalize_endpoint(url))
+        retry_key = (method.upper(), str(url), bytes_sent)
+        failed = error is not None or (status is not None and (status == 429 or status >= 500))
+        retried = getattr(self._local, 'last_failure', None) == retry_key
+        self._local.last_failure = retry_key if failed else None
+        latency_ms = latency_s * 1000.0
+        with self._lock:
+            entry = self.endpoints.get(key)
+            if entry is None:
+                entry = self.endpoints[key] = _new_endpoint()
+            entry['requests'] += 1
+            entry['retries'] += int(retried)
+            entry['bytes_sent'] += bytes_sent or 0
+            entry['bytes_received'] += bytes_received or 0
+            entry['total_ms'] += latency_ms
+            entry['max_ms'] = max(entry['max_ms'], latency_ms)
+            entry['buckets'][bucket_index(latency_ms)] += 1
+            if error is not None:
+                entry['errors_network'] += 1
+            elif status is not None and status >= 500:
+                entry['errors_5xx'] += 1
+            elif status is not None and status >= 400:
+                entry['errors_4xx'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(entry, buckets=list(entry['buckets'])) for key, entry in self.endpoints.items()}
+
+    def rows(self, script, timestamp=None):
+        """Filas CSV (una por endpoint) de lo registrado hasta ahora"""
+        timestamp = timestamp or datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
+        rows = []
+        for (method, endpoint), entry in sorted(self.snapshot().items(), key=lambda item: item[0][1]):
+            buckets = entry['buckets']
+            rows.append({
+                'timestamp': timestamp, 'script': script, 'method': method, 'endpoint': endpoint,
+                'requests': entry['requests'], 'errors_4xx': entry['errors_4xx'],
+                'errors_5xx': entry['errors_5xx'], 'errors_network': entry['errors_network'],
+                'retries': entry['retries'], 'bytes_sent': entry['bytes_sent'],
+                'bytes_received': entry['bytes_received'], 'total_ms': round(entry['total_ms'], 1),
+                'p50_ms': round(histogram_percentile(buckets, 0.50), 1),
+                'p95_ms': round(histogram_percentile(buckets, 0.95), 1),
+                'p99_ms': round(histogram_percentile(buckets, 0.99), 1),
+                'max_ms': round(entry['max_ms'], 1), 'hist_ms': format_histogram(buckets),
+            })
+        return rows
+
+
+_recorder = MetricsRecorder()
+_flush_registered = False
+_registration_lock = threading.Lock()
+
+
+def get_recorder():
+    """Recorder del proceso; la primera vez programa la escritura al salir"""
+    global _flush_registered
+    with _registration_lock:
+        if not _flush_registered and API_METRICS:
+            atexit.register(flush)
+            _flush_registered = True
+    return _recorder
+
+
+def script_name():
+    name = os.path.basename(sys.argv[0] or '') or 'python'
+    return name[:-3] if name.endswith('.py') else name
+
+
+# --- Instrumentación de httpx (SDK) ---
+
+def instrumented_transport(transport, recorder=None):
+    """Envuelve un httpx.BaseTransport para registrar cada request"""
+    import httpx
+
+    recorder = recorder or get_recorder()
+
+    class CountingStream(httpx.SyncByteStream):
+        # El request se registra al cerrarse la respuesta, con el body ya leído
+        def __init__(self, stream, on_close):
+            self._stream = stream
+            self._on_close = on_close
+            self.received = 0
+
+        def __iter__(self):
+            for chunk in self._stream:
+                self.received += len(chunk)
+                yield chunk
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                on_close, self._on_close = self._on_close, None
+                if on_close:
+                    on_close(self.received)
+
+    class InstrumentedTransport(httpx.BaseTransport):
+        def __init__(self, inner):
+            self.inner = inner
+
+        def handle_request(self, request):
+            started = time.perf_counter()
+            sent = int(request.headers.get('content-length') or 0)
+            try:
+                response = self.inner.handle_request(request)
+            except Exception as e:
+                recorder.record(request.method, request.url, None, time.perf_counter() - started,
+                                bytes_sent=sent, error=type(e).__name__)
+                raise
+
+            def on_close(received):
+                recorder.record(request.method, request.url, response.status_code,
+                                time.perf_counter() - started, bytes_sent=sent, bytes_received=received)
+
+            return httpx.Response(
+                status_code=response.status_code, headers=response.headers,
+                stream=CountingStream(response.stream, on_close), extensions=response.extensions,
+            )
+
+        def close(self):
+            self.inner.close()
+
+    return InstrumentedTransport(transport)
+
+
+# --- Instrumentación de requests (descargas directas) ---
+
+def instrumented_adapter_class():
+    """Subclase de HTTPAdapter que registra cada request de la sesión"""
+    from requests.adapters import HTTPAdapter
+
+    class InstrumentedAdapter(HTTPAdapter):
+        def __init__(self, *args, recorder=None, **kwargs):
+            self.recorder = recorder or get_recorder()
+            super().__init__(*args, **kwargs)
+
+        def send(self, request, stream=False, **kwargs):
+            started = time.perf_counter()
+            body = request.body
+            sent = len(body) if isinstance(body, (bytes, str)) else int(request.headers.get('Content-Length') or 0)
+            try:
+                response = super().send(request, stream=stream, **kwargs)
+            except Exception as e:
+                self.recorder.record(request.method, request.url, None, time.perf_counter() - started,
+                                     bytes_sent=sent, error=type(e).__name__)
+                raise
+            if not stream:
+                self.recorder.record(request.method, request.url, response.status_code,
+                                     time.perf_counter() - started, bytes_sent=sent,
+                                     bytes_received=len(response.content))
+                return response
+            # Streaming: se registra cuando se cierra la respuesta, con los
+            # bytes que efectivamente se leyeron
+            original_iter_content, original_close = response.iter_content, response.close
+            progress = {'received': 0, 'recorded': False}
+
+            def iter_content(*args, **kwargs):
+                for chunk in original_iter_content(*args, **kwargs):
+                    progress['received'] += len(chunk)
+                    yield chunk
+
+            def close():
+                if not progress['recorded']:
+                    progress['recorded'] = True
+                    self.recorder.record(request.method, request.url, response.status_code,
+                                         time.perf_counter() - started, bytes_sent=sent,
+                                         bytes_received=progress['received'])
+                original_close()
+
+            response.iter_content, response.close = iter_content, close
+            return response
+
+    return InstrumentedAdapter
+
+
+# --- Salida: CSV diario y textfile de Prometheus ---
+
+def _merge_state(state, script, recorder):
+    scripts = state.setdefault('scripts', {})
+    endpoints = scripts.setdefault(script, {})
+    for (method, endpoint), entry in recorder.snapshot().items():
+        total = endpoints.setdefault(f"{method} {endpoint}", _new_endpoint())
+        for field in ('requests', 'errors_4xx', 'errors_5xx', 'errors_network', 'retries',
+                      'bytes_sent', 'bytes_received', 'total_ms'):
+            total[field] += entry[field]
+        total['max_ms'] = max(total['max_ms'], entry['max_ms'])
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+    state.setdefault('last_run', {})[script] = time.time()
+    return state
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(state):
+    """Texto en formato de exposición de Prometheus con los acumulados de 'state'"""
+    lines = [
+        '# HELP labelstudio_client_requests_total Requests de los scripts a la API de Label Studio',
+        '# TYPE labelstudio_client_requests_total counter',
+    ]
+    series = []
+    for script, endpoints in sorted(state.get('scripts', {}).items()):
+        for key, entry in sorted(endpoints.items()):
+            method, _, endpoint = key.partition(' ')
+            series.append((f'script="{_label(script)}",method="{method}",endpoint="{_label(endpoint)}"', entry))
+    for labels, entry in series:
+        lines.append(f"labelstudio_client_requests_total{{{labels}}} {entry['requests']}")
+    lines += ['# HELP labelstudio_client_errors_total Requests fallidos por tipo (4xx, 5xx, network)',
+              '# TYPE labelstudio_client_errors_total counter']
+    for labels, entry in series:
+        for kind in ('4xx', '5xx', 'network'):
+            lines.append(f'labelstudio_client_errors_total{{{labels},kind="{kind}"}} {entry["errors_" + kind]}')
+    for name, field, help_text in (
+        ('labelstudio_client_retries_total', 'retries', 'Requests repetidos después de un error'),
+        ('labelstudio_client_request_bytes_total', 'bytes_sent', 'Bytes enviados en el body de los requests'),
+        ('labelstudio_client_response_bytes_total', 'bytes_received', 'Bytes recibidos en las respuestas'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [f"{name}{{{labels}}} {entry[field]}" for labels, entry in series]
+    name = 'labelstudio_client_request_duration_seconds'
+    lines += [f'# HELP {name} Latencia de los requests (hasta leer la respuesta completa)',
+              f'# TYPE {name} histogram']
+    for labels, entry in series:
+        cumulative = 0
+        for upper, count in zip(LATENCY_BUCKETS_MS, entry['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{upper / 1000:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {entry["requests"]}')
+        lines.append(f"{name}_sum{{{labels}}} {entry['total_ms'] / 1000:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {entry['requests']}")
+    lines += ['# HELP labelstudio_client_last_run_timestamp_seconds Fin de la última corrida del script',
+              '# TYPE labelstudio_client_last_run_timestamp_seconds gauge']
+    for script, finished in sorted(state.get('last_run', {}).items()):
+        lines.append(f'labelstudio_client_last_run_timestamp_seconds{{script="{_label(script)}"}} {finished:.0f}')
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def flush(recorder=None, metrics_dir=None, script=None):
+    """
+    Escribe lo registrado: filas en api_metrics_YYYYMMDD.csv y el textfile de
+    Prometheus acumulado. Si el directorio no es escribible no hace nada.
+    """
+    recorder = recorder or _recorder
+    metrics_dir = metrics_dir or API_METRICS_DIR
+    script = script or script_name()
+    rows = recorder.rows(script)
+    if not rows:
+        return None
+    try:
+        import fcntl
+
+        os.makedirs(metrics_dir, exist_ok=True)
+        with open(os.path.join(metrics_dir, '.api_metrics.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # corridas de cron que se solapan
+            csv_path = os.path.join(metrics_dir, f"api_metrics_{datetime.now().strftime('%Y%m%d')}.csv")
+            new_file = not os.path.exists(csv_path)
+            with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerows(rows)
+            state_path = os.path.join(metrics_dir, STATE_FILENAME)
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+            state = _merge_state(state, script, recorder)
+            _write_atomic(state_path, json.dumps(state, ensure_ascii=False))
+            _write_atomic(os.path.join(metrics_dir, PROM_FILENAME), render_prometheus(state))
+    except OSError:
+        return None  # sin /monitoring (p. ej. fuera del contenedor) no se guardan métricas
+    return csv_path
+
+
+def read_rows(csv_path):
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def summarize(rows):
+    """Agrega filas CSV por (método, endpoint) sumando contadores e histogramas"""
+    totals = {}
+    for row in rows:
+        entry = totals.setdefault((row['method'], row['endpoint']), _new_endpoint())
+        for field in ('requests', 'errors_4xx', 'errors_5xx', 'errors_network', 'retries',
+                      'bytes_sent', 'bytes_received'):
+            entry[field] += int(row[field])
+        entry['total_ms'] += float(row['total_ms'])
+        entry['max_ms'] = max(entry['max_ms'], float(row['max_ms']))
+        entry['buckets'] = [a + b for a, b in zip(entry['buckets'], parse_histogram(row['hist_ms']))]
+    return totals
+
+
+def main(argv):
+    day = argv[0] if argv else datetime.now().strftime('%Y%m%d')
+    csv_path = os.path.join(API_METRICS_DIR, f"api_metrics_{day}.csv")
+    if not os.path.exists(csv_path):
+        print(f"❌ No hay métricas para {day} ({csv_path})")
+        return 1
+    totals = summarize(read_rows(csv_path))
+    print(f"📈 Requests a la API del {day}\n")
+    print(f"{'Endpoint':<45} {'Req':>7} {'Err':>5} {'Reint':>5} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'Enviado':>10} {'Recibido':>10}")
+    for (method, endpoint), entry in sorted(totals.items(), key=lambda item: -item[1]['total_ms']):
+        errors = entry['errors_4xx'] + entry['errors_5xx'] + entry['errors_network']
+        percentiles = [histogram_percentile(entry['buckets'], q) for q in (0.50, 0.95, 0.99)]
+        print(f"{method + ' ' + endpoint:<45} {entry['requests']:>7,} {errors:>5,} {entry['retries']:>5,} "
+              + ' '.join(f"{p:>6.0f}ms" for p in percentiles)
+              + f" {entry['bytes_sent'] / 1e6:>8.1f}MB {entry['bytes_received'] / 1e6:>8.1f}MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
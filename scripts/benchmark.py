@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline de los scripts contra fake_label_studio.py.
+
+Levanta el servidor falso en un subproceso, genera archivos de datos
+sintéticos y corre cada escenario en un proceso propio (así el pico de RSS es
+el de ese escenario) usando el código real: SDK, ls_client, task_import,
+task_pages, task_upsert, task_dedup, task_delete, project_teardown y la
+descarga de export_annotations. Reporta tasks/s, latencia p50/p99 por
+request (medida en el cliente) y pico de RSS.
+
+Uso:
+    python3 scripts/benchmark.py                                # 10k y 100k tasks, todos los escenarios
+    python3 scripts/benchmark.py --tasks 1000000 --scenarios import,pages
+    python3 scripts/benchmark.py --latency-ms 20 --error-rate 0.01 --max-payload-mb 5
+    python3 scripts/benchmark.py --compare monitoring/benchmarks/benchmark_20260101_120000.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import urllib.request
+from datetime import datetime
+
+from fake_label_studio import synthetic_task
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+RESULTS_DIR = os.path.join(BASE_DIR, 'monitoring', 'benchmarks')
+SCENARIOS = ('import', 'pages', 'dedup', 'upsert', 'export', 'delete', 'teardown')
+BENCH_TOKEN = 'benchmark-token'
+TEARDOWN_PROJECTS = 10
+SERVER_OPTIONS = ('latency_ms', 'jitter_ms', 'per_task_us', 'error_rate', 'rate_limit',
+                  'max_payload_mb', 'max_page_size')
+
+
+# --- datos sintéticos --------------------------------------------------------
+
+def write_source(path, total, changed_every=0, new_rows=0):
+    """JSONL con 'total' filas sintéticas; cada 'changed_every' filas una cambia y se agregan 'new_rows'"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for index in range(total + new_rows):
+            variant = 1 if changed_every and index % changed_every == 0 else 0
+            f.write(json.dumps(synthetic_task(index, variant), ensure_ascii=False) + '\n')
+    return path
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_call(url, path, payload=None):
+    """Llamada a los endpoints /_bench del servidor falso"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(url.rstrip('/') + path, data=data, method='POST' if data else 'GET',
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+# --- escenarios (corren en el proceso hijo) ---------------------------------
+
+def run_scenario(name, total, workdir, url):
+    """Corre un escenario y retorna el dict de resultados (se llama en el proceso hijo)"""
+    # Los módulos se importan acá: el entorno (LABEL_STUDIO_URL apuntando al
+    # servidor falso) ya está definido por el proceso padre.
+    import ls_client
+    if ls_client.LABEL_STUDIO_URL.rstrip('/') != url.rstrip('/'):
+        raise SystemExit(f"LABEL_STUDIO_URL no apunta al servidor falso ({ls_client.LABEL_STUDIO_URL})")
+    from task_import import BatchPlanner, import_tasks_in_batches
+    from task_pages import iter_tasks
+    from task_sources import TaskSource
+
+    quiet = lambda *args, **kwargs: None
+    client = ls_client.get_client()
+    latencies = []
+
+    def on_request(request):
+        request.extensions['bench_started'] = time.perf_counter()
+
+    def on_response(response):
+        started = response.request.extensions.get('bench_started')
+        if started is not None:
+            latencies.append(time.perf_counter() - started)
+
+    client._client_wrapper.httpx_client.httpx_client.event_hooks = {
+        'request': [on_request], 'response': [on_response],
+    }
+    ls_client.get_http_session().hooks['response'].append(
+        lambda response, *args, **kwargs: latencies.append(response.elapsed.total_seconds())
+    )
+
+    def seed(tasks, annotations_per_task=0, title='Benchmark'):
+        return bench_call(url, '/_bench/seed', {'title': title, 'tasks': tasks,
+                                                'annotations_per_task': annotations_per_task})['id']
+
+    source_path = os.path.join(workdir, 'source.jsonl')
+    extra = {}
+    if name == 'import':
+        project_id = client.projects.create(title='Benchmark import').id
+        started = time.perf_counter()
+        stats = import_tasks_in_batches(client, project_id, TaskSource(source_path), BatchPlanner(), log=quiet)
+        items = stats['imported']
+        extra = {'failed': stats['failed'], 'retries': stats['retries']}
+    elif name == 'pages':
+        project_id = seed(total)
+        started = time.perf_counter()
+        items = sum(1 for _ in iter_tasks(client, project_id, include=('id', 'data')))
+    elif name == 'dedup':
+        from task_dedup import load_project_fingerprints
+        project_id = seed(total)
+        started = time.perf_counter()
+        dedup = load_project_fingerprints(client, project_id, log=quiet)
+        stats = import_tasks_in_batches(client, project_id, TaskSource(source_path), BatchPlanner(),
+                                        task_filter=dedup, log=quiet)
+        items = stats['read']
+        extra = {'imported': stats['imported'], 'filtered': stats['filtered']}
+    elif name == 'upsert':
+        from task_upsert import upsert_tasks
+        project_id = seed(total)
+        changed_path = write_source(os.path.join(workdir, 'changed.jsonl'), total, changed_every=10,
+                                    new_rows=max(1, total // 100))
+        started = time.perf_counter()
+        stats = upsert_tasks(client, project_id, TaskSource(changed_path), key='sentence_id',
+                             dead_letter_path=os.path.join(workdir, 'dead_letter.jsonl'), log=quiet)
+        items = stats['read']
+        extra = {'updated': stats['updated'], 'created': stats['created'], 'failed': stats['failed']}
+    elif name == 'export':
+        with contextlib.redirect_stdout(io.StringIO()):
+            import export_annotations  # valida el token al importarse
+        project_id = seed(total, annotations_per_task=1)
+        started = time.perf_counter()
+        path, _, error = export_annotations.download_export(
+            export_annotations.build_export_url(project_id, 'JSON'), os.path.join(workdir, 'export.json')
+        )
+        if error:
+            raise RuntimeError(error)
+        items = total
+        extra = {'bytes': os.path.getsize(path)}
+    elif name == 'delete':
+        from task_delete import delete_tasks, select_without_annotations
+        project_id = seed(total)
+        started = time.perf_counter()
+        task_ids = select_without_annotations(client, project_id)[::2]
+        stats = delete_tasks(client, project_id, task_ids, log=quiet)
+        items = stats['deleted']
+        extra = {'failed': stats['failed'], 'mode': stats['mode']}
+    elif name == 'teardown':
+        from project_teardown import teardown_projects
+        per_project = max(1, total // TEARDOWN_PROJECTS)
+        for number in range(TEARDOWN_PROJECTS):
+            seed(per_project, title=f"Benchmark teardown {number}")
+        projects = ls_client.list_projects(fresh=True)
+        started = time.perf_counter()
+        stats = teardown_projects(client, projects, rate=0, log=quiet)
+        items = stats['tasks']
+        extra = {'projects': stats['deleted'], 'failed': len(stats['failed'])}
+    else:
+        raise SystemExit(f"Escenario desconocido: {name}")
+
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'scenario': name,
+        'tasks': total,
+        'items': items,
+        'seconds': round(seconds, 3),
+        'tasks_per_second': round(items / seconds, 1) if seconds else None,
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        **extra,
+    }
+
+
+# --- orquestación (proceso padre) -------------------------------------------
+
+def start_server(options):
+    command = [sys.executable, os.path.join(SCRIPT_DIR, 'fake_label_studio.py'), '--port', '0']
+    for option in SERVER_OPTIONS:
+        value = getattr(options, option)
+        if value:
+            command += [f"--{option.replace('_', '-')}", str(value)]
+    if options.disable_actions:
+        command.append('--disable-actions')
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    if 'http://' not in line:
+        server.kill()
+        raise RuntimeError(f"No arrancó el servidor falso: {line!r}")
+    return server, line.strip().split()[-1]
+
+
+def run_child(name, total, workdir, url):
+    env = dict(os.environ)
+    env.update({
+        'LABEL_STUDIO_URL': url,
+        'LABEL_STUDIO_LEGACY_API_KEY': BENCH_TOKEN,
+        'LS_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'API_METRICS_DIR': os.path.join(workdir, 'metrics'),
+    })
+    command = [sys.executable, os.path.abspath(__file__), '--child', name,
+               '--tasks', str(total), '--workdir', workdir, '--url', url]
+    result = subprocess.run(command, env=env, cwd=workdir, capture_output=True, text=True)
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {'scenario': name, 'tasks': total, 'error': (result.stderr or result.stdout).strip()[-500:]}
+    return json.loads(lines[-1])
+
+
+def print_results(results, baseline=None):
+    previous = {(r['scenario'], r['tasks']): r for r in (baseline or []) if 'error' not in r}
+    print(f"\n{'Escenario':<10} {'Tasks':>9} {'Seg':>8} {'Tasks/s':>10} {'Req':>6} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8}{'  vs. base' if baseline else ''}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['scenario']:<10} {result['tasks']:>9,} ❌ {result['error'].splitlines()[-1]}")
+            continue
+        line = (f"{result['scenario']:<10} {result['tasks']:>9,} {result['seconds']:>8.2f} "
+                f"{result['tasks_per_second'] or 0:>10,.0f} {result['requests']:>6} "
+                f"{result['p50_ms'] or 0:>8.2f} {result['p99_ms'] or 0:>8.2f} {result['peak_rss_mb']:>8.1f}")
+        base = previous.get((result['scenario'], result['tasks']))
+        if base and base.get('tasks_per_second') and result['tasks_per_second']:
+            change = (result['tasks_per_second'] / base['tasks_per_second'] - 1) * 100
+            line += f"  {change:+.1f}%"
+        print(line)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark offline contra un Label Studio falso")
+    parser.add_argument('--tasks', default='10000,100000', help="tamaños separados por comas")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--out', help="archivo JSON de resultados (default monitoring/benchmarks/)")
+    parser.add_argument('--compare', help="resultados anteriores contra los que comparar tasks/s")
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--jitter-ms', type=float, default=1.0)
+    parser.add_argument('--per-task-us', type=float, default=20.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--max-payload-mb', type=float, default=0.0)
+    parser.add_argument('--max-page-size', type=int, default=0)
+    parser.add_argument('--disable-actions', action='store_true')
+    # Uso interno: un escenario dentro del proceso hijo
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    options = parse_args(argv)
+    if options.child:
+        print(json.dumps(run_scenario(options.child, int(options.tasks), options.workdir, options.url)))
+        return 0
+
+    sizes = [int(size) for size in options.tasks.split(',') if size]
+    scenarios = [name for name in options.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"❌ Escenarios desconocidos: {', '.join(sorted(unknown))}")
+        return 1
+
+    server, url = start_server(options)
+    print(f"🧪 Servidor falso en {url} (latencia {options.latency_ms} ms, errores {options.error_rate:.1%})")
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='ls_benchmark_') as workdir:
+            for total in sizes:
+                write_source(os.path.join(workdir, 'source.jsonl'), total)
+                for name in scenarios:
+                    print(f"⏱️  {name} con {total:,} tasks...", flush=True)
+                    results.append(run_child(name, total, workdir, url))
+    finally:
+        server.terminate()
+        server.wait()
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    out_path = options.out or os.path.join(
+        RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'server': {option: getattr(options, option) for option in SERVER_OPTIONS},
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados: {out_path}")
+    return 0 if all('error' not in result for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
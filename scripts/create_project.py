@@ -3,14 +3,10 @@
 import os
 import sys
 import json
-from dotenv import load_dotenv
-from label_studio_sdk import LabelStudio
-
-# Carga variables de entorno desde el .env
-load_dotenv()
-
-LABEL_STUDIO_URL = os.getenv('LABEL_STUDIO_URL')
-LABEL_STUDIO_LEGACY_API_KEY = os.getenv('LABEL_STUDIO_LEGACY_API_KEY')
+from ls_client import get_client, invalidate_cache, list_projects, require_credentials
+from task_sources import TaskSource, TaskSourceError
+from import_journal import ImportJournal
+from task_import import BatchPlanner, dead_letter_path, import_tasks_in_batches
 
 # Calcular rutas relativas correctamente desde el directorio base del proyecto
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -18,12 +14,10 @@ PROJECTS_DIR = os.path.join(BASE_DIR, 'projects')
 DATA_DIR = os.path.join(BASE_DIR, 'data')  # Ruta corregida para datos
 PROJECTS_JSON_PATH = os.path.join(PROJECTS_DIR, 'projects_index.json')
 
-if not LABEL_STUDIO_URL or not LABEL_STUDIO_LEGACY_API_KEY:
-    print("❌ Debes definir LABEL_STUDIO_URL y LABEL_STUDIO_LEGACY_API_KEY en tu archivo .env")
-    sys.exit(1)
+require_credentials()
 
-# Instancia cliente de Label Studio SDK
-client = LabelStudio(base_url=LABEL_STUDIO_URL, api_key=LABEL_STUDIO_LEGACY_API_KEY)
+# Cliente compartido de Label Studio SDK
+client = get_client()
 
 # Cargar proyectos desde projects.json
 try:
@@ -35,7 +29,7 @@ except Exception as e:
 
 # Obtener todos los títulos de proyectos ya existentes en Label Studio
 try:
-    existing_projects = client.projects.list()
+    existing_projects = list_projects(fresh=True)
     existing_titles = set(p.title for p in existing_projects)
 except Exception as e:
     print(f"❌ Error obteniendo la lista de proyectos existentes: {e}")
@@ -82,6 +76,7 @@ for project_id, project_info in projects_dict.items():
         )
         print(f"✅ Proyecto '{project_id}' creado exitosamente. Project ID: {project.id}")
         existing_titles.add(project_id)  # Actualizar set local
+        invalidate_cache('projects')
     except Exception as e:
         print(f"❌ Error creando el proyecto '{project_id}': {e}")
         continue
@@ -95,55 +90,41 @@ for project_id, project_info in projects_dict.items():
     data_file_path = os.path.join(DATA_DIR, data_source)
     print(f"ℹ️ Intentando cargar datos desde: {data_file_path}") # Añadido para depuración
 
-    if not os.path.isfile(data_file_path):
+    if not os.path.isfile(data_file_path) and not os.path.isdir(data_file_path):
         print(f"❌ No se encontró el archivo de datos: {data_file_path}")
         continue
 
     # Añadir una verificación explícita para archivos vacíos, que son una causa común de JSONDecodeError
-    if os.path.getsize(data_file_path) == 0:
+    if os.path.isfile(data_file_path) and os.path.getsize(data_file_path) == 0:
         print(f"❌ El archivo de datos está vacío o es inválido (0 bytes): {data_file_path}. No se pueden importar tasks.")
         continue
 
     try:
-        # Cargar datos
-        with open(data_file_path, 'r', encoding='utf-8') as f:
-            tasks = json.load(f)
-        
-        if not isinstance(tasks, list):
-            print(f"❌ El archivo de datos debe contener una lista de tasks (e.g., [...]): {data_file_path}")
-            continue
+        # Cargar datos en streaming: cada lote se envía apenas se termina de leer
+        source = TaskSource(data_file_path)
+        planner = BatchPlanner()
+        # Si la importación se corta, se puede reanudar con add_task_to_project.py (opción 1)
+        journal = ImportJournal(DATA_DIR, project.id, data_file_path)
+        journal.start()
+
+        print(f"📦 Importando tasks al proyecto '{project_id}' con lotes adaptativos ({source.format.upper()}, {source.size:,} bytes)...")
+
+        stats = import_tasks_in_batches(client, project.id, source, planner,
+                                        dead_letter_path=dead_letter_path(DATA_DIR, project.id),
+                                        journal=journal)
 
-        if not tasks:
+        if stats['read'] == 0:
             # Mensaje corregido para indicar una lista vacía, no un archivo vacío
             print(f"⚠️ El archivo de datos contiene una lista vacía de tasks: {data_file_path}")
             continue
 
-        print(f"📦 Importando {len(tasks)} tasks al proyecto '{project_id}'...")
-
-        # Importar en lotes de 5% de la cantidad total de tasks
-        total_tasks = len(tasks)
-        batch_size = max(1, total_tasks // 20)  # 5% del total, al menos 1
-
-        imported_count = 0
-
-        for i in range(0, total_tasks, batch_size):
-            batch = tasks[i:i + batch_size]
-            try:
-                result = client.projects.import_tasks(
-                    id=project.id,
-                    request=batch
-                )
-                imported_count += len(batch)
-                progress = (imported_count / total_tasks) * 100
-                print(f"  ✅ Lote {i//batch_size + 1}: {len(batch)} tasks importadas. Progreso: {imported_count}/{total_tasks} ({progress:.1f}%)")
-            except Exception as e:
-                print(f"  ❌ Error en lote {i//batch_size + 1}: {e}")
-                continue
-
-        print(f"✅ Se importaron {imported_count}/{len(tasks)} tasks al proyecto '{project_id}'")
+        print(f"✅ Se importaron {stats['imported']}/{stats['read']} tasks al proyecto '{project_id}' "
+              f"en {stats['seconds']:.1f}s ({stats['imported'] / max(stats['seconds'], 1e-9):.0f} tasks/s)")
+        if stats['failed']:
+            print(f"⚠️ {stats['failed']} tasks no se pudieron importar; quedaron en: {stats['dead_letter_path']}")
         
-    except json.JSONDecodeError as e:
-        print(f"❌ Error decodificando JSON en {data_file_path}: {e}")
+    except TaskSourceError as e:
+        print(f"❌ {e}")
     except Exception as e:
         print(f"❌ Error importando tasks al proyecto '{project_id}': {e}")
 
@@ -3,21 +3,12 @@
 import os
 import sys
 import time
-from dotenv import load_dotenv
-from label_studio_sdk import LabelStudio
+from ls_client import get_client, require_credentials
 
-# Carga variables de entorno desde el .env
-load_dotenv()
+require_credentials()
 
-LABEL_STUDIO_URL = os.getenv('LABEL_STUDIO_URL')
-LABEL_STUDIO_LEGACY_API_KEY = os.getenv('LABEL_STUDIO_LEGACY_API_KEY')
-
-if not LABEL_STUDIO_URL or not LABEL_STUDIO_LEGACY_API_KEY:
-    print("✗ Debes definir LABEL_STUDIO_URL y LABEL_STUDIO_LEGACY_API_KEY en tu archivo .env")
-    sys.exit(1)
-
-# Instancia cliente de Label Studio SDK
-client = LabelStudio(base_url=LABEL_STUDIO_URL, api_key=LABEL_STUDIO_LEGACY_API_KEY)
+# Cliente compartido de Label Studio SDK
+client = get_client()
 
 # Lista de usuarios a crear desde variables de entorno
 USERS_CONFIG = [
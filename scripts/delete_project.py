@@ -1,25 +1,23 @@
 import os
 import sys
 import json
-from dotenv import load_dotenv
-from label_studio_sdk import LabelStudio
+from ls_client import get_client, invalidate_cache, list_projects, require_credentials
+from project_teardown import (
+    TEARDOWN_CONCURRENCY, TEARDOWN_RATE, print_teardown_summary, teardown_projects,
+)
 
-# Carga variables de entorno
-load_dotenv()
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Destino de las exportaciones de seguridad previas al borrado
+TEARDOWN_EXPORT_DIR = os.getenv('TEARDOWN_EXPORT_DIR', os.path.join(BASE_DIR, 'exports', 'pre_delete'))
 
-LABEL_STUDIO_URL = os.getenv('LABEL_STUDIO_URL')
-LABEL_STUDIO_LEGACY_API_KEY = os.getenv('LABEL_STUDIO_LEGACY_API_KEY')
+require_credentials()
 
-if not LABEL_STUDIO_URL or not LABEL_STUDIO_LEGACY_API_KEY:
-    print("Error: LABEL_STUDIO_URL y LABEL_STUDIO_LEGACY_API_KEY deben estar definidos en .env")
-    sys.exit(1)
-
-# Instancia cliente
-client = LabelStudio(base_url=LABEL_STUDIO_URL, api_key=LABEL_STUDIO_LEGACY_API_KEY)
+# Cliente compartido
+client = get_client()
 
-# Obtener TODOS los proyectos existentes en Label Studio
+# Obtener TODOS los proyectos existentes en Label Studio (sin caché: se va a borrar)
 try:
-    existing_projects = list(client.projects.list())
+    existing_projects = list_projects(fresh=True)
     project_count = len(existing_projects)
 except Exception as e:
     print(f"Error obteniendo proyectos existentes: {e}")
@@ -66,27 +64,21 @@ if action_choice == 1:
         print("Operacion cancelada.")
         sys.exit(0)
     
+    export_first = input("¿Exportar cada proyecto a disco antes de borrarlo? (s/N): ").strip().lower() == 's'
+    export_dir = TEARDOWN_EXPORT_DIR if export_first else None
+
+    print(f"\nEliminando {project_count} proyectos "
+          f"({TEARDOWN_CONCURRENCY} en paralelo, max. {TEARDOWN_RATE:g} borrados/s)...")
+    if export_dir:
+        print(f"Exportaciones de seguridad en: {export_dir}")
+
     try:
-        deleted_count = 0
-        errors = []
-        
-        print(f"\nEliminando {project_count} proyectos...")
-        
-        for project in existing_projects:
-            try:
-                client.projects.delete(id=project.id)
-                deleted_count += 1
-                print(f"Proyecto '{project.title}' eliminado")
-            except Exception as e:
-                errors.append(f"Proyecto '{project.title}': {e}")
-                print(f"Error eliminando proyecto '{project.title}': {e}")
-        
-        print(f"\nEliminacion completada: {deleted_count} proyectos eliminados exitosamente.")
-        
-        if errors:
-            print(f"Se encontraron {len(errors)} errores durante la eliminacion.")
-                
+        stats = teardown_projects(client, existing_projects, export_dir=export_dir)
+        invalidate_cache('projects')
+        print(f"\nEliminacion completada: {stats['deleted']} proyectos eliminados exitosamente.")
+        print_teardown_summary(stats)
     except Exception as e:
+        invalidate_cache('projects')
         print(f"Error durante la eliminacion: {e}")
 
 elif action_choice == 2:
@@ -125,6 +117,7 @@ elif action_choice == 2:
     try:
         print("Eliminando proyecto...")
         client.projects.delete(id=selected_project.id)
+        invalidate_cache('projects')
         print(f"Proyecto '{selected_project.title}' eliminado exitosamente.")
     except Exception as e:
         print(f"Error eliminando proyecto: {e}")
\ No newline at end of file
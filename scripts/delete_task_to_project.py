@@ -1,25 +1,23 @@
 import os
 import sys
 import json
-from dotenv import load_dotenv
-from label_studio_sdk import LabelStudio
+from ls_client import get_client, list_projects, require_credentials
+from task_delete import (
+    DELETE_CONCURRENCY, delete_tasks, parse_id_spec, read_id_file, select_by_data_field, select_existing,
+    select_without_annotations, write_failure_report,
+)
 
-# Carga variables de entorno
-load_dotenv()
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
 
-LABEL_STUDIO_URL = os.getenv('LABEL_STUDIO_URL')
-LABEL_STUDIO_LEGACY_API_KEY = os.getenv('LABEL_STUDIO_LEGACY_API_KEY')
+require_credentials()
 
-if not LABEL_STUDIO_URL or not LABEL_STUDIO_LEGACY_API_KEY:
-    print("Error: LABEL_STUDIO_URL y LABEL_STUDIO_LEGACY_API_KEY deben estar definidos en .env")
-    sys.exit(1)
-
-# Instancia cliente
-client = LabelStudio(base_url=LABEL_STUDIO_URL, api_key=LABEL_STUDIO_LEGACY_API_KEY)
+# Cliente compartido
+client = get_client()
 
-# Obtener TODOS los proyectos existentes en Label Studio
+# Obtener TODOS los proyectos existentes en Label Studio (sin caché: se va a borrar)
 try:
-    existing_projects = list(client.projects.list())
+    existing_projects = list_projects(fresh=True)
     project_count = len(existing_projects)
 except Exception as e:
     print(f"Error obteniendo proyectos existentes: {e}")
@@ -57,20 +55,22 @@ print(f"\nProyecto seleccionado: '{project_title}' (ID: {project_id})")
 # Opciones de eliminación
 print("\nOpciones de eliminacion:")
 print("1. Eliminar TODAS las tasks del proyecto")
-print("2. Eliminar tasks especificas por ID")
-print("3. Cancelar")
+print("2. Eliminar tasks por ID o rango (ej: 12, 1000-5000)")
+print("3. Eliminar tasks listadas en un archivo")
+print("4. Eliminar tasks por filtro")
+print("5. Cancelar")
 
 while True:
     try:
-        action_choice = int(input("\nSelecciona una opcion (1-3): "))
-        if action_choice in [1, 2, 3]:
+        action_choice = int(input("\nSelecciona una opcion (1-5): "))
+        if action_choice in [1, 2, 3, 4, 5]:
             break
         else:
             print("Opcion invalida.")
     except ValueError:
         print("Entrada invalida.")
 
-if action_choice == 3:
+if action_choice == 5:
     print("Operacion cancelada.")
     sys.exit(0)
 
@@ -91,41 +91,70 @@ if action_choice == 1:
         print("Todas las tasks han sido eliminadas del proyecto.")
     except Exception as e:
         print(f"Error eliminando tasks: {e}")
+    sys.exit(0)
 
-elif action_choice == 2:
-    # ELIMINAR TASKS ESPECIFICAS
-    print("\nIngresa los IDs de las tasks a eliminar (separados por comas):")
-    task_ids_input = input("IDs: ").strip()
-    
-    if not task_ids_input:
-        print("No se ingresaron IDs.")
-        sys.exit(0)
-    
-    try:
-        task_ids = [tid.strip() for tid in task_ids_input.split(',')]
-        
-        confirm = input("¿Confirmar eliminacion? (s/N): ").strip().lower()
-        
-        if confirm != 's':
-            print("Operacion cancelada.")
+# SELECCIONAR LAS TASKS A ELIMINAR
+try:
+    if action_choice == 2:
+        print("\nIngresa los IDs o rangos de las tasks a eliminar (separados por comas):")
+        task_ids_input = input("IDs: ").strip()
+        if not task_ids_input:
+            print("No se ingresaron IDs.")
             sys.exit(0)
-        
-        deleted_count = 0
-        errors = []
-        
-        for task_id in task_ids:
-            try:
-                client.tasks.delete(id=task_id)
-                deleted_count += 1
-                print(f"Task {task_id} eliminada")
-            except Exception as e:
-                errors.append(f"Task {task_id}: {e}")
-                print(f"Error eliminando task {task_id}: {e}")
-        
-        print(f"Eliminacion completada.")
-        
-        if errors:
-            print(f"Se encontraron {len(errors)} errores durante la eliminacion.")
-                
-    except Exception as e:
-        print(f"Error procesando IDs: {e}")
\ No newline at end of file
+        requested_ids = parse_id_spec(task_ids_input)
+    elif action_choice == 3:
+        ids_path = input("\nRuta del archivo con IDs (uno o varios por linea, se admiten rangos): ").strip()
+        requested_ids = read_id_file(ids_path)
+    else:
+        requested_ids = None
+except (ValueError, OSError) as e:
+    print(f"Error procesando IDs: {e}")
+    sys.exit(1)
+
+try:
+    if requested_ids is not None:
+        print(f"Verificando {len(requested_ids)} IDs contra las tasks del proyecto...")
+        task_ids, not_found = select_existing(client, project_id, requested_ids)
+        if not_found:
+            print(f"{len(not_found)} IDs no pertenecen al proyecto y se ignoran.")
+    else:
+        print("\nFiltros disponibles:")
+        print("1. Tasks sin anotaciones")
+        print("2. Tasks con un campo de data igual a un valor")
+        filter_choice = input("Selecciona un filtro (1-2): ").strip()
+        if filter_choice == '1':
+            task_ids = select_without_annotations(client, project_id)
+        elif filter_choice == '2':
+            field = input("Campo de data (ej: sentence_id): ").strip()
+            value = input("Valor: ").strip()
+            task_ids = select_by_data_field(client, project_id, field, value)
+        else:
+            print("Opcion invalida.")
+            sys.exit(0)
+except Exception as e:
+    print(f"Error obteniendo las tasks del proyecto: {e}")
+    sys.exit(1)
+
+if not task_ids:
+    print("No hay tasks que coincidan con la seleccion.")
+    sys.exit(0)
+
+preview = ", ".join(str(task_id) for task_id in task_ids[:10])
+print(f"\nSe eliminaran {len(task_ids)} tasks: {preview}{' ...' if len(task_ids) > 10 else ''}")
+confirm = input("¿Confirmar eliminacion? (s/N): ").strip().lower()
+
+if confirm != 's':
+    print("Operacion cancelada.")
+    sys.exit(0)
+
+print(f"Eliminando {len(task_ids)} tasks...")
+stats = delete_tasks(client, project_id, task_ids, concurrency=DELETE_CONCURRENCY)
+rate = stats['deleted'] / stats['seconds'] if stats['seconds'] else 0
+print(f"\nEliminacion completada: {stats['deleted']} tasks eliminadas en {stats['seconds']:.1f}s "
+      f"({rate:.0f} tasks/s, modo {stats['mode']}).")
+
+if stats['failures']:
+    report_path = write_failure_report(DATA_DIR, project_id, stats['failures'])
+    print(f"Se encontraron {stats['failed']} errores durante la eliminacion.")
+    print(f"IDs fallidos guardados en: {report_path}")
+    print("Se pueden reintentar con la opcion 3 usando ese archivo.")
@@ -2,154 +2,460 @@
 
 import os
 import sys
+import json
 import time
-from datetime import datetime, timedelta
-from dotenv import load_dotenv
-from label_studio_sdk import LabelStudio
-import subprocess
+import fcntl
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+import requests
+from export_store import (
+    COMPRESSION_EXTENSIONS, SnapshotStore, StreamingExportWriter,
+    load_export, resolve_compression, write_json_atomic,
+)
+from export_retention import apply_retention, print_retention_summary
+from ls_client import (
+    LABEL_STUDIO_URL, get_api_key, get_client, get_http_session, list_projects, print_auth_error, verify_auth,
+)
+from task_pages import fetch_task_page, iter_task_ids, iter_tasks
 
-load_dotenv(dotenv_path='/.env')
-
-LABEL_STUDIO_URL = os.getenv('LABEL_STUDIO_URL', 'http://localhost:8080')
-LABEL_STUDIO_LEGACY_API_KEY = os.getenv('LABEL_STUDIO_LEGACY_API_KEY')
-LABEL_STUDIO_PERSONAL_API_KEY = os.getenv('LABEL_STUDIO_PERSONAL_API_KEY')
 EXPORT_DIR = '/exports/annotations'
+# Estado del modo incremental (delta). Se guarda en subdirectorios para que
+# la retención (que solo mira archivos del nivel superior) no los toque.
+DELTA_STATE_DIR = os.path.join(EXPORT_DIR, '.delta')
+DELTA_STATE_PATH = os.path.join(DELTA_STATE_DIR, 'watermarks.json')
+CURRENT_DIR = os.path.join(EXPORT_DIR, 'current')
+# Almacén direccionado por contenido (objetos + manifest) para deduplicar snapshots
+STORE_DIR = os.path.join(EXPORT_DIR, '.store')
+DELTA_IDS_PER_REQUEST = 200  # IDs por petición de export (limita el largo de la URL)
+DELTA_PAGE_SIZE = 500
+# Cada cuántas corridas delta con --merge se comparan los IDs de current/ con
+# los del proyecto para quitar las tasks borradas en Label Studio (0 = nunca)
+EXPORT_RECONCILE_EVERY = int(os.getenv('EXPORT_RECONCILE_EVERY', '1'))
+# Exportación concurrente: hilos de trabajo y máximo de descargas simultáneas
+# contra un mismo host (para no saturar el servidor de Label Studio)
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '4'))
+EXPORT_MAX_PER_HOST = int(os.getenv('EXPORT_MAX_PER_HOST', '2'))
+EXPORT_TIMEOUT = int(os.getenv('EXPORT_TIMEOUT', '600'))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Compresión de los snapshots: auto (zstd si está instalado, si no gzip), gzip, zstd o none
+EXPORT_COMPRESSION = resolve_compression(os.getenv('EXPORT_COMPRESSION', 'auto'))
+# Modo daemon (--daemon): cada EXPORT_POLL_SECONDS se consulta una señal de
+# cambios por proyecto; un proyecto con cambios se exporta cuando lleva
+# EXPORT_DEBOUNCE_SECONDS sin cambios nuevos, o cuando su cambio más antiguo
+# sin exportar cumple EXPORT_MAX_STALENESS_SECONDS.
+EXPORT_POLL_SECONDS = int(os.getenv('EXPORT_POLL_SECONDS', '60'))
+EXPORT_DEBOUNCE_SECONDS = int(os.getenv('EXPORT_DEBOUNCE_SECONDS', '300'))
+EXPORT_MAX_STALENESS_SECONDS = int(os.getenv('EXPORT_MAX_STALENESS_SECONDS', '3600'))
+DAEMON_STATE_DIR = os.path.join(EXPORT_DIR, '.daemon')
+DAEMON_STATE_PATH = os.path.join(DAEMON_STATE_DIR, 'signals.json')
+DAEMON_PID_PATH = os.path.join(DAEMON_STATE_DIR, 'daemon.pid')
+RETENTION_INTERVAL_SECONDS = 3600
 
-def get_api_key():
-    """Obtiene el API key, priorizando Legacy Token"""
-    # Prioridad: Legacy Token > Personal Token
-    if LABEL_STUDIO_LEGACY_API_KEY:
-        print("Using Legacy Token (no expira, más confiable para scripts)")
-        return LABEL_STUDIO_LEGACY_API_KEY, "legacy"
-    elif LABEL_STUDIO_PERSONAL_API_KEY:
-        print("Using Personal Access Token")
-        return LABEL_STUDIO_PERSONAL_API_KEY, "personal"
-    else:
-        print("❌ Error: Ni LABEL_STUDIO_LEGACY_API_KEY ni LABEL_STUDIO_PERSONAL_API_KEY están definidas")
-        print("\nDefine al menos una en tu archivo .env:")
-        print("  LABEL_STUDIO_LEGACY_API_KEY=tu_legacy_token")
-        print("  LABEL_STUDIO_PERSONAL_API_KEY=tu_personal_token")
-        return None, None
-
-def clean_old_exports(export_dir, days=3):
-    """
-    Elimina archivos en export_dir que tengan más de 'days' días.
-    """
-    now = time.time()
-    cutoff = now - days * 86400  # 86400 segundos por día
-    deleted_files = []
-    if os.path.exists(export_dir):
-        for filename in os.listdir(export_dir):
-            file_path = os.path.join(export_dir, filename)
-            if os.path.isfile(file_path):
-                try:
-                    file_mtime = os.path.getmtime(file_path)
-                    if file_mtime < cutoff:
-                        os.remove(file_path)
-                        deleted_files.append(filename)
-                except Exception as e:
-                    print(f"   ⚠️  No se pudo borrar '{filename}': {e}")
-    if deleted_files:
-        print(f"🧹 {len(deleted_files)} archivos viejos eliminados de {export_dir} (>{days} días).")
-    else:
-        print(f"🧹 No se encontraron archivos viejos para borrar en {export_dir}.")
-
-api_key, token_type = get_api_key()
+api_key, token_type = get_api_key(verbose=True)
 if not api_key:
+    print("❌ Error: Ni LABEL_STUDIO_LEGACY_API_KEY ni LABEL_STUDIO_PERSONAL_API_KEY están definidas")
+    print("\nDefine al menos una en tu archivo .env:")
+    print("  LABEL_STUDIO_LEGACY_API_KEY=tu_legacy_token")
+    print("  LABEL_STUDIO_PERSONAL_API_KEY=tu_personal_token")
     sys.exit(1)
 
 try:
-    client = LabelStudio(base_url=LABEL_STUDIO_URL, api_key=api_key)
-    usuario = client.users.whoami()
-    print(f"✅ Autenticado como: {usuario.username} ({usuario.email})\n")
+    # whoami se cachea (LS_AUTH_TTL): las corridas de cron no repiten el round trip
+    usuario = verify_auth()
+    cached_text = " [verificación en caché]" if usuario.cached else ""
+    print(f"✅ Autenticado como: {usuario.username} ({usuario.email}){cached_text}\n")
 except Exception as e:
-    print("❌ Error de autenticación:")
-    error_msg = str(e)
-    
-    if "401" in error_msg or "blacklist" in error_msg.lower() or "invalid" in error_msg.lower():
-        print("   Token inválido o revocado")
-        print("\n   Soluciones:")
-        print("   1. Verifica que el token sea correcto en .env")
-        if token_type == "personal":
-            print("   2. Los Personal Tokens expiran, regenera uno nuevo")
-        print("   3. Ve a Label Studio > Account & Settings > API Tokens")
-        print("   4. Copia el token correcto a tu .env\n")
-    else:
-        print(f"   {e}")
-        print("\n   Verifica que Label Studio esté ejecutándose\n")
+    print_auth_error(e, token_type)
     sys.exit(1)
 
-def export_all_projects(export_format="JSON"):
+def safe_filename(project_title):
+    """Convierte el título del proyecto en un nombre de archivo seguro"""
+    return "".join(
+        c for c in project_title
+        if c.isalnum() or c in (' ', '-', '_')
+    ).rstrip().replace(" ", "_")
+
+def build_export_url(project_id, export_format, task_ids=None):
+    """Construye la URL de exportación (opcionalmente filtrada por IDs de tasks)"""
+    url = f"{LABEL_STUDIO_URL.rstrip('/')}/api/projects/{project_id}/export?exportType={export_format}&download_all_tasks=false"
+    if task_ids:
+        url += "".join(f"&ids[]={task_id}" for task_id in task_ids)
+    return url
+
+http_session = get_http_session(EXPORT_WORKERS)
+snapshot_store = SnapshotStore(STORE_DIR)
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def host_slot(url):
+    """Semáforo por host: limita las descargas simultáneas contra un mismo servidor"""
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(max(1, EXPORT_MAX_PER_HOST))
+        return _host_slots[host]
+
+def download_export(url, filepath, export_format="JSON"):
+    """
+    Descarga una exportación en streaming usando la sesión compartida. Se
+    comprime al vuelo, se valida el JSON mientras llega y solo se publica
+    (rename atómico) si la descarga terminó completa.
+    Retorna (ruta_final, sha256, None) o (None, None, mensaje_error).
+    """
+    is_json = export_format == "JSON"
+    try:
+        with host_slot(url):
+            with http_session.get(url, stream=True, timeout=EXPORT_TIMEOUT) as response:
+                if response.status_code != 200:
+                    return None, None, f"HTTP {response.status_code}: {response.text[:500]}"
+                with StreamingExportWriter(filepath, compression=EXPORT_COMPRESSION,
+                                           validate_json=is_json) as writer:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        writer.write(chunk)
+                    return writer.commit(), writer.digest, None
+    except (requests.RequestException, ValueError) as e:
+        return None, None, str(e)
+
+def fetch_export_json(url):
+    """Descarga una exportación pequeña (p. ej. un lote de IDs) directo a memoria"""
+    with host_slot(url):
+        response = http_session.get(url, timeout=EXPORT_TIMEOUT)
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:500]}")
+    return response.json()
+
+def parse_timestamp(value):
+    """Convierte un updated_at (str ISO o datetime) a datetime con zona UTC"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def format_timestamp(value):
+    """Formatea un datetime como ISO UTC con sufijo Z (formato de Label Studio)"""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+def load_watermarks():
+    """Carga el estado {project_id: watermark} del modo delta"""
+    if not os.path.exists(DELTA_STATE_PATH):
+        return {}
+    try:
+        with open(DELTA_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️  No se pudo leer {DELTA_STATE_PATH} ({e}). Se hará exportación completa.")
+        return {}
+
+def save_watermarks(watermarks):
+    os.makedirs(DELTA_STATE_DIR, exist_ok=True)
+    write_json_atomic(DELTA_STATE_PATH, watermarks)
+
+def compute_watermark(tasks, previous=None):
+    """
+    Calcula el watermark (máximo updated_at de tasks y anotaciones, y máximo ID
+    de anotación) a partir de una lista de tasks exportadas.
+    """
+    max_updated = parse_timestamp(previous['updated_at']) if previous else None
+    max_annotation_id = previous.get('last_annotation_id', 0) if previous else 0
+
+    for task in tasks:
+        candidates = [task.get('updated_at')]
+        for annotation in task.get('annotations', []):
+            candidates.append(annotation.get('updated_at'))
+            max_annotation_id = max(max_annotation_id, annotation.get('id') or 0)
+        for candidate in candidates:
+            ts = parse_timestamp(candidate)
+            if ts and (max_updated is None or ts > max_updated):
+                max_updated = ts
+
+    return {
+        'updated_at': format_timestamp(max_updated) if max_updated else None,
+        'last_annotation_id': max_annotation_id,
+    }
+
+def updated_since_query(since):
+    """Query del Data Manager: tasks con updated_at posterior a 'since'"""
+    return {
+        "filters": {
+            "conjunction": "and",
+            "items": [{
+                "filter": "filter:tasks:updated_at",
+                "operator": "greater",
+                "type": "Datetime",
+                "value": format_timestamp(since),
+            }]
+        }
+    }
+
+def get_changed_tasks(project_id, since):
+    """
+    Lista (id, updated_at) de las tasks modificadas después de 'since'.
+    Solo pide los campos id y updated_at, sin anotaciones ni datos.
+    """
+    query = updated_since_query(since)
+    changed = []
+    tasks = iter_tasks(
+        get_client(),
+        project_id,
+        include=('id', 'updated_at'),
+        query=json.dumps(query),
+        page_size=DELTA_PAGE_SIZE,
+    )
+    for task in tasks:
+        updated_at = parse_timestamp(getattr(task, 'updated_at', None))
+        # El filtro del servidor puede redondear; se revalida localmente
+        if updated_at is None or updated_at > since:
+            changed.append((task.id, updated_at))
+    return changed
+
+def download_tasks_by_id(project_id, task_ids, export_format):
+    """Descarga las tasks indicadas en lotes de IDs y retorna la lista combinada"""
+    tasks = []
+    for start in range(0, len(task_ids), DELTA_IDS_PER_REQUEST):
+        chunk = task_ids[start:start + DELTA_IDS_PER_REQUEST]
+        tasks.extend(fetch_export_json(build_export_url(project_id, export_format, chunk)))
+    return tasks
+
+def current_view_path(safe_title, project_id):
+    filename = f"{safe_title}_{project_id}_current.json{COMPRESSION_EXTENSIONS[EXPORT_COMPRESSION]}"
+    return os.path.join(CURRENT_DIR, filename)
+
+def update_current_view(safe_title, project_id, changed_ids, delta_tasks, full_tasks=None, live_ids=None,
+                        log=print):
+    """
+    Mantiene la vista fusionada 'current' del proyecto: reemplaza las tasks
+    modificadas por su versión nueva y quita las que ya no tienen anotaciones.
+    Con 'live_ids' (IDs de todas las tasks del proyecto) quita además las
+    tasks borradas en Label Studio, que el filtro por updated_at no ve.
+    """
+    os.makedirs(CURRENT_DIR, exist_ok=True)
+    current_path = current_view_path(safe_title, project_id)
+    base_path = current_path[:len(current_path) - len(COMPRESSION_EXTENSIONS[EXPORT_COMPRESSION])]
+
+    if full_tasks is not None:
+        merged = {task['id']: task for task in full_tasks}
+    else:
+        merged = {}
+        if os.path.exists(current_path):
+            merged = {task['id']: task for task in load_export(current_path)}
+        for task_id in changed_ids:
+            merged.pop(task_id, None)
+        for task in delta_tasks:
+            merged[task['id']] = task
+        if live_ids is not None:
+            # Las tasks recién descargadas se conservan aunque sean más nuevas que 'live_ids'
+            fresh = {task['id'] for task in delta_tasks}
+            deleted = [task_id for task_id in merged if task_id not in live_ids and task_id not in fresh]
+            for task_id in deleted:
+                del merged[task_id]
+            if deleted:
+                log(f"   🗑️ {len(deleted)} tasks borradas en Label Studio quitadas de la vista actual")
+            elif not changed_ids and not delta_tasks:
+                return  # nada que reescribir
+
+    write_json_atomic(base_path, [merged[task_id] for task_id in sorted(merged)],
+                      compression=EXPORT_COMPRESSION)
+    log(f"   🧩 Vista actual: {os.path.basename(current_path)} ({len(merged)} tasks)")
+
+def export_project(project, export_format, timestamp, log=print):
+    """Exportación completa de un proyecto. Retorna la ruta del archivo o None."""
+    safe_title = safe_filename(project.title)
+    filename = f"{safe_title}_{project.id}_{timestamp}.json"
+    filepath = os.path.join(EXPORT_DIR, filename)
+
+    log(f"   Descargando...")
+    final_path, digest, error = download_export(
+        build_export_url(project.id, export_format), filepath, export_format
+    )
+
+    if final_path:
+        changed = snapshot_store.add_snapshot(project.id, final_path, digest, timestamp)
+        file_size = os.path.getsize(final_path)
+        log(f"   ✅ Guardado: {os.path.basename(final_path)}")
+        if changed:
+            log(f"   💾 Tamaño: {file_size:,} bytes")
+        else:
+            log(f"   🔁 Sin cambios (sha256 {digest[:12]}): hardlink al snapshot anterior, 0 bytes nuevos")
+        return final_path
+
+    log(f"   ❌ Error exportando:")
+    if error:
+        log(f"   {error}")
+    return None
+
+def export_project_delta(project, export_format, timestamp, previous, merge=False, log=print):
+    """
+    Exportación incremental de un proyecto: solo descarga las tasks cuyo
+    updated_at es posterior al watermark 'previous'. Sin watermark previo hace
+    una exportación completa y la usa como punto de partida.
+    Retorna (ok, nuevo_watermark).
+    """
+    safe_title = safe_filename(project.title)
+
+    # Sin watermark (o sin vista actual que fusionar) se parte de un export completo
+    needs_seed = merge and not os.path.exists(current_view_path(safe_title, project.id))
+    if not previous or not previous.get('updated_at') or needs_seed:
+        log("   ℹ️  Sin watermark previo: exportación completa inicial")
+        # El watermark es el último updated_at visto ANTES de descargar: lo que
+        # se modifique durante la descarga queda después y entra en la próxima corrida
+        listed = newest_task_update(project.id)
+        filepath = export_project(project, export_format, timestamp, log=log)
+        if not filepath:
+            return False, previous
+        tasks = load_export(filepath)
+        watermark = compute_watermark(tasks)
+        # Proyecto sin tasks: se arranca desde ahora
+        watermark['updated_at'] = format_timestamp(listed or datetime.now(timezone.utc))
+        if merge:
+            update_current_view(safe_title, project.id, [], [], full_tasks=tasks, log=log)
+        return True, {**watermark, 'exported_at': timestamp}
+
+    since = parse_timestamp(previous['updated_at'])
+    log(f"   🔎 Buscando cambios desde {previous['updated_at']}...")
+    changed = get_changed_tasks(project.id, since)
+
+    # Los borrados no cambian ningún updated_at: cada EXPORT_RECONCILE_EVERY
+    # corridas se compara current/ con los IDs vigentes del proyecto
+    runs = previous.get('runs_since_reconcile', 0) + 1
+    live_ids = None
+    if merge and EXPORT_RECONCILE_EVERY > 0 and runs >= EXPORT_RECONCILE_EVERY:
+        live_ids = set(iter_task_ids(get_client(), project.id))
+        runs = 0
+
+    if not changed:
+        log("   💤 Sin cambios desde la última exportación")
+        if live_ids is not None:
+            update_current_view(safe_title, project.id, [], [], live_ids=live_ids, log=log)
+        return True, {**previous, 'runs_since_reconcile': runs}
+
+    changed_ids = [task_id for task_id, _ in changed]
+    log(f"   Descargando {len(changed_ids)} tasks modificadas...")
+    filename = f"{safe_title}_{project.id}_{timestamp}_delta.json"
+    filepath = os.path.join(EXPORT_DIR, filename)
+    delta_tasks = download_tasks_by_id(project.id, changed_ids, export_format)
+
+    filepath = write_json_atomic(filepath, delta_tasks, compression=EXPORT_COMPRESSION)
+    log(f"   ✅ Guardado: {os.path.basename(filepath)}")
+    log(f"   💾 Tamaño: {os.path.getsize(filepath):,} bytes ({len(delta_tasks)} tasks etiquetadas)")
+
+    if merge:
+        update_current_view(safe_title, project.id, changed_ids, delta_tasks, live_ids=live_ids, log=log)
+
+    watermark = compute_watermark(delta_tasks, previous)
+    # El watermark avanza solo hasta lo listado en get_changed_tasks: las tasks
+    # descargadas pueden haberse guardado de nuevo durante la descarga, y usar
+    # ese updated_at saltearía las tasks modificadas en esa ventana que no se
+    # listaron. (También cubre las tasks que perdieron sus anotaciones.)
+    changed_max = max((ts for _, ts in changed if ts), default=None)
+    watermark['updated_at'] = format_timestamp(changed_max) if changed_max else previous['updated_at']
+    return True, {**watermark, 'exported_at': timestamp, 'runs_since_reconcile': runs}
+
+def run_project_export(project, export_format, delta, previous, merge):
+    """
+    Unidad de trabajo de un hilo: exporta un proyecto acumulando su salida
+    para imprimirla en bloque (evita mezclar líneas de proyectos distintos).
+    Retorna (ok, watermark, segundos, líneas_de_log).
+    """
+    lines = [f"🔄 Exportando: {project.title} (ID: {project.id})"]
+    started = time.monotonic()
+    ok, watermark = False, previous
+    try:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if delta:
+            ok, watermark = export_project_delta(
+                project, export_format, timestamp, previous, merge=merge, log=lines.append
+            )
+        else:
+            ok = export_project(project, export_format, timestamp, log=lines.append) is not None
+    except Exception as e:
+        lines.append(f"   ❌ Error: {str(e)}")
+    return ok, watermark, time.monotonic() - started, lines
+
+def run_retention():
+    """Retención escalonada: lo vencido se compacta en archive/ en lugar de borrarse"""
+    print_retention_summary(apply_retention(snapshot_store, EXPORT_DIR))
+    freed = snapshot_store.prune(EXPORT_DIR)
+    if freed:
+        print(f"🧹 {freed:,} bytes liberados de objetos sin referencias")
+
+def export_projects(executor, projects, export_format, delta, merge):
+    """
+    Exporta 'projects' en el pool 'executor' imprimiendo la salida de cada uno
+    en bloque. Retorna (proyectos_ok, títulos_fallidos, segundos_secuenciales).
+    """
+    exported = []
+    failed_projects = []
+    sequential_seconds = 0.0
+    watermarks = load_watermarks() if delta else {}
+    futures = {
+        executor.submit(
+            run_project_export, project, export_format, delta,
+            watermarks.get(str(project.id)), merge
+        ): project
+        for project in projects
+    }
+    for future in as_completed(futures):
+        project = futures[future]
+        ok, watermark, elapsed, lines = future.result()
+        sequential_seconds += elapsed
+        print("\n".join(lines))
+        print(f"   ⏱️  {elapsed:.1f}s\n")
+        if ok:
+            exported.append(project)
+        else:
+            failed_projects.append(project.title)
+        if delta and watermark:
+            # Solo el hilo principal escribe el estado
+            watermarks[str(project.id)] = watermark
+            save_watermarks(watermarks)
+    return exported, failed_projects, sequential_seconds
+
+def export_all_projects(export_format="JSON", delta=False, merge=False, workers=EXPORT_WORKERS):
     """
-    Exporta todos los proyectos usando curl al API.
-    Solo exporta tareas etiquetadas (download_all_tasks=false)
+    Exporta todos los proyectos en paralelo (pool de hilos + sesión HTTP compartida).
+    Solo exporta tareas etiquetadas (download_all_tasks=false).
+    Con delta=True solo descarga las tasks modificadas desde la última
+    exportación y, con merge=True, mantiene una vista fusionada en current/.
     """
+    if delta and export_format != "JSON":
+        print(f"⚠️  El modo delta solo soporta JSON; se usará exportación completa en {export_format}")
+        delta = False
+
     print(f"🚀 Iniciando exportación - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"   Formato: {export_format}")
-    print(f"   Modo: Solo tareas etiquetadas\n")
+    print(f"   Modo: Solo tareas etiquetadas{' (delta)' if delta else ''}")
+    print(f"   Concurrencia: {workers} hilos, máx. {EXPORT_MAX_PER_HOST} descargas por host\n")
 
     try:
-        projects = list(client.projects.list())
+        # Sin caché: un proyecto recién creado o borrado no puede quedar fuera
+        projects = list_projects(fresh=True)
         if not projects:
             print("No se encontraron proyectos para exportar.")
             return True
 
         print(f"📋 Encontrados {len(projects)} proyectos\n")
         os.makedirs(EXPORT_DIR, exist_ok=True)
-        # Limpiar archivos viejos antes de exportar
-        clean_old_exports(EXPORT_DIR, days=2)
-        success_count = 0
-
-        for project in projects:
-            project_id = project.id
-            project_title = project.title
+        run_retention()
+        wall_started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            exported, failed_projects, sequential_seconds = export_projects(
+                executor, projects, export_format, delta, merge
+            )
+        success_count = len(exported)
 
-            print(f"🔄 Exportando: {project_title} (ID: {project_id})")
-            try:
-                safe_title = "".join(
-                    c for c in project_title
-                    if c.isalnum() or c in (' ', '-', '_')
-                ).rstrip().replace(" ", "_")
-                
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{safe_title}_{project_id}_{timestamp}.json"
-                filepath = os.path.join(EXPORT_DIR, filename)
-
-                url = f"{LABEL_STUDIO_URL.rstrip('/')}/api/projects/{project_id}/export?exportType={export_format}&download_all_tasks=false"
-                
-                # Usar Authorization header correcto según el tipo de token
-                if token_type == "legacy":
-                    auth_header = f"Authorization: Token {api_key}"
-                else:  # personal
-                    auth_header = f"Authorization: Bearer {api_key}"
-                
-                curl_cmd = [
-                    "curl", "-s", "-X", "GET", url,
-                    "-H", auth_header,
-                    "--output", filepath,
-                    "--show-error"
-                ]
-                
-                print(f"   Descargando...")
-                result = subprocess.run(curl_cmd, capture_output=True, text=True)
-                
-                if result.returncode == 0 and os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-                    file_size = os.path.getsize(filepath)
-                    print(f"   ✅ Guardado: {filename}")
-                    print(f"   💾 Tamaño: {file_size:,} bytes\n")
-                    success_count += 1
-                else:
-                    print(f"   ❌ Error exportando:")
-                    if result.stderr:
-                        print(f"   {result.stderr}")
-                    if os.path.exists(filepath) and os.path.getsize(filepath) == 0:
-                        os.remove(filepath)
-                    print()
-                    
-            except Exception as e:
-                print(f"   ❌ Error: {str(e)}\n")
-                
+        wall_seconds = time.monotonic() - wall_started
         print(f"🎉 Exportación completada: {success_count}/{len(projects)} proyectos")
+        if failed_projects:
+            print(f"   ❌ Fallaron: {', '.join(failed_projects)}")
+        print(f"⏱️  Tiempo total: {wall_seconds:.1f}s "
+              f"(secuencial estimado: {sequential_seconds:.1f}s, "
+              f"ahorro: {max(0.0, sequential_seconds - wall_seconds):.1f}s)")
         return success_count > 0
 
     except Exception as e:
@@ -158,7 +464,186 @@ def export_all_projects(export_format="JSON"):
         traceback.print_exc()
         return False
 
+def newest_task_update(project_id, since=None):
+    """
+    updated_at (del servidor) de la task modificada más recientemente: una
+    página de una task, con solo id y updated_at, filtrada desde 'since'.
+    None si no hay tasks (o ninguna posterior a 'since').
+    """
+    query = updated_since_query(since) if since else {}
+    query["ordering"] = ["-tasks:updated_at"]
+    items = fetch_task_page(get_client(), project_id, 1, page_size=1, include='id,updated_at',
+                            query=json.dumps(query))
+    newest = None
+    for task in items:
+        updated_at = parse_timestamp(getattr(task, 'updated_at', None))
+        if updated_at and (newest is None or updated_at > newest):
+            newest = updated_at
+    return newest
+
+def project_signal(project, since=None):
+    """
+    Señal barata de cambios de un proyecto: los conteos que ya trae el listado
+    y el updated_at de la task modificada más recientemente desde 'since'.
+    """
+    newest = parse_timestamp(since)
+    latest = newest_task_update(project.id, newest)
+    if latest and (newest is None or latest > newest):
+        newest = latest
+    return {
+        'task_number': getattr(project, 'task_number', None),
+        'num_tasks_with_annotations': getattr(project, 'num_tasks_with_annotations', None),
+        'total_annotations_number': getattr(project, 'total_annotations_number', None),
+        'updated_at': format_timestamp(newest) if newest else None,
+    }
+
+def load_daemon_state():
+    """Última señal exportada por proyecto {project_id: señal}"""
+    try:
+        with open(DAEMON_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def acquire_daemon_lock():
+    """Lock exclusivo del daemon (el archivo guarda el PID); None si ya hay otro corriendo"""
+    os.makedirs(DAEMON_STATE_DIR, exist_ok=True)
+    handle = open(DAEMON_PID_PATH, 'a+')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(f"{os.getpid()}\n")
+    handle.flush()
+    return handle
+
+class ExportDaemon:
+    """
+    Exportación continua con un cliente ya autenticado: consulta la señal de
+    cambios de cada proyecto y solo exporta los que cambiaron, respetando el
+    debounce y la antigüedad máxima de un cambio sin exportar.
+    """
+
+    def __init__(self, export_format="JSON", delta=False, merge=False, workers=EXPORT_WORKERS,
+                 poll_seconds=EXPORT_POLL_SECONDS, debounce_seconds=EXPORT_DEBOUNCE_SECONDS,
+                 max_staleness_seconds=EXPORT_MAX_STALENESS_SECONDS):
+        self.export_format = export_format
+        self.delta = delta
+        self.merge = merge
+        self.workers = max(1, workers)
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self.exported = load_daemon_state()  # señal al momento de la última exportación
+        self.observed = {}                   # última señal vista
+        self.pending = {}                    # {project_id: {'first': t, 'last': t}} cambios sin exportar
+        self.last_retention = None
+        self.stop_event = threading.Event()
+
+    def poll(self):
+        """Actualiza las señales y retorna los proyectos que toca exportar"""
+        now = time.monotonic()
+        projects = {str(project.id): project for project in list_projects(fresh=True)}
+        for key, project in projects.items():
+            previous = self.observed.get(key) or self.exported.get(key) or {}
+            try:
+                current = project_signal(project, since=previous.get('updated_at'))
+            except Exception as e:
+                print(f"⚠️  {project.title}: no se pudo consultar la señal de cambios ({e})")
+                continue
+            if current == self.observed.get(key):
+                continue
+            self.observed[key] = current
+            if current == self.exported.get(key):
+                self.pending.pop(key, None)
+            elif key not in self.pending:
+                # Sin exportación registrada no hay nada que esperar
+                first = now if key in self.exported else now - self.max_staleness_seconds
+                self.pending[key] = {'first': first, 'last': now}
+                print(f"🔔 Cambios en {project.title} (ID: {project.id}): {current}")
+            else:
+                self.pending[key]['last'] = now
+        for key in list(self.pending):
+            if key not in projects:
+                self.pending.pop(key)  # proyecto borrado
+        return [
+            projects[key] for key, entry in self.pending.items()
+            if now - entry['last'] >= self.debounce_seconds or now - entry['first'] >= self.max_staleness_seconds
+        ]
+
+    def export(self, executor, projects):
+        print(f"🚀 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - exportando {len(projects)} proyecto(s) con cambios\n")
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        exported, failed_projects, _ = export_projects(
+            executor, projects, self.export_format, self.delta, self.merge
+        )
+        now = time.monotonic()
+        for project in exported:
+            key = str(project.id)
+            self.exported[key] = self.observed.get(key)
+            self.pending.pop(key, None)
+        for project in projects:
+            if project not in exported:
+                # Se reintenta después de otro período de debounce
+                self.pending[str(project.id)] = {'first': now, 'last': now}
+        if exported:
+            os.makedirs(DAEMON_STATE_DIR, exist_ok=True)
+            write_json_atomic(DAEMON_STATE_PATH, self.exported)
+        if failed_projects:
+            print(f"   ❌ Fallaron: {', '.join(failed_projects)} (se reintentará)")
+
+    def stop(self, signum=None, frame=None):
+        self.stop_event.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print(f"👀 Daemon de exportación - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"   Formato: {self.export_format}{' (delta)' if self.delta else ''}")
+        print(f"   Sondeo cada {self.poll_seconds}s, debounce {self.debounce_seconds}s, "
+              f"antigüedad máxima {self.max_staleness_seconds}s\n")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    due = self.poll()
+                    if due:
+                        self.export(executor, due)
+                    if self.last_retention is None or started - self.last_retention >= RETENTION_INTERVAL_SECONDS:
+                        os.makedirs(EXPORT_DIR, exist_ok=True)
+                        run_retention()
+                        self.last_retention = started
+                except Exception as e:
+                    print(f"❌ Error en el ciclo de sondeo: {e}")
+                self.stop_event.wait(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+        print(f"👋 Daemon detenido - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+def run_daemon(export_format="JSON", delta=False, merge=False):
+    """Corre el daemon si no hay otro activo. Retorna el código de salida."""
+    if delta and export_format != "JSON":
+        print(f"⚠️  El modo delta solo soporta JSON; se usará exportación completa en {export_format}")
+        delta = False
+    lock = acquire_daemon_lock()
+    if lock is None:
+        print(f"ℹ️  Ya hay un daemon de exportación corriendo (ver {DAEMON_PID_PATH})")
+        return 0
+    sys.stdout.reconfigure(line_buffering=True)  # la salida suele ir a un archivo de log
+    try:
+        ExportDaemon(export_format=export_format, delta=delta, merge=merge).run()
+    finally:
+        lock.close()
+    return 0
+
 if __name__ == "__main__":
-    export_format = sys.argv[1].upper() if len(sys.argv) > 1 else "JSON"
-    success = export_all_projects(export_format=export_format)
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = {arg for arg in sys.argv[1:] if arg.startswith('--')}
+    export_format = args[0].upper() if args else "JSON"
+    delta = '--delta' in flags or os.getenv('EXPORT_MODE', '').lower() == 'delta'
+    merge = '--merge' in flags
+    if '--daemon' in flags:
+        sys.exit(run_daemon(export_format=export_format, delta=delta, merge=merge))
+    success = export_all_projects(export_format=export_format, delta=delta, merge=merge)
+    sys.exit(0 if success else 1)
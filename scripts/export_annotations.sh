@@ -7,6 +7,13 @@ set -e
 
 LOG_DIR="/exports/logs"
 LOG_FILE="$LOG_DIR/export_$(date +%Y%m%d_%H%M%S).log"
+DAEMON_PID_FILE="/exports/annotations/.daemon/daemon.pid"
+
+# Con el daemon de exportación activo (export_annotations.py --daemon) la
+# corrida de cron sobra: el daemon ya exporta cada proyecto al cambiar
+if [ -f "$DAEMON_PID_FILE" ] && ! flock -n "$DAEMON_PID_FILE" true 2>/dev/null; then
+    exit 0
+fi
 
 # Crear directorio de logs
 mkdir -p "$LOG_DIR"
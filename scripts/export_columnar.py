@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Compila snapshots de exportación (JSON anidado) a tablas columnares.
+
+Cada snapshot se recorre en streaming y se aplana en cuatro tablas:
+
+    tasks           una fila por task (data queda como JSON en 'data')
+    annotations     una fila por anotación
+    regions         una fila por región: los ítems 'labels' y 'choices' del
+                    result que comparten 'id' se unen en la misma fila
+                    (las choices quedan en la columna map 'choices')
+    region_choices  una fila por (región, from_name, choice), para filtrar y
+                    agrupar por atributo sin recorrer el map
+
+Las tablas se escriben como Parquet (zstd) o Arrow IPC en
+EXPORT_DIR/columnar/<snapshot>/, en row groups de COLUMNAR_BATCH_TASKS tasks,
+así la memoria no depende del tamaño del snapshot.
+
+Uso:
+    python3 export_columnar.py                      # compila los snapshots nuevos
+    python3 export_columnar.py snapshot.json.gz ... # compila los indicados
+    python3 export_columnar.py --format arrow --out /tmp/columnar --force
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from export_store import SNAPSHOT_TIMESTAMP_RE, open_export
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+EXPORT_DIR = '/exports/annotations'
+COLUMNAR_DIR = os.path.join(EXPORT_DIR, 'columnar')
+COLUMNAR_FORMAT = os.getenv('COLUMNAR_FORMAT', 'parquet')
+COLUMNAR_BATCH_TASKS = int(os.getenv('COLUMNAR_BATCH_TASKS', '5000'))
+
+TABLE_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+SCHEMAS = {
+    'tasks': pa.schema([
+        ('task_id', pa.int64()),
+        ('project_id', pa.int64()),
+        ('inner_id', pa.int64()),
+        ('created_at', TIMESTAMP),
+        ('updated_at', TIMESTAMP),
+        ('total_annotations', pa.int32()),
+        ('cancelled_annotations', pa.int32()),
+        ('total_predictions', pa.int32()),
+        ('data', pa.string()),
+    ]),
+    'annotations': pa.schema([
+        ('annotation_id', pa.int64()),
+        ('task_id', pa.int64()),
+        ('project_id', pa.int64()),
+        ('completed_by', pa.int64()),
+        ('was_cancelled', pa.bool_()),
+        ('ground_truth', pa.bool_()),
+        ('lead_time', pa.float64()),
+        ('result_count', pa.int32()),
+        ('created_at', TIMESTAMP),
+        ('updated_at', TIMESTAMP),
+    ]),
+    'regions': pa.schema([
+        ('annotation_id', pa.int64()),
+        ('task_id', pa.int64()),
+        ('completed_by', pa.int64()),
+        ('region_id', pa.string()),
+        ('from_name', pa.string()),
+        ('to_name', pa.string()),
+        ('type', pa.string()),
+        ('label', pa.string()),
+        ('labels', pa.list_(pa.string())),
+        ('text', pa.string()),
+        ('start_offset', pa.int32()),
+        ('end_offset', pa.int32()),
+        ('global_start', pa.int32()),
+        ('global_end', pa.int32()),
+        ('origin', pa.string()),
+        ('choices', pa.map_(pa.string(), pa.list_(pa.string()))),
+    ]),
+    'region_choices': pa.schema([
+        ('annotation_id', pa.int64()),
+        ('task_id', pa.int64()),
+        ('completed_by', pa.int64()),
+        ('region_id', pa.string()),
+        ('from_name', pa.string()),
+        ('choice', pa.string()),
+    ]),
+}
+
+
+def iter_export_tasks(path):
+    """Tasks de un snapshot (comprimido o no), leídas en streaming si hay ijson"""
+    with open_export(path, 'rb') as f:
+        if ijson is None:
+            yield from json.load(f)
+            return
+        yield from ijson.items(f, 'item', use_float=True)
+
+
+def user_id(value):
+    """completed_by puede venir como id o como objeto usuario"""
+    if isinstance(value, dict):
+        return value.get('id')
+    return value
+
+
+def as_int(value):
+    return int(value) if isinstance(value, (int, float)) else None
+
+
+def empty_columns():
+    return {name: {field: [] for field in schema.names} for name, schema in SCHEMAS.items()}
+
+
+def flatten_regions(annotation, task_id, columns):
+    """Agrupa los ítems del result por id de región y los agrega a regions/region_choices"""
+    annotation_id = annotation.get('id')
+    completed_by = user_id(annotation.get('completed_by'))
+    regions = {}
+    for position, item in enumerate(annotation.get('result') or []):
+        region_id = item.get('id') or f"_{position}"
+        value = item.get('value') or {}
+        region = regions.get(region_id)
+        if region is None:
+            region = regions[region_id] = {
+                'from_name': item.get('from_name'), 'to_name': item.get('to_name'),
+                'type': item.get('type'), 'labels': None, 'text': None,
+                'start_offset': None, 'end_offset': None, 'global_start': None, 'global_end': None,
+                'origin': item.get('origin'), 'choices': {},
+            }
+        if value.get('labels') is not None:
+            # El ítem de etiqueta define la región; las choices con el mismo id son atributos
+            region.update(from_name=item.get('from_name'), type=item.get('type'), labels=value['labels'])
+        if region['text'] is None and 'text' in value:
+            offsets = value.get('globalOffsets') or {}
+            region.update(
+                text=value.get('text'),
+                start_offset=as_int(value.get('startOffset', value.get('start'))),
+                end_offset=as_int(value.get('endOffset', value.get('end'))),
+                global_start=as_int(offsets.get('start')),
+                global_end=as_int(offsets.get('end')),
+            )
+        if value.get('choices') is not None:
+            region['choices'][item.get('from_name')] = value['choices']
+            for choice in value['choices']:
+                rows = columns['region_choices']
+                rows['annotation_id'].append(annotation_id)
+                rows['task_id'].append(task_id)
+                rows['completed_by'].append(completed_by)
+                rows['region_id'].append(region_id)
+                rows['from_name'].append(item.get('from_name'))
+                rows['choice'].append(choice)
+
+    rows = columns['regions']
+    for region_id, region in regions.items():
+        labels = region['labels']
+        rows['annotation_id'].append(annotation_id)
+        rows['task_id'].append(task_id)
+        rows['completed_by'].append(completed_by)
+        rows['region_id'].append(region_id)
+        rows['label'].append(labels[0] if labels else None)
+        rows['choices'].append(list(region.pop('choices').items()))
+        for field, value in region.items():
+            rows[field].append(value)
+
+
+def flatten_task(task, columns):
+    """Agrega una task (con sus anotaciones y regiones) a las columnas acumuladas"""
+    task_id = task.get('id')
+    project_id = task.get('project')
+    rows = columns['tasks']
+    rows['task_id'].append(task_id)
+    rows['project_id'].append(project_id)
+    rows['inner_id'].append(task.get('inner_id'))
+    rows['created_at'].append(task.get('created_at'))
+    rows['updated_at'].append(task.get('updated_at'))
+    rows['total_annotations'].append(task.get('total_annotations'))
+    rows['cancelled_annotations'].append(task.get('cancelled_annotations'))
+    rows['total_predictions'].append(task.get('total_predictions'))
+    rows['data'].append(json.dumps(task.get('data'), ensure_ascii=False))
+
+    rows = columns['annotations']
+    for annotation in task.get('annotations') or []:
+        rows['annotation_id'].append(annotation.get('id'))
+        rows['task_id'].append(task_id)
+        rows['project_id'].append(project_id)
+        rows['completed_by'].append(user_id(annotation.get('completed_by')))
+        rows['was_cancelled'].append(annotation.get('was_cancelled'))
+        rows['ground_truth'].append(annotation.get('ground_truth'))
+        rows['lead_time'].append(annotation.get('lead_time'))
+        rows['result_count'].append(len(annotation.get('result') or []))
+        rows['created_at'].append(annotation.get('created_at'))
+        rows['updated_at'].append(annotation.get('updated_at'))
+        flatten_regions(annotation, task_id, columns)
+
+
+def build_table(name, columns):
+    """pa.Table con el esquema fijo de la tabla (los timestamps ISO se castean)"""
+    schema = SCHEMAS[name]
+    arrays = []
+    for field in schema:
+        if field.type == TIMESTAMP:
+            arrays.append(pa.array(columns[field.name], type=pa.string()).cast(TIMESTAMP))
+        else:
+            arrays.append(pa.array(columns[field.name], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class TableWriters:
+    """Un writer Parquet/Arrow por tabla, escribiendo a un directorio temporal"""
+
+    def __init__(self, directory, table_format):
+        self.directory = directory
+        self.table_format = table_format
+        self.writers = {}
+        for name, schema in SCHEMAS.items():
+            path = os.path.join(directory, name + TABLE_EXTENSIONS[table_format])
+            if table_format == 'parquet':
+                self.writers[name] = pq.ParquetWriter(path, schema, compression='zstd')
+            else:
+                self.writers[name] = pa.ipc.new_file(pa.OSFile(path, 'wb'), schema)
+
+    def write(self, columns):
+        for name, writer in self.writers.items():
+            writer.write_table(build_table(name, columns[name]))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def compiled_dir_for(snapshot_path, out_dir=COLUMNAR_DIR):
+    """columnar/<nombre del snapshot sin extensiones>/"""
+    stem = os.path.basename(snapshot_path).split('.', 1)[0]
+    return os.path.join(out_dir, stem)
+
+
+def compile_snapshot(snapshot_path, out_dir=COLUMNAR_DIR, table_format=COLUMNAR_FORMAT,
+                     batch_tasks=COLUMNAR_BATCH_TASKS):
+    """
+    Compila un snapshot a out_dir/<snapshot>/{tasks,annotations,regions,region_choices}.
+    El directorio final aparece de forma atómica (rename). Retorna (directorio, filas por tabla).
+    """
+    if table_format not in TABLE_EXTENSIONS:
+        raise ValueError(f"Formato columnar no soportado: {table_format}")
+    final_dir = compiled_dir_for(snapshot_path, out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=out_dir, prefix=f".{os.path.basename(final_dir)}.")
+    counts = {name: 0 for name in SCHEMAS}
+
+    writers = TableWriters(tmp_dir, table_format)
+    try:
+        columns, pending = empty_columns(), 0
+        for task in iter_export_tasks(snapshot_path):
+            flatten_task(task, columns)
+            pending += 1
+            if pending >= batch_tasks:
+                writers.write(columns)
+                for name in SCHEMAS:
+                    counts[name] += len(columns[name][SCHEMAS[name].names[0]])
+                columns, pending = empty_columns(), 0
+        writers.write(columns)
+        for name in SCHEMAS:
+            counts[name] += len(columns[name][SCHEMAS[name].names[0]])
+        writers.close()
+    except BaseException:
+        writers.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    os.chmod(tmp_dir, 0o755)
+    if os.path.isdir(final_dir):
+        shutil.rmtree(final_dir)
+    os.replace(tmp_dir, final_dir)
+    return final_dir, counts
+
+
+def read_table(compiled_dir, name, columns=None):
+    """Lee una tabla compilada (Parquet o Arrow), opcionalmente solo algunas columnas"""
+    parquet_path = os.path.join(compiled_dir, name + '.parquet')
+    if os.path.exists(parquet_path):
+        return pq.read_table(parquet_path, columns=columns)
+    with pa.memory_map(os.path.join(compiled_dir, name + '.arrow')) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+
+def list_snapshots(export_dir=EXPORT_DIR):
+    """Snapshots completos (no delta) del directorio de exportación"""
+    snapshots = []
+    for name in sorted(os.listdir(export_dir)):
+        match = SNAPSHOT_TIMESTAMP_RE.search(name)
+        if match and '_delta.' not in name and os.path.isfile(os.path.join(export_dir, name)):
+            snapshots.append(os.path.join(export_dir, name))
+    return snapshots
+
+
+def main(argv):
+    table_format, out_dir, force, paths = COLUMNAR_FORMAT, COLUMNAR_DIR, False, []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--format':
+            table_format = next(args, table_format)
+        elif arg == '--out':
+            out_dir = next(args, out_dir)
+        elif arg == '--force':
+            force = True
+        else:
+            paths.append(arg)
+
+    if not paths:
+        paths = list_snapshots()
+        print(f"🔍 {len(paths)} snapshots en {EXPORT_DIR}")
+
+    compiled = skipped = failed = 0
+    for path in paths:
+        target = compiled_dir_for(path, out_dir)
+        if os.path.isdir(target) and not force:
+            skipped += 1
+            continue
+        try:
+            final_dir, counts = compile_snapshot(path, out_dir, table_format)
+        except Exception as e:
+            failed += 1
+            print(f"❌ {os.path.basename(path)}: {e}")
+            continue
+        compiled += 1
+        print(f"✅ {os.path.basename(path)} -> {final_dir} "
+              f"({counts['tasks']} tasks, {counts['annotations']} anotaciones, "
+              f"{counts['regions']} regiones, {counts['region_choices']} choices)")
+
+    print(f"📊 Compilados: {compiled} | Ya existentes: {skipped} | Con error: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
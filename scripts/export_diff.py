@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Diferencias entre dos snapshots de exportación de un proyecto.
+
+1. Cada snapshot se recorre en streaming y se indexa por task y anotación:
+   updated_at, autor y un hash del contenido de la anotación y de cada una
+   de sus regiones (los ítems del result con el mismo id: la etiqueta y sus
+   choices). El índice guarda hashes de 8 bytes, no el contenido, así que la
+   memoria depende de la cantidad de anotaciones y regiones, no del tamaño
+   de los archivos.
+2. Comparando los índices salen las tasks con cambios.
+3. Solo de esas tasks se vuelve a leer (otra pasada en streaming) el detalle
+   de las regiones agregadas, quitadas o modificadas.
+
+El resultado es un change set con una línea JSON por task:
+
+    {"task_id": ..., "change": "added|removed|modified",
+     "annotations": [{"annotation_id": ..., "change": "added|removed|modified",
+                      "completed_by": ..., "updated_at": {"old": ..., "new": ...},
+                      "regions": {"added": [...], "removed": [...], "modified": [{"id", "old", "new"}]}}]}
+
+Uso:
+    python3 export_diff.py <viejo.json[.gz]> <nuevo.json[.gz]>            # resumen
+    python3 export_diff.py <viejo> <nuevo> --out cambios.jsonl            # change set
+    python3 export_diff.py <viejo> <nuevo> --ids                          # IDs de tasks con cambios
+    python3 export_diff.py --project 2 [--dir exports/annotations] ...    # los dos últimos snapshots del proyecto
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+from export_retention import EXPORT_NAME_RE
+from task_preannotate import GAZETTEER_EXPORT_DIR, iter_snapshot_tasks
+
+DIFF_EXPORT_DIR = os.getenv('DIFF_EXPORT_DIR', GAZETTEER_EXPORT_DIR)
+CHANGE_KINDS = ('added', 'removed', 'modified')
+
+
+def content_hash(value):
+    """Hash corto (8 bytes) del JSON canónico de 'value'"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=8).digest()
+
+
+def group_regions(result):
+    """{region_id: [ítems del result]}; los ítems sin id se identifican por su posición"""
+    regions = {}
+    for position, item in enumerate(result or []):
+        regions.setdefault(item.get('id') or f"_{position}", []).append(item)
+    return regions
+
+
+def annotation_fingerprint(annotation):
+    """Lo que define el contenido de una anotación (sin fechas ni contadores)"""
+    return {
+        'result': annotation.get('result') or [],
+        'was_cancelled': annotation.get('was_cancelled'),
+        'ground_truth': annotation.get('ground_truth'),
+    }
+
+
+def completed_by(annotation):
+    value = annotation.get('completed_by')
+    return value.get('id') if isinstance(value, dict) else value
+
+
+def index_snapshot(path):
+    """
+    {task_id: {annotation_id: (updated_at, autor, hash, {region_id: hash})}}
+    recorriendo el snapshot en streaming.
+    """
+    index = {}
+    for task in iter_snapshot_tasks(path):
+        annotations = {}
+        for annotation in task.get('annotations') or []:
+            regions = {region_id: content_hash(items) for region_id, items in
+                       group_regions(annotation.get('result')).items()}
+            annotations[annotation.get('id')] = (
+                annotation.get('updated_at'), completed_by(annotation),
+                content_hash(annotation_fingerprint(annotation)), regions,
+            )
+        index[task.get('id')] = annotations
+    return index
+
+
+def compare_regions(old_regions, new_regions):
+    """(agregadas, quitadas, modificadas) como listas de region_id"""
+    added = [region_id for region_id in new_regions if region_id not in old_regions]
+    removed = [region_id for region_id in old_regions if region_id not in new_regions]
+    modified = [region_id for region_id, digest in new_regions.items()
+                if region_id in old_regions and old_regions[region_id] != digest]
+    return added, removed, modified
+
+
+def diff_indexes(old_index, new_index):
+    """
+    Compara dos índices. Retorna (cambios, resumen): cambios es
+    {task_id: {'change': ..., 'annotations': {annotation_id: {...}}}} con los
+    region_id afectados (sin contenido todavía).
+    """
+    summary = dict.fromkeys(('tasks_added', 'tasks_removed', 'tasks_modified', 'annotations_added',
+                             'annotations_removed', 'annotations_modified', 'annotations_touched',
+                             'regions_added', 'regions_removed', 'regions_modified'), 0)
+    changes = {}
+    for task_id in old_index.keys() | new_index.keys():
+        old_annotations = old_index.get(task_id)
+        new_annotations = new_index.get(task_id)
+        annotations = {}
+        for annotation_id in (old_annotations or {}).keys() | (new_annotations or {}).keys():
+            old = (old_annotations or {}).get(annotation_id)
+            new = (new_annotations or {}).get(annotation_id)
+            if old and new and old[2] == new[2]:
+                if old[0] != new[0]:
+                    summary['annotations_touched'] += 1  # se guardó sin cambiar el contenido
+                continue
+            if old is None:
+                kind, regions = 'added', (list(new[3]), [], [])
+            elif new is None:
+                kind, regions = 'removed', ([], list(old[3]), [])
+            else:
+                kind, regions = 'modified', compare_regions(old[3], new[3])
+            summary[f'annotations_{kind}'] += 1
+            for name, region_ids in zip(CHANGE_KINDS, regions):
+                summary[f'regions_{name}'] += len(region_ids)
+            annotations[annotation_id] = {
+                'change': kind,
+                'completed_by': (new or old)[1],
+                'updated_at': {'old': old[0] if old else None, 'new': new[0] if new else None},
+                'regions': dict(zip(CHANGE_KINDS, regions)),
+            }
+        if old_annotations is None:
+            kind = 'added'
+        elif new_annotations is None:
+            kind = 'removed'
+        elif annotations:
+            kind = 'modified'
+        else:
+            continue
+        summary[f'tasks_{kind}'] += 1
+        changes[task_id] = {'change': kind, 'annotations': annotations}
+    return changes, summary
+
+
+def describe_region(items):
+    """Vista legible de una región: etiqueta, texto, offsets y choices como atributos"""
+    region = {'id': items[0].get('id'), 'from_name': None, 'labels': None, 'text': None,
+              'start': None, 'end': None, 'attributes': {}}
+    for item in items:
+        value = item.get('value') or {}
+        if region['from_name'] is None or value.get('labels') is not None:
+            region['from_name'] = item.get('from_name')
+        if value.get('labels') is not None:
+            region['labels'] = value['labels']
+        if region['text'] is None and 'text' in value:
+            offsets = value.get('globalOffsets') or {}
+            region.update(text=value.get('text'), start=offsets.get('start', value.get('start')),
+                          end=offsets.get('end', value.get('end')))
+        if value.get('choices') is not None:
+            region['attributes'][item.get('from_name')] = value['choices']
+        elif value.get('labels') is None and 'text' not in value:
+            region['attributes'][item.get('from_name')] = value  # otros controles (textarea, rating, ...)
+    return region
+
+
+def collect_region_details(path, changes, side):
+    """
+    Segunda pasada sobre un snapshot: guarda las regiones de las tasks con
+    cambios que hacen falta en el change set ('old' o 'new').
+    """
+    wanted_kinds = ('removed', 'modified') if side == 'old' else ('added', 'modified')
+    details = {}
+    for task in iter_snapshot_tasks(path):
+        task_changes = changes.get(task.get('id'))
+        if not task_changes:
+            continue
+        for annotation in task.get('annotations') or []:
+            change = task_changes['annotations'].get(annotation.get('id'))
+            if not change:
+                continue
+            wanted = {region_id for kind in wanted_kinds for region_id in change['regions'][kind]}
+            for region_id, items in group_regions(annotation.get('result')).items():
+                if region_id in wanted:
+                    details[(task.get('id'), annotation.get('id'), region_id)] = describe_region(items)
+    return details
+
+
+def iter_change_set(old_path, new_path, changes):
+    """Líneas del change set (dicts) ordenadas por task_id"""
+    old_details = collect_region_details(old_path, changes, 'old')
+    new_details = collect_region_details(new_path, changes, 'new')
+    for task_id in sorted(changes, key=lambda value: (value is None, value)):
+        task_changes = changes[task_id]
+        annotations = []
+        for annotation_id, change in sorted(task_changes['annotations'].items(), key=lambda item: str(item[0])):
+            regions = change['regions']
+            annotations.append({
+                'annotation_id': annotation_id,
+                'change': change['change'],
+                'completed_by': change['completed_by'],
+                'updated_at': change['updated_at'],
+                'regions': {
+                    'added': [new_details.get((task_id, annotation_id, region_id)) for region_id in regions['added']],
+                    'removed': [old_details.get((task_id, annotation_id, region_id))
+                                for region_id in regions['removed']],
+                    'modified': [{'id': region_id,
+                                  'old': old_details.get((task_id, annotation_id, region_id)),
+                                  'new': new_details.get((task_id, annotation_id, region_id))}
+                                 for region_id in regions['modified']],
+                },
+            })
+        yield {'task_id': task_id, 'change': task_changes['change'], 'annotations': annotations}
+
+
+def diff_snapshots(old_path, new_path):
+    """(cambios, resumen) entre dos snapshots; sin leer nada si son el mismo archivo"""
+    if os.path.samefile(old_path, new_path):
+        # El almacén de snapshots enlaza (hardlink) los contenidos repetidos
+        return {}, diff_indexes({}, {})[1]
+    return diff_indexes(index_snapshot(old_path), index_snapshot(new_path))
+
+
+def latest_pair(project_id, export_dir=DIFF_EXPORT_DIR):
+    """Los dos últimos snapshots completos (no delta) del proyecto"""
+    snapshots = []
+    for name in os.listdir(export_dir):
+        match = EXPORT_NAME_RE.match(name)
+        if match and match.group('project_id') == str(project_id) and not match.group('delta') and '.json' in name:
+            snapshots.append((match.group('timestamp'), os.path.join(export_dir, name)))
+    snapshots.sort()
+    return [path for _, path in snapshots[-2:]]
+
+
+def print_summary(old_path, new_path, summary):
+    print(f"🔍 {os.path.basename(old_path)} -> {os.path.basename(new_path)}")
+    print(f"   Tasks:       +{summary['tasks_added']} -{summary['tasks_removed']} ~{summary['tasks_modified']}")
+    print(f"   Anotaciones: +{summary['annotations_added']} -{summary['annotations_removed']} "
+          f"~{summary['annotations_modified']} (guardadas sin cambios: {summary['annotations_touched']})")
+    print(f"   Regiones:    +{summary['regions_added']} -{summary['regions_removed']} ~{summary['regions_modified']}")
+
+
+def main(argv):
+    out_path, ids_only, project_id, export_dir, paths = None, False, None, DIFF_EXPORT_DIR, []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--out':
+            out_path = next(args, None)
+        elif arg == '--ids':
+            ids_only = True
+        elif arg == '--project':
+            project_id = next(args, None)
+        elif arg == '--dir':
+            export_dir = next(args, export_dir)
+        elif arg in ('-h', '--help'):
+            print(__doc__)
+            return 0
+        else:
+            paths.append(arg)
+
+    if project_id is not None:
+        paths = latest_pair(project_id, export_dir)
+    if len(paths) != 2:
+        print("❌ Se necesitan dos snapshots (o --project con al menos dos snapshots exportados)")
+        return 1
+    old_path, new_path = paths
+
+    try:
+        changes, summary = diff_snapshots(old_path, new_path)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error leyendo los snapshots: {e}")
+        return 1
+
+    if ids_only:
+        for task_id in sorted(changes, key=lambda value: (value is None, value)):
+            print(task_id)
+        return 0
+    print_summary(old_path, new_path, summary)
+    if out_path:
+        written = 0
+        with open(out_path, 'w', encoding='utf-8') as f:
+            for entry in iter_change_set(old_path, new_path, changes):
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                written += 1
+        print(f"✅ Change set: {written} tasks -> {out_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
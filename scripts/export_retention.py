@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Retención escalonada de snapshots exportados.
+
+Por proyecto se conservan:
+    - todos los snapshots de las últimas RETENTION_KEEP_ALL_HOURS horas,
+    - el último de cada día durante RETENTION_DAILY_DAYS días,
+    - el último de cada semana (ISO) de ahí en adelante.
+Los archivos _delta se conservan solo durante la primera ventana.
+
+Lo que vence no se borra sin más: se compacta en un archivo por proyecto y
+semana (archive/<id>/<id>_<año>-W<semana>.tar.xz) con los JSON descomprimidos
+uno detrás de otro, así el compresor aprovecha lo mucho que se parecen entre
+sí. Los contenidos repetidos (mismo sha256) se guardan una sola vez y un
+index.json dentro del tar dice qué timestamp corresponde a qué miembro.
+
+La lista de snapshots sale del manifest del SnapshotStore; solo los archivos
+que no están en él (deltas y snapshots previos al almacén) se identifican por
+el nombre, sin stat por archivo.
+
+Uso:
+    python3 export_retention.py              # aplica la política
+    python3 export_retention.py --dry-run    # solo muestra qué haría
+"""
+
+import os
+import re
+import io
+import sys
+import json
+import lzma
+import time
+import hashlib
+import tarfile
+import tempfile
+from datetime import datetime, timedelta
+
+from export_store import SnapshotStore, open_export
+
+EXPORT_DIR = '/exports/annotations'
+ARCHIVE_DIRNAME = 'archive'
+
+RETENTION_KEEP_ALL_HOURS = int(os.getenv('RETENTION_KEEP_ALL_HOURS', '24'))
+RETENTION_DAILY_DAYS = int(os.getenv('RETENTION_DAILY_DAYS', '30'))
+# Diccionario grande: cada snapshot se comprime "contra" los anteriores del archivo
+ARCHIVE_DICT_SIZE = int(os.getenv('RETENTION_ARCHIVE_DICT_MB', '64')) * 1024 * 1024
+
+# <titulo>_<id>_<YYYYMMDD_HHMMSS>[_delta].<ext>[.gz|.zst]
+EXPORT_NAME_RE = re.compile(
+    r'^(?P<title>.+)_(?P<project_id>\d+)_(?P<timestamp>\d{8}_\d{6})(?P<delta>_delta)?\.[^.]+(?:\.gz|\.zst)?$'
+)
+STALE_TMP_SECONDS = 86400
+
+
+def parse_timestamp(timestamp):
+    return datetime.strptime(timestamp, '%Y%m%d_%H%M%S')
+
+
+def collect_exports(store, export_dir):
+    """
+    Snapshots por proyecto: {project_id: [{timestamp, file, sha256, delta}]}.
+    Los del manifest traen el sha256; el resto se reconoce por el nombre.
+    """
+    names = set(os.listdir(export_dir)) if os.path.isdir(export_dir) else set()
+    projects = {}
+    known = set()
+    for project_id, project in store.manifest['projects'].items():
+        for timestamp, entry in project['snapshots'].items():
+            if entry['file'] not in names:
+                continue
+            known.add(entry['file'])
+            projects.setdefault(project_id, []).append({
+                'timestamp': timestamp, 'file': entry['file'], 'sha256': entry['sha256'], 'delta': False,
+            })
+    for name in names - known:
+        match = EXPORT_NAME_RE.match(name)
+        if not match:
+            continue
+        projects.setdefault(match.group('project_id'), []).append({
+            'timestamp': match.group('timestamp'), 'file': name, 'sha256': None,
+            'delta': bool(match.group('delta')),
+        })
+    return projects
+
+
+def select_expired(entries, now, keep_all_hours=RETENTION_KEEP_ALL_HOURS, daily_days=RETENTION_DAILY_DAYS):
+    """
+    Aplica la política escalonada a los snapshots de un proyecto. Retorna la
+    lista de entradas vencidas (el resto se conserva).
+    """
+    keep_all_since = now - timedelta(hours=keep_all_hours)
+    daily_since = now - timedelta(days=daily_days)
+    expired = []
+    seen_buckets = set()
+    for entry in sorted(entries, key=lambda e: e['timestamp'], reverse=True):
+        created = parse_timestamp(entry['timestamp'])
+        if created >= keep_all_since:
+            continue
+        if entry['delta']:
+            expired.append(entry)
+            continue
+        if created >= daily_since:
+            bucket = ('day', created.date())
+        else:
+            bucket = ('week',) + tuple(created.isocalendar()[:2])
+        if bucket in seen_buckets:
+            expired.append(entry)  # ya se conserva uno más nuevo de ese día/semana
+        else:
+            seen_buckets.add(bucket)
+    return expired
+
+
+def archive_period(timestamp):
+    year, week, _ = parse_timestamp(timestamp).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def archive_path_for(export_dir, project_id, period):
+    return os.path.join(export_dir, ARCHIVE_DIRNAME, str(project_id), f"{project_id}_{period}.tar.xz")
+
+
+def _add_bytes(tar, name, payload):
+    info = tarfile.TarInfo(name)
+    info.size = len(payload)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(payload))
+
+
+def _spool_decompressed(path, directory):
+    """Descomprime el snapshot a un temporal calculando su sha256. Retorna (temporal, sha256, bytes)"""
+    hasher = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(dir=directory, prefix='.spool.', suffix='.tmp', delete=False)
+    with tmp, open_export(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            hasher.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+    return tmp.name, hasher.hexdigest(), size
+
+
+def compact_into_archive(archive_path, export_dir, entries):
+    """
+    Agrega los snapshots 'entries' al archivo del período (reescribiéndolo si
+    ya existía) y lo publica de forma atómica. Retorna el index del archivo
+    {timestamp: {"member": ..., "sha256": ..., "file": ...}}.
+    """
+    directory = os.path.dirname(archive_path)
+    os.makedirs(directory, exist_ok=True)
+    index = {}
+    members = set()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(archive_path)}.", suffix='.tmp')
+    os.close(fd)
+    filters = [{'id': lzma.FILTER_LZMA2, 'preset': 6, 'dict_size': ARCHIVE_DICT_SIZE}]
+    try:
+        with lzma.open(tmp_path, 'wb', format=lzma.FORMAT_XZ, filters=filters) as compressed:
+            with tarfile.open(fileobj=compressed, mode='w|') as tar:
+                if os.path.exists(archive_path):
+                    # Se copian los miembros existentes tal cual, en el mismo orden
+                    with tarfile.open(archive_path, 'r:xz') as previous:
+                        for member in previous:
+                            data = previous.extractfile(member)
+                            if member.name == 'index.json':
+                                index.update(json.load(data))
+                                continue
+                            tar.addfile(member, data)
+                            members.add(member.name)
+                for entry in sorted(entries, key=lambda e: e['timestamp']):
+                    spool_path, digest, _ = _spool_decompressed(os.path.join(export_dir, entry['file']), directory)
+                    try:
+                        member = f"{digest}.json"
+                        if member not in members:
+                            with open(spool_path, 'rb') as spool:
+                                info = tar.gettarinfo(spool_path, arcname=member)
+                                info.mode, info.uid, info.gid, info.uname, info.gname = 0o644, 0, 0, '', ''
+                                tar.addfile(info, spool)
+                            members.add(member)
+                    finally:
+                        os.remove(spool_path)
+                    key = f"{entry['timestamp']}_delta" if entry['delta'] else entry['timestamp']
+                    index[key] = {'member': member, 'sha256': digest, 'file': entry['file']}
+                _add_bytes(tar, 'index.json', json.dumps(index, ensure_ascii=False, indent=2).encode('utf-8'))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return index
+
+
+def remove_stale_temporaries(export_dir, max_age=STALE_TMP_SECONDS):
+    """Borra temporales ocultos (.<nombre>.<x>.tmp) que dejó una descarga cortada"""
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(export_dir) if os.path.isdir(export_dir) else []:
+        if name.startswith('.') and name.endswith('.tmp'):
+            path = os.path.join(export_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def apply_retention(store, export_dir, now=None, dry_run=False, log=print):
+    """
+    Aplica la política a todos los proyectos del directorio. Retorna stats con
+    kept, expired, archives, bytes_before (de los vencidos) y bytes_archives.
+    """
+    now = now or datetime.now()
+    stats = {'kept': 0, 'expired': 0, 'archives': 0, 'bytes_before': 0, 'bytes_archives': 0}
+    for project_id, entries in sorted(collect_exports(store, export_dir).items()):
+        expired = select_expired(entries, now)
+        stats['kept'] += len(entries) - len(expired)
+        stats['expired'] += len(expired)
+        by_period = {}
+        for entry in expired:
+            by_period.setdefault(archive_period(entry['timestamp']), []).append(entry)
+        for period, period_entries in sorted(by_period.items()):
+            archive_path = archive_path_for(export_dir, project_id, period)
+            if dry_run:
+                log(f"   📦 [{project_id}] {len(period_entries)} snapshots -> {os.path.relpath(archive_path, export_dir)}")
+                continue
+            paths = [os.path.join(export_dir, entry['file']) for entry in period_entries]
+            stats['bytes_before'] += sum(os.path.getsize(path) for path in paths)
+            compact_into_archive(archive_path, export_dir, period_entries)
+            stats['bytes_archives'] += os.path.getsize(archive_path)
+            stats['archives'] += 1
+            store.mark_archived(project_id, {
+                entry['timestamp']: os.path.relpath(archive_path, export_dir)
+                for entry in period_entries if not entry['delta']
+            })
+            for path in paths:
+                os.remove(path)
+    if not dry_run:
+        remove_stale_temporaries(export_dir)
+    return stats
+
+
+def print_retention_summary(stats, dry_run=False, log=print):
+    if not stats['expired']:
+        log(f"🧹 Retención: {stats['kept']} snapshots vigentes, nada para compactar")
+        return
+    if dry_run:
+        log(f"🧹 Retención (simulación): {stats['expired']} snapshots vencidos, {stats['kept']} se conservan")
+        return
+    log(f"🧹 Retención: {stats['expired']} snapshots vencidos compactados en {stats['archives']} archivos "
+        f"({stats['bytes_before']:,} -> {stats['bytes_archives']:,} bytes); {stats['kept']} se conservan")
+
+
+def main(argv):
+    dry_run = '--dry-run' in argv
+    export_dir = EXPORT_DIR
+    if '--dir' in argv:
+        export_dir = argv[argv.index('--dir') + 1]
+    store = SnapshotStore(os.path.join(export_dir, '.store'))
+    stats = apply_retention(store, export_dir, dry_run=dry_run)
+    if not dry_run:
+        freed = store.prune(export_dir)
+        if freed:
+            print(f"🧹 {freed:,} bytes liberados de objetos sin referencias")
+    print_retention_summary(stats, dry_run=dry_run)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
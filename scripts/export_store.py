@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Escritura de exportaciones en disco.
+
+Las exportaciones se reciben en streaming, se comprimen al vuelo y se validan
+mientras se escriben a un archivo temporal. Solo al terminar bien se renombran
+de forma atómica al nombre final, así ningún lector ve un archivo truncado.
+
+SnapshotStore guarda cada contenido distinto una sola vez (direccionado por su
+SHA-256): los snapshots idénticos al anterior quedan como hardlinks al mismo
+objeto y el manifest registra timestamp -> hash por proyecto.
+"""
+
+import os
+import re
+import gzip
+import json
+import hashlib
+import tempfile
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional, gzip siempre está disponible
+    zstandard = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Timestamp en el nombre de los snapshots: <titulo>_<id>_YYYYMMDD_HHMMSS[_delta].json[.gz]
+SNAPSHOT_TIMESTAMP_RE = re.compile(r'_(\d{8}_\d{6})(?:_delta)?\.')
+
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'none': '',
+}
+
+
+def resolve_compression(compression='auto'):
+    """'auto' usa zstd si está instalado y gzip en caso contrario"""
+    compression = (compression or 'none').lower()
+    if compression == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if compression == 'zstd' and zstandard is None:
+        print("⚠️  zstandard no está instalado, se usará gzip")
+        return 'gzip'
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Compresión no soportada: {compression}")
+    return compression
+
+
+def open_export(path, mode='rb'):
+    """Abre una exportación (comprimida o no) según su extensión"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"Se necesita el paquete zstandard para leer {path}")
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+
+def load_export(path):
+    """Carga en memoria una exportación JSON (comprimida o no)"""
+    with open_export(path, 'rb') as f:
+        return json.load(f)
+
+
+class JsonStructureValidator:
+    """
+    Validador mínimo para cuando ijson no está disponible: sigue strings,
+    escapes y anidamiento de []/{} para detectar documentos truncados.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.closed = False
+
+    def feed(self, chunk):
+        for byte in chunk:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif byte == 0x5C:  # \
+                    self.escaped = True
+                elif byte == 0x22:  # "
+                    self.in_string = False
+                continue
+            if byte in (0x20, 0x09, 0x0A, 0x0D):
+                continue
+            if self.closed:
+                raise ValueError("contenido extra después del documento JSON")
+            self.started = True
+            if byte == 0x22:
+                self.in_string = True
+            elif byte in (0x5B, 0x7B):  # [ {
+                self.stack.append(byte + 2)  # ] = [ + 2, } = { + 2
+            elif byte in (0x5D, 0x7D):
+                if not self.stack or self.stack.pop() != byte:
+                    raise ValueError("cierre de corchete/llave inesperado")
+                if not self.stack:
+                    self.closed = True
+
+    def close(self):
+        if not self.started or not self.closed or self.in_string:
+            raise ValueError("documento JSON incompleto")
+
+
+class IjsonValidator:
+    """Valida la gramática JSON completa en streaming usando ijson"""
+
+    def __init__(self):
+        def discard():
+            while True:
+                yield
+        sink = discard()
+        next(sink)
+        self.coro = ijson.basic_parse_coro(sink)
+
+    def feed(self, chunk):
+        try:
+            self.coro.send(chunk)
+        except ijson.JSONError as e:
+            raise ValueError(f"JSON inválido: {str(e).splitlines()[0]}")
+
+    def close(self):
+        try:
+            self.coro.close()
+        except ijson.JSONError as e:
+            raise ValueError(f"JSON inválido: {str(e).splitlines()[0]}")
+
+
+def new_json_validator():
+    return IjsonValidator() if ijson is not None else JsonStructureValidator()
+
+
+class StreamingExportWriter:
+    """
+    Escribe una exportación por chunks en un temporal del mismo directorio,
+    comprimiendo y validando al vuelo; commit() la renombra de forma atómica.
+
+    Uso:
+        with StreamingExportWriter(path, compression='gzip') as writer:
+            for chunk in response.iter_content(...):
+                writer.write(chunk)
+            final_path = writer.commit()
+    """
+
+    def __init__(self, path, compression='auto', validate_json=True, expect_array=True):
+        self.compression = resolve_compression(compression)
+        self.path = path + COMPRESSION_EXTENSIONS[self.compression]
+        self.validator = new_json_validator() if validate_json else None
+        self.expect_array = expect_array and validate_json
+        self.bytes_in = 0
+        self.committed = False
+        self.hasher = hashlib.sha256()  # hash del contenido sin comprimir
+
+        directory = os.path.dirname(self.path) or '.'
+        fd, self.tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix='.tmp'
+        )
+        self.raw = os.fdopen(fd, 'wb')
+        if self.compression == 'gzip':
+            # mtime=0: mismo contenido => mismos bytes comprimidos
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=6, mtime=0)
+        elif self.compression == 'zstd':
+            self.stream = zstandard.ZstdCompressor(level=10).stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        if self.expect_array and self.bytes_in == 0:
+            stripped = chunk.lstrip()
+            if stripped and not stripped.startswith(b'['):
+                raise ValueError("la respuesta no es una lista JSON de tasks")
+            if not stripped:
+                return
+        if self.validator:
+            self.validator.feed(chunk)
+        self.hasher.update(chunk)
+        self.stream.write(chunk)
+        self.bytes_in += len(chunk)
+
+    def commit(self):
+        """Valida que el documento esté completo y publica el archivo final"""
+        if self.bytes_in == 0:
+            raise ValueError("respuesta vacía del servidor")
+        if self.validator:
+            self.validator.close()
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.raw.close()
+        os.chmod(self.tmp_path, 0o644)  # mkstemp crea con 0600
+        os.replace(self.tmp_path, self.path)
+        self.committed = True
+        return self.path
+
+    @property
+    def digest(self):
+        return self.hasher.hexdigest()
+
+    def abort(self):
+        for handle in (self.stream, self.raw):
+            try:
+                handle.close()
+            except Exception:
+                pass
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.committed:
+            self.abort()
+        return False
+
+
+def write_json_atomic(path, data, compression='none'):
+    """
+    Serializa 'data' a JSON y lo publica atómicamente (con compresión opcional).
+    Retorna la ruta final (con extensión de compresión si aplica).
+    """
+    with StreamingExportWriter(path, compression=compression, validate_json=False) as writer:
+        writer.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        return writer.commit()
+
+
+class SnapshotStore:
+    """
+    Almacén direccionado por contenido de los snapshots exportados.
+
+    Estructura (dentro de export_dir/.store/):
+        objects/<h[:2]>/<sha256><ext>   contenido único
+        manifest.json                   {"projects": {id: {"latest": hash,
+                                          "snapshots": {timestamp: {...}},
+                                          "archived": {timestamp: {...}}}}}
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️  Manifest ilegible ({e}); se reconstruirá desde cero")
+        return {'projects': {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        write_json_atomic(self.manifest_path, self.manifest)
+
+    def latest_hash(self, project_id):
+        """Hash del último snapshot del proyecto (O(1), sin leer archivos)"""
+        return self.manifest['projects'].get(str(project_id), {}).get('latest')
+
+    def object_path(self, digest, extension):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{extension}")
+
+    def add_snapshot(self, project_id, path, digest, timestamp):
+        """
+        Registra un snapshot recién escrito. Si su contenido ya existe en el
+        almacén, el archivo se reemplaza (atómicamente) por un hardlink al
+        objeto existente. Retorna True si el contenido cambió respecto al
+        snapshot anterior del proyecto.
+        """
+        name_parts = os.path.basename(path).split('.', 1)
+        extension = f".{name_parts[1]}" if len(name_parts) == 2 else ''
+        obj_path = self.object_path(digest, extension)
+
+        with self.lock:
+            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+            if os.path.exists(obj_path):
+                link_tmp = f"{path}.lnk"
+                try:
+                    os.link(obj_path, link_tmp)
+                    os.replace(link_tmp, path)
+                except OSError:
+                    # Sistema de archivos sin hardlinks: se conserva la copia
+                    if os.path.exists(link_tmp):
+                        os.remove(link_tmp)
+            else:
+                try:
+                    os.link(path, obj_path)
+                except OSError:
+                    pass
+
+            project = self.manifest['projects'].setdefault(
+                str(project_id), {'latest': None, 'snapshots': {}}
+            )
+            changed = project['latest'] != digest
+            project['latest'] = digest
+            project['snapshots'][timestamp] = {
+                'sha256': digest,
+                'file': os.path.basename(path),
+                'bytes': os.path.getsize(path),
+                'changed': changed,
+            }
+            self._save_manifest()
+        return changed
+
+    def mark_archived(self, project_id, archived):
+        """
+        Mueve snapshots de 'snapshots' a 'archived' ({timestamp: ruta del
+        archivo compactado}) para que sigan ubicables tras la retención.
+        """
+        with self.lock:
+            project = self.manifest['projects'].setdefault(
+                str(project_id), {'latest': None, 'snapshots': {}}
+            )
+            archived_entries = project.setdefault('archived', {})
+            for timestamp, archive in archived.items():
+                entry = project['snapshots'].pop(timestamp, None) or {}
+                archived_entries[timestamp] = {'archive': archive, 'sha256': entry.get('sha256')}
+            self._save_manifest()
+
+    def prune(self, export_dir):
+        """
+        Quita del manifest los snapshots cuyo archivo ya no existe y borra los
+        objetos que ningún snapshot referencia (st_nlink == 1).
+        Retorna los bytes liberados.
+        """
+        freed = 0
+        with self.lock:
+            for project in self.manifest['projects'].values():
+                for timestamp, entry in list(project['snapshots'].items()):
+                    if not os.path.exists(os.path.join(export_dir, entry['file'])):
+                        del project['snapshots'][timestamp]
+            if os.path.isdir(self.objects_dir):
+                for prefix in os.listdir(self.objects_dir):
+                    prefix_dir = os.path.join(self.objects_dir, prefix)
+                    for name in os.listdir(prefix_dir):
+                        obj_path = os.path.join(prefix_dir, name)
+                        stat = os.stat(obj_path)
+                        if stat.st_nlink <= 1:
+                            os.remove(obj_path)
+                            freed += stat.st_size
+            self._save_manifest()
+        return freed
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Convierte snapshots de exportación en datos de entrenamiento NER.
+
+Cada snapshot se recorre en streaming; de cada task se toma una anotación
+(la marcada como ground truth o, si no hay, la última actualizada) y sus
+regiones del control de etiquetas se alinean a tokens:
+
+- Los globalOffsets de cada región se ubican en el texto de la variable de
+  la task que los contiene, con el mismo layout del HyperText que usa la
+  pre-anotación (task_preannotate.TextLayout), y se verifican contra el
+  'text' de la región.
+- Las choices por región (preparation_state, cooking_method, ...) se
+  conservan como atributos del span.
+
+Formatos de salida (en shards de TRAINING_SHARD_DOCS tasks):
+
+    conll   shard_00000.conll: token<TAB>etiqueta BIO, una línea vacía entre
+            documentos y comentarios '# task_id = ...' / '# regions = [...]'
+            (JSON con los spans y sus atributos)
+    spacy   shard_00000.spacy: DocBin con doc.ents, doc.spans['entities'] y
+            los atributos en doc.user_data['regions'] (requiere spaCy)
+
+Los shards se convierten en TRAINING_WORKERS procesos, con una ventana
+acotada de lotes en vuelo; el directorio de salida aparece completo de una
+vez (rename) junto con un manifest.json con los conteos.
+
+Uso:
+    python3 export_training.py                          # último snapshot de cada proyecto
+    python3 export_training.py snapshot.json[.gz] ...   # snapshots indicados
+    python3 export_training.py --out data/training/v1 --format conll --schema projects/recipes_schema.xml
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from export_retention import EXPORT_NAME_RE
+from task_preannotate import BASE_DIR, GAZETTEER_EXPORT_DIR, TextLayout, iter_snapshot_tasks, latest_snapshots
+from task_sources import iter_batches
+
+try:
+    import spacy
+    from spacy.tokens import Doc, DocBin, Span
+except ImportError:
+    spacy = None
+
+PROJECTS_DIR = os.path.join(BASE_DIR, 'projects')
+TRAINING_DIR = os.getenv('TRAINING_DIR', os.path.join(BASE_DIR, 'data', 'training'))
+TRAINING_FORMATS = os.getenv('TRAINING_FORMATS', 'conll,spacy')
+TRAINING_SHARD_DOCS = int(os.getenv('TRAINING_SHARD_DOCS', '5000'))
+TRAINING_WORKERS = int(os.getenv('TRAINING_WORKERS', str(os.cpu_count() or 1)))
+TRAINING_LANG = os.getenv('TRAINING_LANG', 'es')
+
+# Palabras (con guiones o apóstrofes internos) o un signo de puntuación suelto
+TOKEN_RE = re.compile(r"\w+(?:[-'’]\w+)*|[^\w\s]")
+STAT_FIELDS = ('tasks', 'docs', 'tokens', 'spans', 'misaligned', 'unmatched', 'overlapping')
+
+
+def schema_for_snapshot(path, projects_dir=PROJECTS_DIR):
+    """Schema del proyecto de un snapshot, según el título del nombre y projects_index.json"""
+    match = EXPORT_NAME_RE.match(os.path.basename(path))
+    if not match:
+        return None
+    try:
+        with open(os.path.join(projects_dir, 'projects_index.json'), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    title = match.group('title')
+    for name, config in index.items():
+        if name.replace(' ', '_') == title and config.get('schema'):
+            return os.path.join(projects_dir, config['schema'])
+    return None
+
+
+def layout_args(layout):
+    return ('HyperText' if layout.kind == 'hypertext' else 'Text', layout.value, layout.labels_name, layout.to_name)
+
+
+def select_annotation(task):
+    """La anotación ground truth o la última actualizada (sin canceladas ni vacías)"""
+    candidates = [annotation for annotation in task.get('annotations') or []
+                  if not annotation.get('was_cancelled') and annotation.get('result')]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda annotation: (bool(annotation.get('ground_truth')),
+                                                   annotation.get('updated_at') or ''))
+
+
+def collect_regions(annotation, labels_name):
+    """Regiones del control de etiquetas con las choices del mismo id como atributos"""
+    regions = {}
+    attributes = {}
+    for item in annotation.get('result') or []:
+        value = item.get('value') or {}
+        region_id = item.get('id')
+        if item.get('from_name') == labels_name and value.get('labels'):
+            regions[region_id] = value
+        elif value.get('choices') is not None and region_id:
+            attributes.setdefault(region_id, {})[item.get('from_name')] = value['choices']
+    return [(region_id, value, attributes.get(region_id, {})) for region_id, value in regions.items()]
+
+
+def tokenize(text):
+    return [(match.start(), match.end()) for match in TOKEN_RE.finditer(text)]
+
+
+class DocumentBuilder:
+    """Texto, tokens y spans de una task según el layout del objeto etiquetado"""
+
+    def __init__(self, layout):
+        self.layout = layout
+
+    def build(self, task, stats):
+        annotation = select_annotation(task)
+        if annotation is None:
+            return None
+        segments = [segment for segment in self.layout.segments(task.get('data') or {}) if segment['text']]
+        if not segments:
+            return None
+
+        # Las variables se unen con saltos de línea; 'base' es su inicio en el texto del documento
+        parts, words, spaces, token_starts, token_ends, base = [], [], [], [], [], 0
+        for segment in segments:
+            segment['base'] = base
+            for start, end in tokenize(segment['text']):
+                words.append(segment['text'][start:end])
+                token_starts.append(base + start)
+                token_ends.append(base + end)
+            parts.append(segment['text'])
+            base += len(segment['text']) + 1
+        text = '\n'.join(parts)
+        spaces = [end < len(text) and text[end].isspace() for end in token_ends]
+        starts_at = {start: i for i, start in enumerate(token_starts)}
+        ends_at = {end: i for i, end in enumerate(token_ends)}
+
+        spans = []
+        for region_id, value, attributes in collect_regions(annotation, self.layout.labels_name):
+            offsets = value.get('globalOffsets')
+            if offsets:
+                start, end = offsets.get('start'), offsets.get('end')
+            else:
+                start, end = value.get('start'), value.get('end')  # objeto Text
+            if not isinstance(start, (int, float)) or not isinstance(end, (int, float)):
+                stats['unmatched'] += 1
+                continue
+            start, end = int(start), int(end)
+            segment = next((segment for segment in segments
+                            if segment['global'] <= start and end <= segment['global'] + len(segment['text'])), None)
+            if segment is None:
+                stats['unmatched'] += 1
+                continue
+            start, end = segment['base'] + start - segment['global'], segment['base'] + end - segment['global']
+            if value.get('text') is not None and text[start:end] != value['text']:
+                stats['unmatched'] += 1
+                continue
+            # Bordes que caen dentro de un token: se expande al token completo
+            first = starts_at.get(start)
+            last = ends_at.get(end)
+            if first is None or last is None:
+                stats['misaligned'] += 1
+                first = next((i for i, token_end in enumerate(token_ends) if token_end > start), None)
+                last = next((i for i in range(len(token_starts) - 1, -1, -1) if token_starts[i] < end), None)
+                if first is None or last is None or first > last:
+                    stats['unmatched'] += 1
+                    continue
+            spans.append({'id': region_id, 'label': value['labels'][0], 'start': start, 'end': end,
+                          'token_start': first, 'token_end': last + 1, 'text': text[start:end],
+                          'attributes': attributes})
+
+        spans.sort(key=lambda span: (span['token_start'], -span['token_end']))
+        tags = ['O'] * len(words)
+        for span in spans:
+            if any(tag != 'O' for tag in tags[span['token_start']:span['token_end']]):
+                span['overlapping'] = True
+                stats['overlapping'] += 1
+                continue
+            tags[span['token_start']] = f"B-{span['label']}"
+            for i in range(span['token_start'] + 1, span['token_end']):
+                tags[i] = f"I-{span['label']}"
+
+        stats['docs'] += 1
+        stats['tokens'] += len(words)
+        stats['spans'] += len(spans)
+        return {'task_id': task.get('id'), 'annotation_id': annotation.get('id'), 'text': text,
+                'words': words, 'spaces': spaces, 'tags': tags, 'spans': spans}
+
+
+def write_conll(path, documents, source):
+    with open(path, 'w', encoding='utf-8') as f:
+        for document in documents:
+            regions = [{key: span[key] for key in ('label', 'token_start', 'token_end', 'text', 'attributes')}
+                       for span in document['spans']]
+            f.write(f"# source = {source}\n")
+            f.write(f"# task_id = {document['task_id']}\n")
+            f.write(f"# annotation_id = {document['annotation_id']}\n")
+            f.write(f"# regions = {json.dumps(regions, ensure_ascii=False)}\n")
+            for word, tag in zip(document['words'], document['tags']):
+                f.write(f"{word}\t{tag}\n")
+            f.write('\n')
+
+
+def write_docbin(path, documents, source, vocab):
+    doc_bin = DocBin(store_user_data=True)
+    for document in documents:
+        doc = Doc(vocab, words=document['words'], spaces=document['spaces'])
+        spans = [Span(doc, span['token_start'], span['token_end'], label=span['label'])
+                 for span in document['spans']]
+        doc.spans['entities'] = spans
+        doc.ents = [doc_span for doc_span, span in zip(spans, document['spans']) if not span.get('overlapping')]
+        doc.user_data['source'] = source
+        doc.user_data['task_id'] = document['task_id']
+        doc.user_data['annotation_id'] = document['annotation_id']
+        doc.user_data['regions'] = [
+            {'label': span['label'], 'start_char': doc[span['token_start']:span['token_end']].start_char,
+             'end_char': doc[span['token_start']:span['token_end']].end_char, 'attributes': span['attributes']}
+            for span in document['spans']
+        ]
+        doc_bin.add(doc)
+    doc_bin.to_disk(path)
+
+
+# --- Conversión por shard (en el proceso principal o en un worker) ---
+
+_worker_state = {}
+
+
+def _init_worker(layouts, formats, out_dir, lang):
+    _worker_state.update(layouts={source: DocumentBuilder(TextLayout(*args)) for source, args in layouts.items()},
+                         formats=formats, out_dir=out_dir, vocab=None)
+    if 'spacy' in formats:
+        _worker_state['vocab'] = spacy.blank(lang).vocab
+
+
+def _convert_shard(number, source, tasks):
+    stats = dict.fromkeys(STAT_FIELDS, 0)
+    stats['tasks'] = len(tasks)
+    builder = _worker_state['layouts'][source]
+    documents = [document for document in (builder.build(task, stats) for task in tasks) if document]
+    labels = {}
+    for document in documents:
+        for span in document['spans']:
+            labels[span['label']] = labels.get(span['label'], 0) + 1
+    files = []
+    name = f"shard_{number:05d}"
+    if 'conll' in _worker_state['formats']:
+        write_conll(os.path.join(_worker_state['out_dir'], f"{name}.conll"), documents, source)
+        files.append(f"{name}.conll")
+    if 'spacy' in _worker_state['formats']:
+        write_docbin(os.path.join(_worker_state['out_dir'], f"{name}.spacy"), documents, source,
+                     _worker_state['vocab'])
+        files.append(f"{name}.spacy")
+    return {'source': source, 'files': files, **stats, 'labels': labels}
+
+
+def convert_snapshots(paths, out_dir, formats=None, schema_path=None, workers=TRAINING_WORKERS,
+                      shard_docs=TRAINING_SHARD_DOCS, lang=TRAINING_LANG, log=print):
+    """
+    Convierte los snapshots a out_dir (que no debe existir). Retorna el
+    manifest con los shards y los conteos.
+    """
+    formats = [name.strip() for name in (formats or TRAINING_FORMATS).split(',') if name.strip()]
+    unknown = set(formats) - {'conll', 'spacy'}
+    if unknown:
+        raise ValueError(f"Formato de entrenamiento no soportado: {', '.join(sorted(unknown))}")
+    if 'spacy' in formats and spacy is None:
+        log("⚠️  spaCy no está instalado; se omite el formato DocBin")
+        formats.remove('spacy')
+    if not formats:
+        raise ValueError("No hay formatos de salida disponibles")
+
+    layouts = {}
+    for path in paths:
+        schema = schema_path or schema_for_snapshot(path)
+        if not schema:
+            raise ValueError(f"No se encontró el schema de {os.path.basename(path)} (usa --schema)")
+        with open(schema, 'r', encoding='utf-8') as f:
+            layouts[os.path.basename(path)] = layout_args(TextLayout.from_label_config(f.read()))
+
+    out_dir = out_dir.rstrip(os.sep)
+    if os.path.exists(out_dir):
+        raise FileExistsError(f"{out_dir} ya existe")
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    shards = []
+
+    def collect(result):
+        shards.append(result)
+        if len(shards) % 10 == 0:
+            log(f"  🧩 {len(shards)} shards, {sum(shard['docs'] for shard in shards):,} documentos...")
+
+    def batches():
+        number = 0
+        for path in paths:
+            source = os.path.basename(path)
+            for batch in iter_batches(iter_snapshot_tasks(path), shard_docs):
+                yield number, source, batch
+                number += 1
+
+    try:
+        if workers <= 1:
+            _init_worker(layouts, formats, tmp_dir, lang)
+            for number, source, batch in batches():
+                collect(_convert_shard(number, source, batch))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(layouts, formats, tmp_dir, lang)) as pool:
+                pending = deque()
+                for number, source, batch in batches():
+                    pending.append(pool.submit(_convert_shard, number, source, batch))
+                    while len(pending) >= workers * 2:
+                        collect(pending.popleft().result())
+                while pending:
+                    collect(pending.popleft().result())
+
+        totals = {field: sum(shard[field] for shard in shards) for field in STAT_FIELDS}
+        labels = {}
+        for shard in shards:
+            for label, count in shard['labels'].items():
+                labels[label] = labels.get(label, 0) + count
+        manifest = {
+            'created_at': datetime.now().isoformat(),
+            'snapshots': [os.path.basename(path) for path in paths],
+            'formats': formats,
+            **totals,
+            'labels': labels,
+            'shards': shards,
+        }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+def main(argv):
+    out_dir, formats, schema, workers, shard_docs, paths = None, None, None, TRAINING_WORKERS, TRAINING_SHARD_DOCS, []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--out':
+            out_dir = next(args, None)
+        elif arg == '--format':
+            formats = next(args, None)
+        elif arg == '--schema':
+            schema = next(args, None)
+        elif arg == '--workers':
+            workers = int(next(args, workers))
+        elif arg == '--shard-docs':
+            shard_docs = int(next(args, shard_docs))
+        elif arg in ('-h', '--help'):
+            print(__doc__)
+            return 0
+        else:
+            paths.append(arg)
+
+    if not paths:
+        paths = [os.path.join(GAZETTEER_EXPORT_DIR, name) for name in latest_snapshots(GAZETTEER_EXPORT_DIR)]
+        print(f"🔍 {len(paths)} snapshots (el último de cada proyecto) en {GAZETTEER_EXPORT_DIR}")
+    if not paths:
+        print("❌ No hay snapshots para convertir")
+        return 1
+    out_dir = out_dir or os.path.join(TRAINING_DIR, datetime.now().strftime('training_%Y%m%d_%H%M%S'))
+
+    try:
+        manifest = convert_snapshots(paths, out_dir, formats=formats, schema_path=schema, workers=workers,
+                                     shard_docs=shard_docs)
+    except (ValueError, FileExistsError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {manifest['docs']:,} documentos de {manifest['tasks']:,} tasks -> {out_dir} "
+          f"({len(manifest['shards'])} shards, {', '.join(manifest['formats'])})")
+    print(f"📊 Tokens: {manifest['tokens']:,} | Spans: {manifest['spans']:,} | "
+          f"Expandidos al token: {manifest['misaligned']} | Sin ubicar: {manifest['unmatched']} | "
+          f"Solapados (fuera del BIO): {manifest['overlapping']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Servidor falso (en memoria) con los endpoints de Label Studio que usan los
+scripts, para medir rendimiento sin tocar producción. Solo usa la biblioteca
+estándar.
+
+Endpoints: proyectos (list/create/get/delete/import), tasks (list/update/
+delete/delete_all), acción delete_tasks del Data Manager, export, users
+(list/create/whoami). Además, para el benchmark:
+    POST /_bench/seed    {"title", "tasks", "annotations_per_task"} crea un proyecto poblado
+    GET  /_bench/stats   requests por endpoint, errores inyectados y bytes
+    POST /_bench/reset   reinicia las estadísticas
+
+La latencia, los errores (503 al azar, 429 por límite de ritmo) y los límites
+(413 por tamaño de import, tope de page_size) se configuran por línea de
+comandos:
+    python3 fake_label_studio.py --port 8765 --latency-ms 20 --error-rate 0.01
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "arroz pollo tomate cebolla ajo aceite sal pimienta queso leche huevo harina azúcar limón "
+    "papa carne pescado salsa crema mantequilla perejil orégano comino albahaca pan vino caldo "
+    "hornear freír hervir picar mezclar servir cortar dorar"
+).split()
+LABELS = ("INGREDIENTE", "CANTIDAD", "UNIDAD", "PREPARACION")
+
+
+def synthetic_task(index, variant=0):
+    """Fila de datos sintética y determinística (la misma en el servidor y en los archivos de prueba)"""
+    words = [WORDS[(index * 7 + k * 13 + variant) % len(WORDS)] for k in range(30)]
+    return {"sentence_id": index, "text": " ".join(words), "source": "benchmark"}
+
+
+def synthetic_annotation(task_id, number):
+    text = synthetic_task(task_id)["text"]
+    end = text.index(' ')
+    region = f"r{task_id}_{number}"
+    return {
+        "id": task_id * 10 + number,
+        "completed_by": 1 + (task_id + number) % 3,
+        "was_cancelled": False,
+        "lead_time": 10.0 + number,
+        "created_at": "2026-01-01T00:00:00.000000Z",
+        "updated_at": "2026-01-01T00:00:00.000000Z",
+        "result": [{
+            "id": region, "type": "labels", "from_name": "label", "to_name": "text",
+            "value": {"start": 0, "end": end, "text": text[:end],
+                      "labels": [LABELS[(task_id + number) % len(LABELS)]]},
+        }],
+    }
+
+
+def now_iso():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class RateLimiter:
+    """Token bucket del lado del servidor: por encima de 'rate' req/s responde 429"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class FakeLabelStudio:
+    """Estado en memoria: proyectos, tasks y usuarios"""
+
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.projects = {}
+        self.users = {1: {"id": 1, "email": "admin@example.com", "username": "admin",
+                          "first_name": "", "last_name": ""}}
+        self.next_project = 1
+        self.next_task = 1
+        self.limiter = RateLimiter(options.rate_limit)
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {"requests": {}, "injected_errors": 0, "rate_limited": 0,
+                          "bytes_in": 0, "bytes_out": 0, "started_at": time.time()}
+
+    def count(self, endpoint, bytes_in=0, bytes_out=0):
+        with self.stats_lock:
+            self.stats["requests"][endpoint] = self.stats["requests"].get(endpoint, 0) + 1
+            self.stats["bytes_in"] += bytes_in
+            self.stats["bytes_out"] += bytes_out
+
+    # --- proyectos -------------------------------------------------------
+
+    def project_summary(self, project):
+        tasks = project["tasks"]
+        return {
+            "id": project["id"], "title": project["title"], "label_config": project["label_config"],
+            "task_number": len(tasks),
+            "num_tasks_with_annotations": len(tasks) if project["annotations_per_task"] else 0,
+            "created_at": project["created_at"],
+        }
+
+    def create_project(self, title, label_config="<View></View>", annotations_per_task=0):
+        with self.lock:
+            project = {"id": self.next_project, "title": title, "label_config": label_config,
+                       "created_at": now_iso(), "tasks": {}, "order": [], "order_dirty": False,
+                       "annotations_per_task": annotations_per_task}
+            self.projects[project["id"]] = project
+            self.next_project += 1
+        return project
+
+    def add_tasks(self, project, rows):
+        created = now_iso()
+        with self.lock:
+            first = self.next_task
+            self.next_task += len(rows)
+        new_tasks = {}
+        for offset, row in enumerate(rows):
+            task_id = first + offset
+            data = row.get("data", row) if isinstance(row, dict) else {"value": row}
+            new_tasks[task_id] = {"id": task_id, "data": data, "project": project["id"],
+                                  "created_at": created, "updated_at": created}
+        with self.lock:
+            project["tasks"].update(new_tasks)
+            if project["order_dirty"]:
+                project["order"] = list(project["tasks"])
+                project["order_dirty"] = False
+            else:
+                project["order"].extend(new_tasks)
+        return len(rows)
+
+    def ordered_ids(self, project):
+        with self.lock:
+            if project["order_dirty"]:
+                project["order"] = list(project["tasks"])
+                project["order_dirty"] = False
+            return project["order"]
+
+    def remove_tasks(self, project, task_ids):
+        removed = 0
+        with self.lock:
+            for task_id in task_ids:
+                if project["tasks"].pop(task_id, None) is not None:
+                    removed += 1
+            project["order_dirty"] = True
+        return removed
+
+    def find_task(self, task_id):
+        for project in list(self.projects.values()):
+            if task_id in project["tasks"]:
+                return project, project["tasks"][task_id]
+        return None, None
+
+    def task_view(self, project, task, include=None, with_annotations=False):
+        total = project["annotations_per_task"]
+        full = dict(task, total_annotations=total, cancelled_annotations=0, total_predictions=0,
+                    inner_id=task["id"])
+        if with_annotations:
+            full["annotations"] = [synthetic_annotation(task["id"], n) for n in range(total)]
+            full["predictions"] = []
+        if include:
+            return {field: full.get(field) for field in include}
+        return full
+
+
+def updated_after(query):
+    """Extrae el filtro 'updated_at greater' de un query del Data Manager (el único que se evalúa)"""
+    if not query:
+        return None
+    try:
+        items = json.loads(query).get("filters", {}).get("items", [])
+    except ValueError:
+        return None
+    for item in items:
+        if item.get("filter") == "filter:tasks:updated_at" and item.get("operator") == "greater":
+            return item.get("value")
+    return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeLabelStudio/1.0'
+    state = None  # FakeLabelStudio, se asigna en main()
+
+    ROUTES = [
+        ('GET', r'^/api/current-user/whoami/?$', 'whoami'),
+        ('GET', r'^/api/users/?$', 'list_users'),
+        ('POST', r'^/api/users/?$', 'create_user'),
+        ('GET', r'^/api/projects/?$', 'list_projects'),
+        ('POST', r'^/api/projects/?$', 'create_project'),
+        ('GET', r'^/api/projects/(\d+)/?$', 'get_project'),
+        ('DELETE', r'^/api/projects/(\d+)/?$', 'delete_project'),
+        ('POST', r'^/api/projects/(\d+)/import/?$', 'import_tasks'),
+        ('GET', r'^/api/projects/(\d+)/export/?$', 'export'),
+        ('DELETE', r'^/api/projects/(\d+)/tasks/?$', 'delete_all_tasks'),
+        ('GET', r'^/api/tasks/?$', 'list_tasks'),
+        ('PATCH', r'^/api/tasks/(\d+)/?$', 'update_task'),
+        ('DELETE', r'^/api/tasks/(\d+)/?$', 'delete_task'),
+        ('POST', r'^/api/dm/actions/?$', 'action'),
+        ('POST', r'^/_bench/seed/?$', 'bench_seed'),
+        ('GET', r'^/_bench/stats/?$', 'bench_stats'),
+        ('POST', r'^/_bench/reset/?$', 'bench_reset'),
+    ]
+    COMPILED = [(method, re.compile(pattern), name) for method, pattern, name in ROUTES]
+
+    def log_message(self, format, *args):
+        pass  # sin log por request: distorsionaría la medición
+
+    # --- utilidades ------------------------------------------------------
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send_json(self, status, payload, endpoint):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        self.state.count(endpoint, self._bytes_in, len(body))
+
+    def simulate_latency(self, items=0):
+        options = self.state.options
+        delay = options.latency_ms / 1000.0
+        if options.jitter_ms:
+            delay += random.uniform(-options.jitter_ms, options.jitter_ms) / 1000.0
+        delay += items * options.per_task_us / 1e6
+        if delay > 0:
+            time.sleep(delay)
+
+    # --- despacho --------------------------------------------------------
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.query_lists = parse_qs(url.query)
+        body = self.read_body()
+        self._bytes_in = len(body)
+        for route_method, pattern, name in self.COMPILED:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self.send_json(404, {"detail": "Not found"}, f"{method} {url.path}")
+
+        if not name.startswith('bench_'):
+            if not self.headers.get('Authorization'):
+                return self.send_json(401, {"detail": "Authentication credentials were not provided."}, name)
+            if not self.state.limiter.allow():
+                with self.state.stats_lock:
+                    self.state.stats["rate_limited"] += 1
+                return self.send_json(429, {"detail": "Request was throttled."}, name)
+            if self.state.options.error_rate and random.random() < self.state.options.error_rate:
+                with self.state.stats_lock:
+                    self.state.stats["injected_errors"] += 1
+                self.simulate_latency()
+                return self.send_json(503, {"detail": "Service temporarily unavailable (inyectado)"}, name)
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            return self.send_json(400, {"detail": "JSON inválido"}, name)
+        return getattr(self, name)(payload, *match.groups())
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def project_or_404(self, project_id, endpoint):
+        project = self.state.projects.get(int(project_id))
+        if project is None:
+            self.send_json(404, {"detail": "Not found."}, endpoint)
+        return project
+
+    # --- usuarios --------------------------------------------------------
+
+    def whoami(self, payload):
+        self.simulate_latency()
+        self.send_json(200, self.state.users[1], 'whoami')
+
+    def list_users(self, payload):
+        self.simulate_latency()
+        self.send_json(200, list(self.state.users.values()), 'list_users')
+
+    def create_user(self, payload):
+        self.simulate_latency()
+        payload = payload or {}
+        with self.state.lock:
+            user_id = max(self.state.users) + 1
+            user = {"id": user_id, "email": payload.get("email"), "username": payload.get("username"),
+                    "first_name": payload.get("first_name", ""), "last_name": payload.get("last_name", "")}
+            self.state.users[user_id] = user
+        self.send_json(201, user, 'create_user')
+
+    # --- proyectos -------------------------------------------------------
+
+    def list_projects(self, payload):
+        self.simulate_latency()
+        page = int(self.query.get('page', 1))
+        page_size = int(self.query.get('page_size', 100))
+        projects = sorted(self.state.projects.values(), key=lambda p: p["id"])
+        chunk = projects[(page - 1) * page_size: page * page_size]
+        self.send_json(200, {
+            "count": len(projects), "next": None, "previous": None,
+            "results": [self.state.project_summary(project) for project in chunk],
+        }, 'list_projects')
+
+    def create_project(self, payload):
+        self.simulate_latency()
+        payload = payload or {}
+        project = self.state.create_project(payload.get("title") or "Sin título",
+                                            payload.get("label_config") or "<View></View>")
+        self.send_json(201, self.state.project_summary(project), 'create_project')
+
+    def get_project(self, payload, project_id):
+        project = self.project_or_404(project_id, 'get_project')
+        if project:
+            self.simulate_latency()
+            self.send_json(200, self.state.project_summary(project), 'get_project')
+
+    def delete_project(self, payload, project_id):
+        project = self.project_or_404(project_id, 'delete_project')
+        if project:
+            # El borrado en cascada cuesta proporcional a las tasks del proyecto
+            self.simulate_latency(len(project["tasks"]))
+            with self.state.lock:
+                self.state.projects.pop(project["id"], None)
+            self.send_json(204, None, 'delete_project')
+
+    def import_tasks(self, payload, project_id):
+        options = self.state.options
+        if options.max_payload_mb and self._bytes_in > options.max_payload_mb * 1024 * 1024:
+            return self.send_json(413, {"detail": "Request entity too large"}, 'import_tasks')
+        project = self.project_or_404(project_id, 'import_tasks')
+        if not project:
+            return
+        if not isinstance(payload, list):
+            return self.send_json(400, {"detail": "Se esperaba una lista de tasks"}, 'import_tasks')
+        started = time.monotonic()
+        self.simulate_latency(len(payload))
+        count = self.state.add_tasks(project, payload)
+        self.send_json(201, {
+            "task_count": count, "annotation_count": 0, "prediction_count": 0,
+            "duration": time.monotonic() - started, "file_upload_ids": [],
+            "could_be_tasks_list": False, "found_formats": [], "data_columns": [],
+        }, 'import_tasks')
+
+    def export(self, payload, project_id):
+        project = self.project_or_404(project_id, 'export')
+        if not project:
+            return
+        ids = self.query_lists.get('ids[]')
+        if ids:
+            task_ids = [int(task_id) for task_id in ids]
+        elif self.query.get('download_all_tasks') == 'true' or project["annotations_per_task"]:
+            task_ids = list(self.state.ordered_ids(project))
+        else:
+            task_ids = []  # sin anotaciones no hay tasks "etiquetadas" que exportar
+        self.simulate_latency()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        sent = 0
+        buffer = [b'[']
+        size = 1
+        first = True
+        for task_id in task_ids:
+            task = project["tasks"].get(task_id)
+            if task is None:
+                continue
+            piece = (b'' if first else b',') + json.dumps(
+                self.state.task_view(project, task, with_annotations=True), ensure_ascii=False
+            ).encode('utf-8')
+            first = False
+            buffer.append(piece)
+            size += len(piece)
+            if size >= 256 * 1024:
+                sent += self.write_chunk(b''.join(buffer))
+                buffer, size = [], 0
+        buffer.append(b']')
+        sent += self.write_chunk(b''.join(buffer))
+        self.wfile.write(b'0\r\n\r\n')
+        self.state.count('export', self._bytes_in, sent)
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        return len(data)
+
+    def delete_all_tasks(self, payload, project_id):
+        project = self.project_or_404(project_id, 'delete_all_tasks')
+        if project:
+            self.simulate_latency(len(project["tasks"]))
+            with self.state.lock:
+                project["tasks"] = {}
+                project["order"] = []
+                project["order_dirty"] = False
+            self.send_json(204, None, 'delete_all_tasks')
+
+    # --- tasks -----------------------------------------------------------
+
+    def list_tasks(self, payload):
+        project = self.project_or_404(self.query.get('project', 0), 'list_tasks')
+        if not project:
+            return
+        page = int(self.query.get('page', 1))
+        page_size = int(self.query.get('page_size', 100))
+        if self.state.options.max_page_size:
+            page_size = min(page_size, self.state.options.max_page_size)
+        include = [field for field in self.query.get('include', '').split(',') if field] or None
+        since = updated_after(self.query.get('query'))
+        ids = self.state.ordered_ids(project)
+        tasks = project["tasks"]
+        if since:
+            ids = [task_id for task_id in ids if task_id in tasks and tasks[task_id]["updated_at"] > since]
+        chunk = [tasks[task_id] for task_id in ids[(page - 1) * page_size: page * page_size] if task_id in tasks]
+        self.simulate_latency()
+        self.send_json(200, {
+            "tasks": [self.state.task_view(project, task, include) for task in chunk],
+            "total": len(tasks), "total_annotations": 0, "total_predictions": 0,
+        }, 'list_tasks')
+
+    def update_task(self, payload, task_id):
+        project, task = self.state.find_task(int(task_id))
+        if task is None:
+            return self.send_json(404, {"detail": "Not found."}, 'update_task')
+        self.simulate_latency(1)
+        if payload and "data" in payload:
+            task["data"] = payload["data"]
+        task["updated_at"] = now_iso()
+        self.send_json(200, self.state.task_view(project, task), 'update_task')
+
+    def delete_task(self, payload, task_id):
+        project, task = self.state.find_task(int(task_id))
+        if task is None:
+            return self.send_json(404, {"detail": "Not found."}, 'delete_task')
+        self.simulate_latency(1)
+        self.state.remove_tasks(project, [task["id"]])
+        self.send_json(204, None, 'delete_task')
+
+    def action(self, payload, *groups):
+        if self.state.options.disable_actions:
+            return self.send_json(404, {"detail": "Action not available"}, 'action')
+        if self.query.get('id') != 'delete_tasks':
+            return self.send_json(400, {"detail": "Solo se simula delete_tasks"}, 'action')
+        project = self.project_or_404(self.query.get('project', 0), 'action')
+        if not project:
+            return
+        selected = (payload or {}).get('selectedItems') or (payload or {}).get('selected_items') or {}
+        if selected.get('all'):
+            excluded = set(selected.get('excluded') or [])
+            task_ids = [task_id for task_id in self.state.ordered_ids(project) if task_id not in excluded]
+        else:
+            task_ids = selected.get('included') or []
+        self.simulate_latency(len(task_ids))
+        removed = self.state.remove_tasks(project, task_ids)
+        self.send_json(200, {"processed_items": removed, "detail": "Deleted " + str(removed) + " tasks"}, 'action')
+
+    # --- benchmark -------------------------------------------------------
+
+    def bench_seed(self, payload):
+        payload = payload or {}
+        project = self.state.create_project(payload.get("title") or "Benchmark",
+                                            annotations_per_task=int(payload.get("annotations_per_task", 0)))
+        total = int(payload.get("tasks", 0))
+        for start in range(0, total, 10000):
+            self.state.add_tasks(project, [synthetic_task(i) for i in range(start, min(total, start + 10000))])
+        self.send_json(201, self.state.project_summary(project), 'bench_seed')
+
+    def bench_stats(self, payload):
+        with self.state.stats_lock:
+            stats = json.loads(json.dumps(self.state.stats))
+        self.send_json(200, stats, 'bench_stats')
+
+    def bench_reset(self, payload):
+        self.state.reset_stats()
+        self.send_json(200, {"ok": True}, 'bench_reset')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Label Studio falso para benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="latencia base por request")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="variación uniforme +/- de la latencia")
+    parser.add_argument('--per-task-us', type=float, default=0.0,
+                        help="costo extra por task en import/update/delete (microsegundos)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fracción de requests con 503")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="requests/s antes de responder 429 (0 = sin límite)")
+    parser.add_argument('--max-payload-mb', type=float, default=0.0, help="tamaño máximo de un import (413)")
+    parser.add_argument('--max-page-size', type=int, default=0, help="tope de page_size en /api/tasks")
+    parser.add_argument('--disable-actions', action='store_true', help="responde 404 a /api/dm/actions")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    options = parse_args(argv)
+    Handler.state = FakeLabelStudio(options)
+    server = ThreadingHTTPServer((options.host, options.port), Handler)
+    server.daemon_threads = True
+    print(f"🧪 Label Studio falso en http://{options.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
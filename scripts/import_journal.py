@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Journal de importaciones reanudables.
+
+Cada importación (proyecto + contenido del data_source) tiene un archivo JSONL
+de solo-append en data/.import_journal/ donde se registra, por cada lote
+confirmado por Label Studio, el rango [start, end) de posiciones de la fuente.
+Si la importación se corta, al reanudarla se saltean los rangos ya
+confirmados y solo se envía lo que falta.
+"""
+
+import os
+import json
+import bisect
+import hashlib
+from datetime import datetime
+
+JOURNAL_DIRNAME = '.import_journal'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 del archivo leído en streaming"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def source_sha256(path):
+    """Hash del data_source: el del archivo, o el del contenido ya registrado en el manifest de un directorio de shards"""
+    if os.path.isdir(path):
+        from task_shards import read_manifest
+        return read_manifest(path)['sha256']
+    return file_sha256(path)
+
+
+class ImportJournal:
+    """
+    Rangos confirmados de una importación. Las líneas del archivo son:
+        {"project_id": ..., "source": ..., "sha256": ..., "started_at": ...}  (cabecera)
+        {"start": 0, "end": 500}                                              (lote confirmado)
+        {"completed_at": ...}                                                 (fin sin errores)
+    """
+
+    def __init__(self, data_dir, project_id, source_path, source_hash=None):
+        self.project_id = project_id
+        self.source_path = source_path
+        self.source_hash = source_hash or source_sha256(source_path)
+        self.path = os.path.join(
+            data_dir, JOURNAL_DIRNAME, f"project_{project_id}_{self.source_hash[:16]}.jsonl"
+        )
+        self.completed = False
+        self._starts = []  # rangos disjuntos y ordenados
+        self._ends = []
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # última línea cortada por un corte abrupto
+                if 'start' in entry and 'end' in entry:
+                    self._add_range(entry['start'], entry['end'])
+                elif 'completed_at' in entry:
+                    self.completed = True
+
+    def _add_range(self, start, end):
+        # Fusiona con los rangos vecinos que se solapan o tocan
+        i = bisect.bisect_left(self._ends, start)
+        j = bisect.bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def _append(self, entry):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @property
+    def committed_count(self):
+        return sum(end - start for start, end in zip(self._starts, self._ends))
+
+    def is_committed(self, index):
+        i = bisect.bisect_right(self._starts, index) - 1
+        return i >= 0 and index < self._ends[i]
+
+    def start(self):
+        """Inicia un journal nuevo (descarta el progreso anterior si lo había)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'project_id': self.project_id,
+                'source': self.source_path,
+                'sha256': self.source_hash,
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+            }, ensure_ascii=False) + '\n')
+        self._starts, self._ends = [], []
+        self.completed = False
+
+    def commit(self, start, end):
+        """Registra (con fsync) que las posiciones [start, end) de la fuente ya están resueltas"""
+        self._append({'start': start, 'end': end})
+        self._add_range(start, end)
+
+    def complete(self):
+        self._append({'completed_at': datetime.now().isoformat(timespec='seconds')})
+        self.completed = True
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Cliente de Label Studio compartido por los scripts.
+
+- Carga el .env una sola vez y resuelve el token (Legacy > Personal).
+- El SDK (label_studio_sdk) se importa recién cuando se pide el cliente, así
+  los scripts que solo usan datos cacheados o descargas HTTP arrancan rápido.
+- Un único pool de conexiones keep-alive (httpx para el SDK, requests para
+  las descargas directas), compartido entre hilos: menos handshakes TLS
+  contra Traefik.
+- Caché en disco con TTL de la lista de proyectos y de la verificación del
+  token, para que las corridas de cron no repitan esos round trips.
+- Cada request pasa por api_metrics (latencia, bytes, errores y reintentos
+  por endpoint), salvo con API_METRICS=0.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+from urllib.request import getproxies_environment, proxy_bypass_environment
+
+from dotenv import load_dotenv
+
+load_dotenv()
+load_dotenv(dotenv_path='/.env')  # ubicación del .env dentro del contenedor
+
+# Después del .env, así API_METRICS y API_METRICS_DIR se pueden definir ahí
+from api_metrics import API_METRICS, instrumented_adapter_class, instrumented_transport
+
+LABEL_STUDIO_URL = os.getenv('LABEL_STUDIO_URL', 'http://localhost:8080')
+LABEL_STUDIO_LEGACY_API_KEY = os.getenv('LABEL_STUDIO_LEGACY_API_KEY')
+LABEL_STUDIO_PERSONAL_API_KEY = os.getenv('LABEL_STUDIO_PERSONAL_API_KEY')
+
+LS_POOL_SIZE = int(os.getenv('LS_POOL_SIZE', '16'))
+LS_TIMEOUT = float(os.getenv('LS_TIMEOUT', '120'))
+LS_CACHE_DIR = os.getenv('LS_CACHE_DIR', '/tmp/label_studio_cache')
+LS_PROJECTS_TTL = int(os.getenv('LS_PROJECTS_TTL', '300'))
+LS_AUTH_TTL = int(os.getenv('LS_AUTH_TTL', '3600'))
+
+# Campos del proyecto que se guardan en la caché
+PROJECT_FIELDS = ('id', 'title', 'task_number', 'num_tasks_with_annotations', 'total_annotations_number',
+                  'created_at')
+
+_lock = threading.Lock()
+_client = None
+_http_session = None
+
+
+def get_api_key(verbose=False):
+    """Retorna (token, tipo) priorizando el Legacy Token; (None, None) si no hay ninguno"""
+    if LABEL_STUDIO_LEGACY_API_KEY:
+        if verbose:
+            print("Using Legacy Token (no expira, más confiable para scripts)")
+        return LABEL_STUDIO_LEGACY_API_KEY, "legacy"
+    if LABEL_STUDIO_PERSONAL_API_KEY:
+        if verbose:
+            print("Using Personal Access Token")
+        return LABEL_STUDIO_PERSONAL_API_KEY, "personal"
+    return None, None
+
+
+def require_credentials():
+    """Termina el script si falta la URL o el token en el .env"""
+    api_key, _ = get_api_key()
+    if not os.getenv('LABEL_STUDIO_URL') or not api_key:
+        print("❌ Error: LABEL_STUDIO_URL y LABEL_STUDIO_LEGACY_API_KEY (o LABEL_STUDIO_PERSONAL_API_KEY) "
+              "deben estar definidos en .env")
+        sys.exit(1)
+
+
+def environment_proxy(url):
+    """Proxy de HTTP(S)_PROXY / ALL_PROXY para 'url' (None si no hay o si NO_PROXY lo excluye)"""
+    parts = urlsplit(url)
+    if not parts.hostname or proxy_bypass_environment(parts.hostname):
+        return None
+    proxies = getproxies_environment()
+    return proxies.get(parts.scheme) or proxies.get('all')
+
+
+def get_client():
+    """Cliente del SDK (uno por proceso), creado e importado en el primer uso"""
+    global _client
+    with _lock:
+        if _client is None:
+            import httpx
+            from label_studio_sdk import LabelStudio
+
+            api_key, _ = get_api_key()
+            limits = httpx.Limits(
+                max_connections=LS_POOL_SIZE,
+                max_keepalive_connections=LS_POOL_SIZE,
+                keepalive_expiry=60,
+            )
+            # Con un transport explícito httpx ignora HTTP(S)_PROXY/NO_PROXY: el proxy se resuelve acá
+            transport = httpx.HTTPTransport(limits=limits, proxy=environment_proxy(LABEL_STUDIO_URL))
+            if API_METRICS:
+                transport = instrumented_transport(transport)
+            http_client = httpx.Client(timeout=LS_TIMEOUT, limits=limits, transport=transport, follow_redirects=True)
+            _client = LabelStudio(
+                base_url=LABEL_STUDIO_URL, api_key=api_key, httpx_client=http_client, timeout=LS_TIMEOUT
+            )
+        return _client
+
+
+def get_http_session(pool_size=LS_POOL_SIZE):
+    """
+    Sesión requests compartida (keep-alive) para llamadas HTTP directas a la
+    API, p. ej. las descargas de exportaciones en streaming.
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            api_key, token_type = get_api_key()
+            session = requests.Session()
+            adapter_class = instrumented_adapter_class() if API_METRICS else HTTPAdapter
+            adapter = adapter_class(pool_connections=1, pool_maxsize=max(1, pool_size))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            # Usar Authorization header correcto según el tipo de token
+            if token_type == "legacy":
+                session.headers['Authorization'] = f"Token {api_key}"
+            else:
+                session.headers['Authorization'] = f"Bearer {api_key}"
+            _http_session = session
+        return _http_session
+
+
+def _cache_path(name):
+    # La caché depende del servidor y del token (sin guardar el token)
+    api_key, _ = get_api_key()
+    scope = hashlib.sha256(f"{LABEL_STUDIO_URL}|{api_key}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(LS_CACHE_DIR, f"{name}_{scope}.json")
+
+
+def _read_cache(name, ttl):
+    path = _cache_path(name)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get('cached_at', 0) > ttl:
+        return None
+    return entry.get('value')
+
+
+def _write_cache(name, value):
+    path = _cache_path(name)
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'cached_at': time.time(), 'value': value}, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # sin caché en disco se sigue funcionando, solo que sin ahorro
+
+
+def invalidate_cache(name=None):
+    """Borra la caché de 'projects', 'whoami' o de ambas"""
+    for entry in ([name] if name else ['projects', 'whoami']):
+        try:
+            os.remove(_cache_path(entry))
+        except OSError:
+            pass
+
+
+def verify_auth(ttl=LS_AUTH_TTL):
+    """
+    Verifica el token con whoami (cacheado por 'ttl' segundos).
+    Retorna un objeto con username y email; relanza el error si falla.
+    """
+    cached = _read_cache('whoami', ttl)
+    if cached:
+        return SimpleNamespace(cached=True, **cached)
+    user = get_client().users.whoami()
+    value = {'username': user.username, 'email': user.email}
+    _write_cache('whoami', value)
+    return SimpleNamespace(cached=False, **value)
+
+
+def print_auth_error(error, token_type=None):
+    """Mensaje de ayuda ante un error de autenticación"""
+    print("❌ Error de autenticación:")
+    error_msg = str(error)
+    if "401" in error_msg or "blacklist" in error_msg.lower() or "invalid" in error_msg.lower():
+        print("   Token inválido o revocado")
+        print("\n   Soluciones:")
+        print("   1. Verifica que el token sea correcto en .env")
+        if token_type == "personal":
+            print("   2. Los Personal Tokens expiran, regenera uno nuevo")
+        print("   3. Ve a Label Studio > Account & Settings > API Tokens")
+        print("   4. Copia el token correcto a tu .env\n")
+    else:
+        print(f"   {error}")
+        print("\n   Verifica que Label Studio esté ejecutándose\n")
+
+
+def list_tasks_page(client, params):
+    """
+    Una página de GET /api/tasks/ (lista de tasks con atributos). Si el SDK
+    expone su cliente HTTP interno, el request va por ese transporte (mismo
+    pool y autenticación) pero sin armar los modelos pydantic de cada task:
+    con 1000 tasks por página eso cuesta ~50 veces más que el propio round
+    trip. Si no (otra versión del SDK), se usa client.tasks.list.
+    """
+    http_client = getattr(getattr(client, '_client_wrapper', None), 'httpx_client', None)
+    if not callable(getattr(http_client, 'request', None)):
+        return list(client.tasks.list(**params).items or [])
+    response = http_client.request('api/tasks/', method='GET', params=params)
+    if not 200 <= response.status_code < 300:
+        from label_studio_sdk.core.api_error import ApiError
+        raise ApiError(status_code=response.status_code, body=response.text[:500])
+    return [SimpleNamespace(**task) for task in response.json().get('tasks') or []]
+
+
+def list_projects(ttl=LS_PROJECTS_TTL, fresh=False):
+    """
+    Proyectos de Label Studio (id, title, task_number, ...) cacheados por 'ttl'
+    segundos. Con fresh=True se consulta siempre la API (p. ej. antes de borrar).
+    """
+    cached = None if fresh else _read_cache('projects', ttl)
+    if cached is None:
+        cached = [
+            {field: getattr(project, field, None) for field in PROJECT_FIELDS}
+            for project in get_client().projects.list()
+        ]
+        _write_cache('projects', cached)
+    return [SimpleNamespace(**project) for project in cached]
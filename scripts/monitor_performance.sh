@@ -90,6 +90,12 @@ MEM_PCT=$(free | grep Mem | awk '{print int(($3/$2) * 100)}')
 
 echo "$(date +%Y-%m-%d_%H:%M:%S),$ESTABLISHED,$RESPONSE_MS,$DB_SIZE_MB,$MEM_PCT" >> "$CSV_FILE"
 
+# 10. Serie temporal y detección de regresiones del tiempo de respuesta
+echo "" >> "$LOG_FILE"
+echo "--- Regresiones ---" >> "$LOG_FILE"
+/label-studio/.venv/bin/python3 /scripts/monitoring_store.py ingest >> "$LOG_FILE" 2>&1
+/label-studio/.venv/bin/python3 /scripts/monitoring_store.py regressions --alert >> "$LOG_FILE" 2>&1
+
 echo "" >> "$LOG_FILE"
 echo "✅ Monitoreo completado" >> "$LOG_FILE"
 echo "" >> "$LOG_FILE"
\ No newline at end of file
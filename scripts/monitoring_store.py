@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Serie temporal de los resúmenes de monitoreo (monitoring/summary_*.csv).
+
+El monitoreo horario deja una fila por hora en un CSV por día. Este script
+las carga en un almacén de arrays en /monitoring/.tsdb:
+
+    meta.json           columnas, puntos y hasta qué byte se leyó cada CSV
+    timestamps.i8       epoch (segundos, hora local del CSV) de cada punto
+    <columna>.f8        un float64 por punto (NaN si faltaba el valor)
+    rollup_<res>.npz    por columna: count, mean, min, max, p50, p95 y last
+                        por hora, día y semana (lunes)
+
+La ingesta es incremental: los CSV que no cambiaron de tamaño no se abren y
+de los que crecieron se lee solo lo nuevo (se retoma desde el offset
+guardado). Los rollups se recalculan solo desde el primer bucket afectado.
+
+Uso:
+    python3 monitoring_store.py ingest
+    python3 monitoring_store.py query response_ms --since 7d --p 50,95,99
+    python3 monitoring_store.py rollup response_ms --by day --since 30d
+    python3 monitoring_store.py regressions [--history] [--alert]
+    python3 monitoring_store.py growth db_size_mb --since 60d
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+MONITORING_DIR = os.getenv('MONITORING_DIR', '/monitoring')
+MONITORING_STORE_DIR = os.getenv('MONITORING_STORE_DIR', os.path.join(MONITORING_DIR, '.tsdb'))
+SUMMARY_PATTERN = 'summary_*.csv'
+TIMESTAMP_FORMAT = '%Y-%m-%d_%H:%M:%S'
+
+# Detección de regresiones del tiempo de respuesta
+REGRESSION_METRIC = 'response_ms'
+REGRESSION_RECENT_HOURS = int(os.getenv('REGRESSION_RECENT_HOURS', '24'))
+REGRESSION_BASELINE_DAYS = int(os.getenv('REGRESSION_BASELINE_DAYS', '7'))
+REGRESSION_FACTOR = float(os.getenv('REGRESSION_FACTOR', '1.5'))
+REGRESSION_MIN_DELTA_MS = float(os.getenv('REGRESSION_MIN_DELTA_MS', '20'))
+REGRESSION_MIN_SAMPLES = 6
+# Aceleración del crecimiento (p. ej. db_size_mb): crecimiento diario contra la mediana previa
+GROWTH_FACTOR = 2.0
+GROWTH_MIN_DELTA = 1.0
+
+HOUR = 3600
+DAY = 86400
+WEEK = 7 * DAY
+MONDAY_EPOCH = 4 * DAY  # 1970-01-05 fue lunes
+RESOLUTIONS = {'hour': HOUR, 'day': DAY, 'week': WEEK}
+ROLLUP_FIELDS = ('start', 'count', 'mean', 'min', 'max', 'p50', 'p95', 'last')
+
+
+def parse_timestamp(text):
+    """Timestamp del CSV a epoch; se guarda la hora local tal cual (como si fuera UTC)"""
+    return calendar.timegm(datetime.strptime(text.strip(), TIMESTAMP_FORMAT).timetuple())
+
+
+def format_epoch(epoch):
+    return datetime.utcfromtimestamp(int(epoch)).strftime('%Y-%m-%d %H:%M')
+
+
+def bucket_starts(timestamps, resolution):
+    size = RESOLUTIONS[resolution]
+    offset = MONDAY_EPOCH if resolution == 'week' else 0
+    return timestamps - (timestamps - offset) % size
+
+
+def parse_time_arg(text, now):
+    """'7d', '24h', '2w' (hacia atrás desde now) o 'YYYY-MM-DD[_HH:MM:SS]' a epoch"""
+    if not text:
+        return None
+    units = {'h': HOUR, 'd': DAY, 'w': WEEK}
+    if text[-1] in units and text[:-1].isdigit():
+        return now - int(text[:-1]) * units[text[-1]]
+    if len(text) == 10:
+        text += '_00:00:00'
+    return parse_timestamp(text)
+
+
+class MonitoringStore:
+    """Almacén en columnas (arrays binarios) de los summary_*.csv"""
+
+    def __init__(self, store_dir=MONITORING_STORE_DIR):
+        self.store_dir = store_dir
+        self.meta_path = os.path.join(store_dir, 'meta.json')
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            self.meta = {'version': 1, 'columns': [], 'points': 0, 'files': {}}
+        self._cache = {}
+
+    # --- Lectura ---
+
+    def _array_path(self, name, dtype):
+        return os.path.join(self.store_dir, f"{name}.{'i8' if dtype == np.int64 else 'f8'}")
+
+    def _load(self, name, dtype):
+        # Se lee solo lo confirmado en meta.json (una ingesta cortada puede dejar cola)
+        if name not in self._cache:
+            path = self._array_path(name, dtype)
+            points = self.meta['points']
+            if points and os.path.exists(path):
+                self._cache[name] = np.fromfile(path, dtype=dtype, count=points)
+            else:
+                self._cache[name] = np.empty(0, dtype=dtype)
+        return self._cache[name]
+
+    def timestamps(self):
+        return self._load('timestamps', np.int64)
+
+    def values(self, column):
+        if column not in self.meta['columns']:
+            raise KeyError(f"Columna desconocida: {column} (disponibles: {', '.join(self.meta['columns'])})")
+        return self._load(column, np.float64)
+
+    def window(self, column, since=None, until=None):
+        """(timestamps, valores) de la columna en [since, until)"""
+        timestamps = self.timestamps()
+        start = 0 if since is None else np.searchsorted(timestamps, since, side='left')
+        end = len(timestamps) if until is None else np.searchsorted(timestamps, until, side='left')
+        return timestamps[start:end], self.values(column)[start:end]
+
+    def percentiles(self, column, qs=(50, 95, 99), since=None, until=None):
+        """Percentiles de la columna en la ventana (ignorando NaN). Retorna {q: valor} y el n usado"""
+        _, values = self.window(column, since, until)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return {q: None for q in qs}, 0
+        return dict(zip(qs, np.percentile(values, qs).tolist())), len(values)
+
+    def rollup(self, column, resolution, since=None, until=None):
+        """Filas del rollup (dicts con ROLLUP_FIELDS) con start en [since, until)"""
+        path = os.path.join(self.store_dir, f"rollup_{resolution}.npz")
+        if not os.path.exists(path):
+            return []
+        with np.load(path) as data:
+            if f"{column}.start" not in data:
+                return []
+            columns = {field: data[f"{column}.{field}"] for field in ROLLUP_FIELDS}
+        mask = np.ones(len(columns['start']), dtype=bool)
+        if since is not None:
+            mask &= columns['start'] >= bucket_starts(np.int64(since), resolution)
+        if until is not None:
+            mask &= columns['start'] < until
+        return [
+            {field: columns[field][i].item() for field in ROLLUP_FIELDS}
+            for i in np.flatnonzero(mask)
+        ]
+
+    # --- Ingesta ---
+
+    def _pending_files(self, monitoring_dir):
+        """CSV nuevos o que crecieron, con el offset desde donde leer"""
+        pending = []
+        rebuild = False
+        for path in sorted(glob.glob(os.path.join(monitoring_dir, SUMMARY_PATTERN))):
+            name = os.path.basename(path)
+            size = os.path.getsize(path)
+            known = self.meta['files'].get(name)
+            if known and size == known['size']:
+                continue
+            if known and size < known['size']:
+                rebuild = True  # el archivo se reescribió: no se puede seguir desde el offset
+                break
+            pending.append((path, name, known))
+        return pending, rebuild
+
+    def _read_new_rows(self, path, known):
+        """Lee desde el offset guardado hasta la última línea completa"""
+        offset = known['offset'] if known else 0
+        header = known['header'] if known else None
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+        end = chunk.rfind(b'\n') + 1  # una fila a medio escribir queda para la próxima
+        rows = []
+        for line in chunk[:end].decode('utf-8', errors='replace').splitlines():
+            if not line.strip():
+                continue
+            fields = [field.strip() for field in line.split(',')]
+            if header is None:
+                header = fields
+                continue
+            rows.append(fields)
+        return rows, header, offset + end
+
+    def ingest(self, monitoring_dir=MONITORING_DIR):
+        """
+        Carga lo nuevo de los summary_*.csv. Retorna stats con files (leídos),
+        skipped (sin cambios), points (nuevos) y total.
+        """
+        pending, rebuild = self._pending_files(monitoring_dir)
+        if rebuild:
+            self.meta = {'version': 1, 'columns': [], 'points': 0, 'files': {}}
+            self._cache = {}
+            for path in glob.glob(os.path.join(self.store_dir, 'rollup_*.npz')):
+                os.remove(path)
+            pending, _ = self._pending_files(monitoring_dir)
+        stats = {'files': len(pending), 'skipped': len(self.meta['files']) - sum(1 for p in pending if p[2]),
+                 'points': 0, 'total': self.meta['points'], 'rebuilt': rebuild}
+        if not pending:
+            return stats
+
+        new_timestamps = []
+        new_columns = {}
+        files = dict(self.meta['files'])
+        for path, name, known in pending:
+            rows, header, offset = self._read_new_rows(path, known)
+            # size = lo leído: si quedó una fila a medias, la próxima corrida vuelve a abrirlo
+            files[name] = {'size': offset, 'offset': offset, 'header': header}
+            if not rows:
+                continue
+            for column in header[1:]:
+                new_columns.setdefault(column, [np.nan] * len(new_timestamps))
+            for fields in rows:
+                try:
+                    timestamp = parse_timestamp(fields[0])
+                except ValueError:
+                    continue  # fila corrupta
+                new_timestamps.append(timestamp)
+                for column, series in new_columns.items():
+                    index = header.index(column) if column in header else None
+                    value = fields[index] if index is not None and index < len(fields) else ''
+                    try:
+                        series.append(float(value) if value else np.nan)
+                    except ValueError:
+                        series.append(np.nan)
+
+        if new_timestamps:
+            self._append(np.array(new_timestamps, dtype=np.int64),
+                         {column: np.array(series, dtype=np.float64) for column, series in new_columns.items()})
+        self.meta['files'] = files
+        self._save_meta()
+        stats['points'] = len(new_timestamps)
+        stats['total'] = self.meta['points']
+        return stats
+
+    def _append(self, timestamps, columns):
+        os.makedirs(self.store_dir, exist_ok=True)
+        old_timestamps = self.timestamps()
+        points = len(old_timestamps)
+        for column in columns:
+            if column not in self.meta['columns']:
+                self.meta['columns'].append(column)
+                self._cache[column] = np.full(points, np.nan)
+                self._write_array(column, self._cache[column])
+        for column in self.meta['columns']:
+            columns.setdefault(column, np.full(len(timestamps), np.nan))
+
+        if points and timestamps.min() < old_timestamps[-1] or np.any(np.diff(timestamps) < 0):
+            # Llegaron puntos más viejos que los guardados: se reescribe todo ordenado
+            merged = np.concatenate([old_timestamps, timestamps])
+            order = np.argsort(merged, kind='stable')
+            self._cache['timestamps'] = merged[order]
+            self._write_array('timestamps', self._cache['timestamps'])
+            for column in self.meta['columns']:
+                self._cache[column] = np.concatenate([self.values(column), columns[column]])[order]
+                self._write_array(column, self._cache[column])
+            first_changed = timestamps.min()
+        else:
+            # Caso normal: se agrega al final de cada archivo
+            self._append_array('timestamps', timestamps, points, np.int64)
+            for column in self.meta['columns']:
+                self._append_array(column, columns[column], points, np.float64)
+            first_changed = timestamps[0]
+        self.meta['points'] = points + len(timestamps)
+        self._cache = {}
+        self._update_rollups(first_changed)
+
+    def _write_array(self, name, values):
+        path = self._array_path(name, values.dtype)
+        tmp_path = f"{path}.tmp"
+        values.tofile(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _append_array(self, name, values, points, dtype):
+        path = self._array_path(name, dtype)
+        with open(path, 'ab') as f:
+            f.truncate(points * np.dtype(dtype).itemsize)  # descarta una cola sin confirmar
+            values.astype(dtype).tofile(f)
+
+    def _save_meta(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    # --- Rollups ---
+
+    def _update_rollups(self, first_changed):
+        timestamps = self.timestamps()
+        for resolution in RESOLUTIONS:
+            path = os.path.join(self.store_dir, f"rollup_{resolution}.npz")
+            cutoff = bucket_starts(np.int64(first_changed), resolution)
+            previous = {}
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    previous = {key: data[key] for key in data.files}
+            start = np.searchsorted(timestamps, cutoff, side='left')
+            arrays = {}
+            for column in self.meta['columns']:
+                fresh = compute_rollup(timestamps[start:], self.values(column)[start:], resolution)
+                old_start = previous.get(f"{column}.start")
+                keep = old_start < cutoff if old_start is not None else None
+                for field in ROLLUP_FIELDS:
+                    old = previous.get(f"{column}.{field}")
+                    arrays[f"{column}.{field}"] = (
+                        np.concatenate([old[keep], fresh[field]]) if old is not None else fresh[field]
+                    )
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, path)
+
+
+def compute_rollup(timestamps, values, resolution):
+    """
+    Agrega (timestamps ordenados, valores) por bucket. Retorna un dict de
+    arrays con ROLLUP_FIELDS; los NaN no cuentan (un bucket sin valores
+    válidos no aparece).
+    """
+    valid = ~np.isnan(values)
+    timestamps, values = timestamps[valid], values[valid]
+    if not len(values):
+        return {field: np.empty(0, dtype=np.int64 if field in ('start', 'count') else np.float64)
+                for field in ROLLUP_FIELDS}
+    starts = bucket_starts(timestamps, resolution)
+    bucket_start, first, counts = np.unique(starts, return_index=True, return_counts=True)
+    sums = np.add.reduceat(values, first)
+    # Percentiles por bucket: se ordena por (bucket, valor) y se interpola dentro de cada grupo
+    sorted_values = values[np.lexsort((values, starts))]
+
+    def group_percentile(q):
+        position = first + (counts - 1) * q / 100.0
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, first + counts - 1)
+        weight = position - lower
+        return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+    return {
+        'start': bucket_start.astype(np.int64),
+        'count': counts.astype(np.int64),
+        'mean': sums / counts,
+        'min': np.minimum.reduceat(values, first),
+        'max': np.maximum.reduceat(values, first),
+        'p50': group_percentile(50),
+        'p95': group_percentile(95),
+        'last': values[first + counts - 1],
+    }
+
+
+def detect_regression(store, now, metric=REGRESSION_METRIC, recent_hours=REGRESSION_RECENT_HOURS,
+                      baseline_days=REGRESSION_BASELINE_DAYS, factor=REGRESSION_FACTOR,
+                      min_delta=REGRESSION_MIN_DELTA_MS):
+    """
+    Compara las últimas 'recent_hours' contra los 'baseline_days' anteriores.
+    Hay regresión si el p95 reciente supera factor × p95 base, la mediana
+    subió más de min_delta y el salto de la mediana es grande frente a la
+    dispersión habitual (MAD). Retorna un dict con las cifras y 'regression'.
+    """
+    recent_since = now - recent_hours * HOUR
+    baseline_since = recent_since - baseline_days * DAY
+    _, recent = store.window(metric, recent_since, now + 1)
+    _, baseline = store.window(metric, baseline_since, recent_since)
+    recent, baseline = recent[~np.isnan(recent)], baseline[~np.isnan(baseline)]
+    result = {'metric': metric, 'until': now, 'recent_n': len(recent), 'baseline_n': len(baseline),
+              'regression': False}
+    if len(recent) < REGRESSION_MIN_SAMPLES or len(baseline) < REGRESSION_MIN_SAMPLES:
+        return result
+    recent_p50, recent_p95 = np.percentile(recent, (50, 95))
+    baseline_p50, baseline_p95 = np.percentile(baseline, (50, 95))
+    mad = np.median(np.abs(baseline - baseline_p50)) * 1.4826 or 1.0
+    score = (recent_p50 - baseline_p50) / mad
+    result.update({
+        'recent_p50': float(recent_p50), 'recent_p95': float(recent_p95),
+        'baseline_p50': float(baseline_p50), 'baseline_p95': float(baseline_p95), 'score': float(score),
+        'regression': bool(recent_p95 >= factor * baseline_p95 and recent_p50 - baseline_p50 >= min_delta
+                           and score >= 3),
+    })
+    return result
+
+
+def regression_history(store, metric=REGRESSION_METRIC, since=None, until=None):
+    """Evalúa detect_regression al cierre de cada día; retorna los días con regresión"""
+    timestamps = store.timestamps()
+    if not len(timestamps):
+        return []
+    first = bucket_starts(np.int64(since if since is not None else timestamps[0]), 'day')
+    last = until if until is not None else int(timestamps[-1])
+    flagged = []
+    day_end = int(first) + DAY
+    while day_end <= last + DAY:
+        result = detect_regression(store, day_end - 1, metric=metric)
+        if result['regression']:
+            flagged.append(result)
+        day_end += DAY
+    return flagged
+
+
+def growth_acceleration(store, metric, since=None, until=None, factor=GROWTH_FACTOR,
+                        min_delta=GROWTH_MIN_DELTA):
+    """
+    Crecimiento diario de una métrica acumulativa (último valor del día menos
+    el del día anterior). Marca 'accelerating' los días que crecen más de
+    factor × la mediana de los 7 días previos.
+    """
+    rows = store.rollup(metric, 'day', since, until)
+    days = []
+    for previous, row in zip(rows, rows[1:]):
+        growth = row['last'] - previous['last']
+        history = [day['growth'] for day in days[-7:]]
+        baseline = float(np.median(history)) if history else None
+        accelerating = (baseline is not None and len(history) >= 3 and growth >= min_delta
+                        and growth > factor * max(baseline, 0))
+        days.append({'start': row['start'], 'last': row['last'], 'growth': growth,
+                     'baseline': baseline, 'accelerating': accelerating})
+    return days
+
+
+def _print_regression(result, log=print, alert=False):
+    prefix = '⚠️ ALERTA: ' if alert else '⚠️  '
+    log(f"{prefix}Regresión de {result['metric']} al {format_epoch(result['until'])}: "
+        f"p50 {result['baseline_p50']:.0f} -> {result['recent_p50']:.0f}ms, "
+        f"p95 {result['baseline_p95']:.0f} -> {result['recent_p95']:.0f}ms "
+        f"(últimas {REGRESSION_RECENT_HOURS}h contra {REGRESSION_BASELINE_DAYS} días previos)")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Serie temporal de monitoring/summary_*.csv')
+    parser.add_argument('command', choices=('ingest', 'query', 'rollup', 'regressions', 'growth'))
+    parser.add_argument('metric', nargs='?', default=REGRESSION_METRIC)
+    parser.add_argument('--since', help="7d, 24h, 2w o YYYY-MM-DD")
+    parser.add_argument('--until', help="7d, 24h, 2w o YYYY-MM-DD")
+    parser.add_argument('--p', default='50,95,99', help='Percentiles para query (default 50,95,99)')
+    parser.add_argument('--by', choices=tuple(RESOLUTIONS), default='day', help='Resolución del rollup')
+    parser.add_argument('--history', action='store_true', help='Regresiones día por día, no solo la actual')
+    parser.add_argument('--alert', action='store_true', help='Formato de alerta para los logs de monitoreo')
+    parser.add_argument('--dir', default=MONITORING_DIR, help='Directorio con los summary_*.csv')
+    args = parser.parse_args(argv)
+
+    # MONITORING_STORE_DIR manda siempre que esté definida; si no, el almacén va junto a los CSV leídos
+    store_dir = os.getenv('MONITORING_STORE_DIR') or (
+        MONITORING_STORE_DIR if args.dir == MONITORING_DIR else os.path.join(args.dir, '.tsdb'))
+    store = MonitoringStore(store_dir)
+    stats = store.ingest(args.dir)
+    if args.command == 'ingest':
+        rebuilt = ' (reconstruido)' if stats['rebuilt'] else ''
+        print(f"📥 {stats['points']} puntos nuevos de {stats['files']} archivos, "
+              f"{stats['skipped']} sin cambios; {stats['total']} en total{rebuilt}")
+        return 0
+    if not store.meta['points']:
+        print(f"❌ No hay datos en {args.dir}/{SUMMARY_PATTERN}")
+        return 1
+
+    # "Ahora" es el último punto: los CSV pueden venir de otra máquina o estar atrasados
+    now = int(store.timestamps()[-1])
+    since = parse_time_arg(args.since, now)
+    until = parse_time_arg(args.until, now)
+    try:
+        if args.command == 'query':
+            qs = [float(q) for q in args.p.split(',')]
+            values, n = store.percentiles(args.metric, qs, since, until)
+            window = f"{format_epoch(since) if since else 'inicio'} a {format_epoch(until) if until else 'fin'}"
+            print(f"📊 {args.metric} ({window}, {n} puntos)")
+            for q, value in values.items():
+                print(f"   p{q:g}: {'-' if value is None else f'{value:,.1f}'}")
+        elif args.command == 'rollup':
+            print(f"📊 {args.metric} por {args.by}")
+            print(f"{'Desde':<17} {'n':>4} {'media':>10} {'mín':>10} {'máx':>10} {'p50':>10} {'p95':>10}")
+            for row in store.rollup(args.metric, args.by, since, until):
+                print(f"{format_epoch(row['start']):<17} {row['count']:>4} {row['mean']:>10,.1f} {row['min']:>10,.1f} "
+                      f"{row['max']:>10,.1f} {row['p50']:>10,.1f} {row['p95']:>10,.1f}")
+        elif args.command == 'regressions':
+            results = regression_history(store, args.metric, since, until) if args.history \
+                else [detect_regression(store, now, metric=args.metric)]
+            flagged = [result for result in results if result['regression']]
+            for result in flagged:
+                _print_regression(result, alert=args.alert)
+            if not flagged and not args.alert:
+                print(f"✅ Sin regresiones de {args.metric}")
+            return 2 if flagged else 0
+        elif args.command == 'growth':
+            metric = args.metric if args.metric != REGRESSION_METRIC else 'db_size_mb'
+            print(f"📈 Crecimiento diario de {metric}")
+            for day in growth_acceleration(store, metric, since, until):
+                mark = '  ⚠️ acelera' if day['accelerating'] else ''
+                print(f"{format_epoch(day['start'])[:10]}  {day['last']:>10,.1f}  {day['growth']:>+10,.1f}{mark}")
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Borrado de proyectos en paralelo.
+
+Cada borrado de proyecto es caro en el servidor (arrastra tasks, anotaciones y
+predicciones en cascada), así que se limitan tanto los borrados en vuelo
+(TEARDOWN_CONCURRENCY) como el ritmo con un token bucket (TEARDOWN_RATE
+borrados por segundo, con ráfagas de hasta TEARDOWN_BURST). Opcionalmente
+cada proyecto se exporta antes a disco (en streaming, dentro del mismo
+worker); si la exportación falla ese proyecto no se borra.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from export_store import StreamingExportWriter
+from ls_client import LABEL_STUDIO_URL, get_http_session
+from task_import import IMPORT_MAX_RETRIES, backoff_delay, classify_error
+from task_pages import RETRYABLE_PAGE_ERRORS
+
+TEARDOWN_CONCURRENCY = int(os.getenv('TEARDOWN_CONCURRENCY', '4'))
+TEARDOWN_RATE = float(os.getenv('TEARDOWN_RATE', '2'))
+TEARDOWN_BURST = int(os.getenv('TEARDOWN_BURST', '4'))
+TEARDOWN_EXPORT_TIMEOUT = int(os.getenv('TEARDOWN_EXPORT_TIMEOUT', '600'))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class TokenBucket:
+    """Limitador de ritmo: 'rate' permisos por segundo con ráfagas de hasta 'burst'"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta obtener un permiso. Retorna los segundos esperados"""
+        if self.rate <= 0:
+            return 0.0  # sin límite
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def export_project(project_id, export_dir, timeout=TEARDOWN_EXPORT_TIMEOUT):
+    """
+    Exporta el proyecto completo (JSON, todas las tasks) a export_dir en
+    streaming. Retorna (ruta, bytes, None) o (None, 0, mensaje_error).
+    """
+    url = f"{LABEL_STUDIO_URL.rstrip('/')}/api/projects/{project_id}/export?exportType=JSON&download_all_tasks=true"
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(export_dir, f"project_{project_id}_{timestamp}.json")
+    try:
+        with get_http_session().get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                return None, 0, f"HTTP {response.status_code}: {response.text[:500]}"
+            with StreamingExportWriter(path) as writer:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    writer.write(chunk)
+                return writer.commit(), writer.bytes_in, None
+    except Exception as e:
+        return None, 0, str(e)
+
+
+def delete_project(client, project_id, max_retries=IMPORT_MAX_RETRIES):
+    """Borra el proyecto reintentando errores transitorios; un 404 cuenta como borrado"""
+    attempt = 0
+    while True:
+        try:
+            client.projects.delete(id=project_id)
+            return
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 404:
+                return
+            if classify_error(e) not in RETRYABLE_PAGE_ERRORS or attempt >= max_retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+def _teardown_one(client, project, bucket, export_dir):
+    result = {'project': project, 'export_path': None, 'export_bytes': 0, 'waited': 0.0,
+              'seconds': 0.0, 'error': None}
+    if export_dir:
+        path, n_bytes, error = export_project(project.id, export_dir)
+        if error:
+            result['error'] = f"exportación fallida, no se borra: {error}"
+            return result
+        result['export_path'], result['export_bytes'] = path, n_bytes
+    result['waited'] = bucket.acquire()
+    started = time.monotonic()
+    try:
+        delete_project(client, project.id)
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.monotonic() - started
+    return result
+
+
+def teardown_projects(client, projects, concurrency=TEARDOWN_CONCURRENCY, rate=TEARDOWN_RATE,
+                      burst=TEARDOWN_BURST, export_dir=None, log=print):
+    """
+    Exporta (si export_dir) y borra los proyectos en paralelo. Retorna stats
+    con deleted, failed (lista de (título, error)), exported, export_bytes,
+    tasks, seconds, delete_seconds (por proyecto) y waited (espera del limitador).
+    """
+    if export_dir:
+        os.makedirs(export_dir, exist_ok=True)
+    bucket = TokenBucket(rate, burst)
+    stats = {'deleted': 0, 'failed': [], 'exported': 0, 'export_bytes': 0, 'tasks': 0,
+             'seconds': 0.0, 'delete_seconds': [], 'waited': 0.0}
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(_teardown_one, client, project, bucket, export_dir) for project in projects]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            project = result['project']
+            if result['export_path']:
+                stats['exported'] += 1
+                stats['export_bytes'] += result['export_bytes']
+            stats['waited'] += result['waited']
+            if result['error']:
+                stats['failed'].append((project.title, result['error']))
+                log(f"[{done}/{len(futures)}] Error con el proyecto '{project.title}': {result['error']}")
+                continue
+            stats['deleted'] += 1
+            stats['tasks'] += getattr(project, 'task_number', 0) or 0
+            stats['delete_seconds'].append(result['seconds'])
+            log(f"[{done}/{len(futures)}] Proyecto '{project.title}' eliminado ({result['seconds']:.1f}s)")
+    stats['seconds'] = time.monotonic() - started
+    return stats
+
+
+def print_teardown_summary(stats, log=print):
+    """Resumen de tiempos y throughput del borrado"""
+    seconds = stats['seconds'] or 1e-9
+    durations = sorted(stats['delete_seconds'])
+    log("\nResumen del borrado:")
+    log(f"  Proyectos eliminados: {stats['deleted']} ({stats['tasks']:,} tasks)")
+    log(f"  Tiempo total:         {stats['seconds']:.1f}s ({stats['deleted'] / seconds:.2f} proyectos/s, "
+        f"{stats['tasks'] / seconds:,.0f} tasks/s)")
+    if durations:
+        median = durations[len(durations) // 2]
+        log(f"  Borrado por proyecto: mediana {median:.1f}s, máximo {durations[-1]:.1f}s")
+    if stats['waited']:
+        log(f"  Espera por límite de ritmo: {stats['waited']:.1f}s acumulados")
+    if stats['exported']:
+        log(f"  Exportados antes de borrar: {stats['exported']} ({stats['export_bytes'] / 1e6:,.1f} MB sin comprimir)")
+    if stats['failed']:
+        log(f"  Con errores: {len(stats['failed'])}")
+        for title, error in stats['failed']:
+            log(f"    - {title}: {error}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Deduplicación previa a la importación.
+
+Se recorren una vez las tasks existentes del proyecto y se guarda la huella
+(hash del 'data' normalizado) de cada una. Las filas del archivo cuya huella
+ya está se descartan antes de llamar a import_tasks. Para proyectos muy
+grandes las huellas van en un filtro de Bloom de tamaño fijo en lugar de un
+set de Python; como el filtro puede dar falsos positivos, las filas que
+descarta se guardan en un archivo de revisión (JSONL reimportable).
+
+Las filas repetidas dentro del mismo archivo solo se descartan con
+IMPORT_DEDUP_WITHIN_FILE=1, y se cuentan aparte.
+"""
+
+import os
+import json
+import math
+from datetime import datetime
+
+from task_pages import TASK_PAGE_SIZE, iter_tasks
+from task_upsert import data_fingerprint, task_data
+
+DEDUP_BLOOM_THRESHOLD = int(os.getenv('DEDUP_BLOOM_THRESHOLD', '2000000'))
+DEDUP_BLOOM_ERROR_RATE = float(os.getenv('DEDUP_BLOOM_ERROR_RATE', '0.000001'))
+IMPORT_DEDUP_WITHIN_FILE = os.getenv('IMPORT_DEDUP_WITHIN_FILE', '0') == '1'
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre huellas de 16 bytes (ya son hashes uniformes, así
+    que las k posiciones salen por doble hashing de sus dos mitades).
+    """
+
+    def __init__(self, capacity, error_rate=DEDUP_BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, fingerprint):
+        h1 = int.from_bytes(fingerprint[:8], 'little')
+        h2 = int.from_bytes(fingerprint[8:16], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, fingerprint):
+        for position in self._positions(fingerprint):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, fingerprint):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(fingerprint))
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+class TaskDeduplicator:
+    """
+    Huellas de las tasks ya presentes. Usar como task_filter de
+    import_tasks_in_batches: retorna False para las filas cuyo data ya existe
+    en el proyecto ('duplicates') y, con within_file=True, para las repetidas
+    dentro del mismo archivo ('repeated').
+
+    Con el filtro de Bloom un acierto puede ser un falso positivo: si se
+    indica 'review_path', esas filas se escriben ahí para poder revisarlas y
+    reimportarlas (con IMPORT_DEDUP=0).
+    """
+
+    def __init__(self, expected=0, bloom_threshold=DEDUP_BLOOM_THRESHOLD, within_file=IMPORT_DEDUP_WITHIN_FILE,
+                 review_path=None):
+        self.within_file = within_file
+        if expected > bloom_threshold:
+            # Margen para las filas nuevas que se agregan durante la importación
+            self.fingerprints = BloomFilter(expected * 2 if within_file else expected)
+            self.kind = 'bloom'
+        else:
+            self.fingerprints = set()
+            self.kind = 'set'
+        self.existing = 0
+        self.duplicates = 0
+        self.repeated = 0
+        self.review_path = review_path
+        self.reviewed = 0
+        self._review = None
+        # Huellas del archivo, aparte de las del proyecto para contar cada caso por separado
+        self._seen = set() if within_file else None
+
+    def add_existing(self, data):
+        self.fingerprints.add(data_fingerprint(data))
+        self.existing += 1
+
+    def __call__(self, row):
+        fingerprint = data_fingerprint(task_data(row))
+        if fingerprint in self.fingerprints:
+            self.duplicates += 1
+            if self.kind == 'bloom':
+                self._write_review(row)
+            return False
+        if self._seen is not None:
+            if fingerprint in self._seen:
+                self.repeated += 1
+                return False
+            self._seen.add(fingerprint)
+        return True
+
+    def _write_review(self, row):
+        if not self.review_path:
+            return
+        if self._review is None:
+            os.makedirs(os.path.dirname(self.review_path) or '.', exist_ok=True)
+            self._review = open(self.review_path, 'a', encoding='utf-8')
+        self._review.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.reviewed += 1
+
+    def close(self):
+        if self._review is not None:
+            self._review.close()
+            self._review = None
+
+    @property
+    def memory_bytes(self):
+        if self.kind == 'bloom':
+            return self.fingerprints.nbytes
+        return (len(self.fingerprints) + len(self._seen or ())) * 90  # aprox.: bytes de 16 + slot del set
+
+
+def dedup_review_path(data_dir, project_id):
+    """Archivo de revisión de los descartes del filtro de Bloom: data/dedup_review/project_<id>_<timestamp>.jsonl"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(data_dir, 'dedup_review', f"project_{project_id}_{timestamp}.jsonl")
+
+
+def load_project_fingerprints(client, project_id, page_size=TASK_PAGE_SIZE, review_path=None, log=print):
+    """Recorre las tasks del proyecto (solo el data) y arma el TaskDeduplicator"""
+    try:
+        expected = getattr(client.projects.get(id=project_id), 'task_number', 0) or 0
+    except Exception:
+        expected = 0
+    dedup = TaskDeduplicator(expected, review_path=review_path)
+    for task in iter_tasks(client, project_id, include=('data',), page_size=page_size):
+        dedup.add_existing(task.data or {})
+        if dedup.existing % 10000 == 0:
+            log(f"  🔍 {dedup.existing} tasks existentes revisadas...")
+    return dedup
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Borrado masivo de tasks.
+
+Las tasks a borrar se seleccionan por IDs/rangos ("1000-5000, 7, 9"), desde
+un archivo o por filtro (sin anotaciones, o con un campo de 'data' igual a un
+valor). Siempre se cruzan con los IDs reales del proyecto antes de borrar.
+El borrado usa la acción 'delete_tasks' del Data Manager en lotes de
+DELETE_CHUNK_SIZE IDs; si la acción no está disponible se cae a un pool de
+DELETE_CONCURRENCY borrados individuales en paralelo.
+"""
+
+import os
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from task_import import IMPORT_MAX_RETRIES, backoff_delay, classify_error
+from task_pages import RETRYABLE_PAGE_ERRORS, iter_tasks
+
+DELETE_CHUNK_SIZE = int(os.getenv('DELETE_CHUNK_SIZE', '1000'))
+DELETE_CONCURRENCY = int(os.getenv('DELETE_CONCURRENCY', '8'))
+# Máximo de IDs que puede expandir una lista de IDs/rangos (0 = sin límite)
+DELETE_MAX_IDS = int(os.getenv('DELETE_MAX_IDS', '1000000'))
+
+
+def parse_id_spec(text, max_ids=DELETE_MAX_IDS):
+    """
+    '1, 5-8,12' -> [1, 5, 6, 7, 8, 12] (ordenado y sin repetidos). ValueError
+    si hay basura o si los rangos suman más de 'max_ids' IDs (se valida antes
+    de expandirlos: un typo como 1-10000000000 no llega a armar la lista).
+    """
+    ranges = []
+    for part in text.replace('\n', ',').replace(' ', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+            if start > end:
+                raise ValueError(f"rango invertido: {part}")
+        else:
+            start = end = int(part)
+        ranges.append((start, end))
+    requested = sum(end - start + 1 for start, end in ranges)
+    if max_ids and requested > max_ids:
+        raise ValueError(f"se pidieron {requested:,} IDs, más que el máximo de {max_ids:,} (DELETE_MAX_IDS)")
+    ids = set()
+    for start, end in ranges:
+        ids.update(range(start, end + 1))
+    return sorted(ids)
+
+
+def read_id_file(path, max_ids=DELETE_MAX_IDS):
+    """IDs o rangos de un archivo de texto (uno o varios por línea; '#' inicia un comentario)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_id_spec(','.join(line.split('#', 1)[0] for line in f), max_ids=max_ids)
+
+
+def select_existing(client, project_id, ids):
+    """Separa los IDs pedidos en (existentes en el proyecto, no encontrados)"""
+    wanted = set(ids)
+    existing = []
+    for task in iter_tasks(client, project_id, include=('id',)):
+        if task.id in wanted:
+            existing.append(task.id)
+    found = set(existing)
+    return sorted(existing), sorted(wanted - found)
+
+
+def select_without_annotations(client, project_id):
+    """
+    IDs de las tasks sin anotaciones. Si la respuesta no trae
+    total_annotations se aborta con ValueError: tomarlo como 0 marcaría todas
+    las tasks para borrar.
+    """
+    selected = []
+    for task in iter_tasks(client, project_id, include=('id', 'total_annotations')):
+        total = getattr(task, 'total_annotations', None)
+        if total is None:
+            raise ValueError(f"la task {task.id} no trae 'total_annotations'; no se puede saber si tiene anotaciones")
+        if not total:
+            selected.append(task.id)
+    return selected
+
+
+def select_by_data_field(client, project_id, field, value):
+    """IDs de las tasks cuyo data[field] (como texto) es igual a 'value'"""
+    return [
+        task.id
+        for task in iter_tasks(client, project_id, include=('id', 'data'))
+        if field in (task.data or {}) and str(task.data[field]) == value
+    ]
+
+
+def _with_retries(call, max_retries=IMPORT_MAX_RETRIES):
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except Exception as e:
+            if classify_error(e) not in RETRYABLE_PAGE_ERRORS or attempt >= max_retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+def _delete_one(client, task_id):
+    try:
+        _with_retries(lambda: client.tasks.delete(id=task_id))
+        return task_id, None
+    except Exception as e:
+        if getattr(e, 'status_code', None) == 404:
+            return task_id, None  # ya no existe: el objetivo se cumplió
+        return task_id, e
+
+
+def delete_tasks_individually(client, task_ids, concurrency=DELETE_CONCURRENCY, log=print):
+    """Borra de a una task con 'concurrency' requests en vuelo. Retorna {task_id: error}"""
+    failures = {}
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(_delete_one, client, task_id) for task_id in task_ids]
+        for future in as_completed(futures):
+            task_id, error = future.result()
+            done += 1
+            if error is not None:
+                failures[task_id] = error
+            if done % 500 == 0 or done == len(task_ids):
+                log(f"  {done}/{len(task_ids)} procesadas ({len(failures)} con error)")
+    return failures
+
+
+def delete_tasks(client, project_id, task_ids, chunk_size=DELETE_CHUNK_SIZE,
+                 concurrency=DELETE_CONCURRENCY, log=print):
+    """
+    Borra las tasks indicadas del proyecto. Retorna stats con deleted, failed,
+    failures ({task_id: error}), seconds y mode ('bulk', 'individual' o 'mixed').
+    """
+    from label_studio_sdk.actions import ActionsCreateRequestSelectedItemsIncluded
+
+    started = time.monotonic()
+    task_ids = list(task_ids)
+    failures = {}
+    modes = set()
+    bulk_available = True
+    done = 0
+    for start in range(0, len(task_ids), max(1, chunk_size)):
+        chunk = task_ids[start:start + chunk_size]
+        if bulk_available:
+            try:
+                _with_retries(lambda: client.actions.create(
+                    id='delete_tasks',
+                    project=project_id,
+                    selected_items=ActionsCreateRequestSelectedItemsIncluded(all_=False, included=chunk),
+                ))
+                modes.add('bulk')
+                done += len(chunk)
+                log(f"  {done}/{len(task_ids)} tasks eliminadas")
+                continue
+            except Exception as e:
+                if getattr(e, 'status_code', None) not in (403, 404, 405):
+                    for task_id in chunk:
+                        failures[task_id] = e
+                    done += len(chunk)
+                    log(f"  Error en el lote {start}-{start + len(chunk)}: {e}")
+                    continue
+                bulk_available = False
+                log(f"  Accion masiva no disponible ({e}); se borra de a una task")
+        modes.add('individual')
+        failures.update(delete_tasks_individually(client, chunk, concurrency, log))
+        done += len(chunk)
+    return {
+        'deleted': len(task_ids) - len(failures),
+        'failed': len(failures),
+        'failures': failures,
+        'seconds': time.monotonic() - started,
+        'mode': modes.pop() if len(modes) == 1 else ('mixed' if modes else 'bulk'),
+    }
+
+
+def write_failure_report(data_dir, project_id, failures):
+    """
+    Guarda los IDs que fallaron (con su error como comentario) en un archivo
+    que se puede volver a pasar como lista de IDs. Retorna la ruta.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(data_dir, 'delete_failures', f"project_{project_id}_{timestamp}.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for task_id in sorted(failures):
+            error = str(failures[task_id]).replace('\n', ' ')[:200]
+            f.write(f"{task_id}  # {error}\n")
+    return path
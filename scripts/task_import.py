@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Importación de tasks a Label Studio por lotes.
+
+BatchPlanner dimensiona cada lote según los bytes serializados (para no
+chocar con los límites de tamaño de Traefik / Label Studio) y según la
+latencia observada: agranda el lote mientras el servidor responde rápido y lo
+achica ante timeouts, 413 o errores 5xx. Solo los lotes rechazados con 413 se
+reenvían partidos; tras un timeout el lote va al dead-letter porque el
+servidor pudo haberlo creado igual.
+
+import_tasks_in_batches() mantiene varios lotes en vuelo a la vez, reintenta
+los errores transitorios con backoff exponencial con jitter y deja los lotes
+que fallan definitivamente en un archivo dead-letter (JSONL reimportable).
+"""
+
+import os
+import json
+import time
+import random
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from task_sources import DEFAULT_BATCH_SIZE
+
+IMPORT_MAX_BATCH_BYTES = int(os.getenv('IMPORT_MAX_BATCH_BYTES', str(8 * 1024 * 1024)))
+IMPORT_MAX_BATCH_TASKS = int(os.getenv('IMPORT_MAX_BATCH_TASKS', '5000'))
+IMPORT_TARGET_LATENCY = float(os.getenv('IMPORT_TARGET_LATENCY', '5'))
+IMPORT_CONCURRENCY = int(os.getenv('IMPORT_CONCURRENCY', '4'))
+IMPORT_MAX_RETRIES = int(os.getenv('IMPORT_MAX_RETRIES', '5'))
+IMPORT_RETRY_BASE_DELAY = float(os.getenv('IMPORT_RETRY_BASE_DELAY', '1'))
+IMPORT_RETRY_MAX_DELAY = float(os.getenv('IMPORT_RETRY_MAX_DELAY', '60'))
+
+# Errores que se reintentan con el mismo lote: solo aquellos en que el lote no
+# llegó a procesarse (los 413 se resuelven partiendo el lote en
+# BatchPlanner.record_failure). Un 5xx distinto de 503, un timeout o una
+# conexión cortada a mitad de la respuesta pueden llegar después de que Label
+# Studio creó las tasks, y import_tasks no es idempotente: esos lotes van al
+# dead-letter.
+RETRYABLE_ERRORS = ('rate_limited', 'unavailable', 'connect')
+# Para requests idempotentes (GET, PATCH, DELETE) se reintenta cualquier error transitorio
+IDEMPOTENT_RETRYABLE_ERRORS = RETRYABLE_ERRORS + ('server', 'connection', 'timeout')
+
+
+def classify_error(error):
+    """
+    Clasifica un error de import_tasks: 'too_large' (413), 'rate_limited'
+    (429), 'unavailable' (503), 'server' (otros 5xx), 'connect' (no se pudo
+    conectar o esperar una conexión libre: el request no salió), 'timeout',
+    'connection' (conexión cortada después de enviar) u 'other'.
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code == 413:
+        return 'too_large'
+    if status_code == 429:
+        return 'rate_limited'
+    if status_code == 503:
+        return 'unavailable'
+    if status_code is not None and status_code >= 500:
+        return 'server'
+    error_type = type(error).__name__.lower()
+    if error_type in ('connecterror', 'connecttimeout', 'pooltimeout'):
+        return 'connect'
+    if 'timeout' in error_type or 'timed out' in str(error).lower():
+        return 'timeout'
+    if any(name in error_type for name in ('connect', 'network', 'protocol', 'readerror', 'writeerror')):
+        return 'connection'
+    return 'other'
+
+
+def backoff_delay(attempt, base=IMPORT_RETRY_BASE_DELAY, cap=IMPORT_RETRY_MAX_DELAY):
+    """Backoff exponencial con 'full jitter': uniforme entre 0 y base * 2^intento"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class BatchPlanner:
+    """
+    Arma lotes de tasks acotados por cantidad y por bytes, y ajusta la
+    cantidad según la latencia de cada respuesta.
+
+    batches() entrega tuplas (índices, lote, bytes) donde 'índices' son las
+    posiciones de cada task del lote en la fuente de datos. Entre el primer y
+    el último índice de un lote solo faltan posiciones omitidas por 'skip', así
+    que el rango [índices[0], índices[-1] + 1) queda resuelto con ese lote.
+    """
+
+    def __init__(self, initial_tasks=DEFAULT_BATCH_SIZE, max_bytes=IMPORT_MAX_BATCH_BYTES,
+                 target_latency=IMPORT_TARGET_LATENCY, min_tasks=1, max_tasks=IMPORT_MAX_BATCH_TASKS):
+        self.batch_tasks = max(min_tasks, min(initial_tasks, max_tasks))
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.min_tasks = min_tasks
+        self.max_tasks = max_tasks
+        self.read_count = 0
+        self.skipped_count = 0
+        # (índice, task, bytes, segmento): el segmento 0 es la lectura en orden de
+        # la fuente y cada lote reencolado recibe uno propio; no se mezclan en un lote
+        self._pending = deque()
+        self._segments = itertools.count(1)
+        self._iterator = None
+        self._skip = None
+
+    def _next_item(self):
+        if self._pending:
+            return self._pending.popleft()
+        if self._iterator is None:
+            return None
+        while True:
+            try:
+                index, task = next(self._iterator)
+            except StopIteration:
+                self._iterator = None
+                return None
+            self.read_count += 1
+            if self._skip is None or not self._skip(index, task):
+                break
+            self.skipped_count += 1
+        return index, task, len(json.dumps(task, ensure_ascii=False).encode('utf-8')), 0
+
+    def batches(self, tasks=None, skip=None):
+        """
+        Genera lotes a partir de 'tasks', omitiendo las tasks para las que
+        skip(índice, task) es verdadero. Puede volver a llamarse sin argumentos
+        para continuar con la misma fuente o con tasks reencoladas.
+        """
+        if tasks is not None:
+            self._iterator = enumerate(tasks)
+            self._skip = skip
+        while True:
+            indices, batch, batch_bytes, segment = [], [], 0, None
+            while len(batch) < self.batch_tasks:
+                item = self._next_item()
+                if item is None:
+                    break
+                index, task, size, item_segment = item
+                if batch and (batch_bytes + size > self.max_bytes or item_segment != segment):
+                    # No entra en este lote: vuelve al frente de la cola
+                    self._pending.appendleft(item)
+                    break
+                segment = item_segment
+                indices.append(index)
+                batch.append(task)
+                batch_bytes += size
+            if not batch:
+                return
+            yield indices, batch, batch_bytes
+
+    def record_success(self, n_tasks, n_bytes, seconds):
+        """Ajusta el tamaño del siguiente lote según la latencia obtenida"""
+        if seconds <= 0:
+            return
+        if seconds < self.target_latency * 0.5 and n_tasks >= self.batch_tasks:
+            self.batch_tasks = min(self.max_tasks, int(self.batch_tasks * 1.5) + 1)
+        elif seconds > self.target_latency:
+            scaled = int(n_tasks * self.target_latency / seconds)
+            self.batch_tasks = max(self.min_tasks, min(self.batch_tasks, scaled))
+
+    def record_failure(self, indices, batch, n_bytes, error):
+        """
+        Achica los lotes tras un error de tamaño/timeout/5xx. Solo un 413
+        reencola las tasks del lote (en lotes más chicos): el servidor lo
+        rechazó sin crear nada. Tras un timeout el lote pudo haberse creado
+        igual (import_tasks no es idempotente), así que no se reenvía.
+        Retorna True si el lote se reencoló.
+        """
+        kind = classify_error(error)
+        if kind == 'other':
+            return False
+
+        self.batch_tasks = max(self.min_tasks, min(self.batch_tasks, len(batch)) // 2)
+        if kind == 'too_large':
+            self.max_bytes = max(1, n_bytes // 2)
+
+        if kind == 'too_large' and len(batch) > 1:
+            segment = next(self._segments)
+            requeued = [
+                (index, task, len(json.dumps(task, ensure_ascii=False).encode('utf-8')), segment)
+                for index, task in zip(indices, batch)
+            ]
+            self._pending.extendleft(reversed(requeued))
+            return True
+        return False
+
+
+class DeadLetterFile:
+    """
+    Registro de lotes que fallaron definitivamente. Las tasks se escriben en
+    'path' (JSONL, se puede usar directamente como data_source para
+    reintentarlas) y el detalle del error en '<path>.errors.jsonl'.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.errors_path = os.path.splitext(path)[0] + '.errors.jsonl'
+        self.count = 0
+
+    def write(self, project_id, indices, batch, error):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for task in batch:
+                f.write(json.dumps(task, ensure_ascii=False) + '\n')
+        with open(self.errors_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'project_id': project_id,
+                'source_start': indices[0],
+                'source_end': indices[-1] + 1,
+                'tasks': len(batch),
+                'error': str(error)[:1000],
+                'error_type': classify_error(error),
+                'failed_at': datetime.now().isoformat(timespec='seconds'),
+            }, ensure_ascii=False) + '\n')
+        self.count += len(batch)
+
+
+def dead_letter_path(data_dir, project_id):
+    """Ruta del dead-letter de una importación: data/dead_letter/project_<id>_<timestamp>.jsonl"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(data_dir, 'dead_letter', f"project_{project_id}_{timestamp}.jsonl")
+
+
+def send_batch(client, project_id, batch, max_retries=IMPORT_MAX_RETRIES):
+    """
+    Envía un lote reintentando solo los errores en que el lote no se procesó
+    (429, 503, fallo al conectar). Retorna (ok, segundos_del_último_intento,
+    reintentos, error).
+    """
+    retries = 0
+    while True:
+        started = time.monotonic()
+        try:
+            client.projects.import_tasks(id=project_id, request=batch)
+            return True, time.monotonic() - started, retries, None
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            if classify_error(e) not in RETRYABLE_ERRORS or retries >= max_retries:
+                return False, elapsed, retries, e
+            time.sleep(backoff_delay(retries))
+            retries += 1
+
+
+def import_tasks_in_batches(client, project_id, source, planner=None, concurrency=IMPORT_CONCURRENCY,
+                            dead_letter_path=None, journal=None, task_filter=None, log=print):
+    """
+    Envía las tasks de 'source' con client.projects.import_tasks usando lotes
+    adaptativos y hasta 'concurrency' lotes en vuelo. Los lotes que fallan
+    tras los reintentos van a 'dead_letter_path' (si se indica).
+
+    Con un ImportJournal, cada lote confirmado queda registrado y las
+    posiciones ya confirmadas en una corrida anterior se omiten. Si se pasa
+    'task_filter', solo se envían las tasks para las que retorna True.
+    Retorna un dict con read, imported, skipped (ya confirmadas), filtered,
+    failed, retries, seconds, head (las dos primeras tasks enviadas) y
+    dead_letter_path.
+    """
+    planner = planner or BatchPlanner()
+    concurrency = max(1, concurrency)
+    dead_letter = DeadLetterFile(dead_letter_path) if dead_letter_path else None
+    stats = {'read': 0, 'imported': 0, 'skipped': 0, 'filtered': 0, 'failed': 0, 'retries': 0, 'seconds': 0.0,
+             'head': [], 'dead_letter_path': None}
+    in_flight = {}
+    batch_numbers = itertools.count(1)
+    started = time.monotonic()
+
+    def handle(future):
+        batch_number, indices, batch, n_bytes = in_flight.pop(future)
+        ok, elapsed, retries, error = future.result()
+        stats['retries'] += retries
+        retry_text = f" ({retries} reintentos)" if retries else ""
+
+        if not ok:
+            if planner.record_failure(indices, batch, n_bytes, error):
+                log(f"  ⚠️ Lote {batch_number}: {error} -> se reenvía en lotes de {planner.batch_tasks} tasks")
+                return
+            stats['failed'] += len(batch)
+            if dead_letter:
+                dead_letter.write(project_id, indices, batch, error)
+                stats['dead_letter_path'] = dead_letter.path
+                log(f"  ❌ Error en lote {batch_number}{retry_text}: {error} -> {len(batch)} tasks enviadas a dead-letter")
+            else:
+                log(f"  ❌ Error en lote {batch_number}{retry_text}: {error}")
+            if classify_error(error) in ('timeout', 'server', 'connection'):
+                log("     ℹ️ El lote pudo haberse creado igual: al reimportar el dead-letter con IMPORT_DEDUP=1 "
+                    "solo se envían las tasks que falten")
+            return
+
+        planner.record_success(len(batch), n_bytes, elapsed)
+        stats['imported'] += len(batch)
+        if journal:
+            journal.commit(indices[0], indices[-1] + 1)
+        rate = len(batch) / elapsed if elapsed > 0 else float('inf')
+        progress = getattr(source, 'progress', None)
+        progress_text = f" | archivo leído: {progress * 100:.1f}%" if progress is not None else ""
+        log(f"  ✅ Lote {batch_number}: {len(batch)} tasks ({n_bytes / 1024:.0f} KB) en {elapsed:.2f}s "
+            f"-> {rate:.0f} tasks/s{retry_text} | siguiente lote: {planner.batch_tasks} tasks{progress_text}")
+
+    committed = journal.is_committed if journal and journal.committed_count else None
+
+    def skip(index, task):
+        if committed and committed(index):
+            stats['skipped'] += 1
+            return True
+        if task_filter and not task_filter(task):
+            stats['filtered'] += 1
+            return True
+        return False
+
+    def wait_for_any():
+        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        for future in done:
+            handle(future)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        tasks = source
+        while True:
+            for indices, batch, n_bytes in planner.batches(tasks, skip):
+                tasks = None
+                if len(stats['head']) < 2:
+                    stats['head'].extend(batch[:2 - len(stats['head'])])
+                future = executor.submit(send_batch, client, project_id, batch)
+                in_flight[future] = (next(batch_numbers), indices, batch, n_bytes)
+                while len(in_flight) >= concurrency:
+                    wait_for_any()
+            tasks = None
+            if not in_flight:
+                break
+            # Al terminar un lote pueden reencolarse tasks: se vuelve a planificar
+            wait_for_any()
+
+    stats['read'] = planner.read_count
+    if journal and stats['failed'] == 0:
+        journal.complete()
+    stats['seconds'] = time.monotonic() - started
+    return stats
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Recorrido paginado de las tasks de un proyecto.
+
+- Pide solo los campos que el llamador necesita (include=id,data, ...) y
+  nunca anotaciones ni predicciones.
+- Trae una página por request con un page_size grande, así un proyecto de
+  100k tasks son ~100 round trips en lugar de miles.
+- Mientras se procesa una página ya se está descargando la siguiente en un
+  hilo aparte.
+- Las tasks se entregan de a una: la memoria queda acotada a dos páginas.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ls_client import list_tasks_page
+from task_import import IDEMPOTENT_RETRYABLE_ERRORS, IMPORT_MAX_RETRIES, backoff_delay, classify_error
+
+TASK_PAGE_SIZE = int(os.getenv('TASK_PAGE_SIZE', '1000'))
+TASK_PAGE_PREFETCH = os.getenv('TASK_PAGE_PREFETCH', '1') != '0'
+
+# Errores de lectura que vale la pena reintentar
+RETRYABLE_PAGE_ERRORS = IDEMPOTENT_RETRYABLE_ERRORS
+
+
+def fetch_task_page(client, project_id, page, page_size=TASK_PAGE_SIZE, include=None, query=None,
+                    only_annotated=None, max_retries=IMPORT_MAX_RETRIES):
+    """Una página de tasks (lista, vacía si la página ya no existe) reintentando errores transitorios"""
+    params = {
+        'project': project_id,
+        'fields': 'task_only',
+        'include': include,
+        'page': page,
+        'page_size': page_size,
+        'query': query,
+        'only_annotated': only_annotated,
+    }
+    params = {name: value for name, value in params.items() if value is not None}
+    attempt = 0
+    while True:
+        try:
+            return list_tasks_page(client, params)
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 404:
+                return []  # Label Studio responde 404 al pedir una página más allá del final
+            if classify_error(e) not in RETRYABLE_PAGE_ERRORS or attempt >= max_retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+def iter_tasks(client, project_id, include=('id', 'data'), page_size=TASK_PAGE_SIZE,
+               prefetch=TASK_PAGE_PREFETCH, query=None, only_annotated=None):
+    """
+    Itera las tasks del proyecto con solo los campos de 'include' (tupla o
+    string separado por comas; None = todos los campos de la task).
+    """
+    if include and not isinstance(include, str):
+        include = ','.join(include)
+
+    def fetch(page):
+        return fetch_task_page(client, project_id, page, page_size=page_size, include=include,
+                               query=query, only_annotated=only_annotated)
+
+    # El servidor puede recortar page_size: se corta al ver una página más
+    # corta que la mayor recibida, o una vacía.
+    largest = 0
+    if not prefetch:
+        page = 1
+        while True:
+            items = fetch(page)
+            largest = max(largest, len(items))
+            yield from items
+            if not items or len(items) < largest:
+                return
+            page += 1
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-pages') as pool:
+        page = 1
+        future = pool.submit(fetch, page)
+        while future is not None:
+            items = future.result()
+            largest = max(largest, len(items))
+            future = None
+            if items and len(items) >= largest:
+                page += 1
+                future = pool.submit(fetch, page)
+            yield from items
+
+
+def iter_task_ids(client, project_id, page_size=TASK_PAGE_SIZE, query=None):
+    """IDs de las tasks del proyecto (solo se descarga el campo id)"""
+    for task in iter_tasks(client, project_id, include=('id',), page_size=page_size, query=query):
+        yield task.id
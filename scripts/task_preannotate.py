@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Pre-anotación de tasks con un gazetteer de spans ya etiquetados.
+
+1. El gazetteer sale de los últimos snapshots exportados de cada proyecto
+   (exports/annotations/): cada texto etiquetado con INGREDIENTE o MARCA (o
+   las etiquetas de PREANNOTATE_LABELS) con su etiqueta más frecuente. Se
+   guarda en data/gazetteer.json y se reconstruye cuando cambian los snapshots.
+2. Los términos se compilan en un autómata Aho-Corasick (pyahocorasick si
+   está instalado, si no una implementación en Python). Cada texto se
+   recorre una sola vez, sin importar cuántos términos tenga el gazetteer.
+3. Los matches se agregan como 'predictions' de la task, con el mismo formato
+   de región que producen los anotadores en el control 'entities': xpath y
+   offsets dentro del HyperText (o start/end si el objeto es un Text).
+
+Para fuentes grandes el escaneo se reparte en procesos por lotes, con una
+ventana acotada de lotes en vuelo y preservando el orden de las tasks.
+
+Uso:
+    python3 task_preannotate.py build                       # arma data/gazetteer.json
+    python3 task_preannotate.py preview <archivo> <schema.xml> [n]
+"""
+
+import os
+import re
+import sys
+import json
+import uuid
+import hashlib
+import unicodedata
+from collections import deque
+from html.parser import HTMLParser
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+from export_store import open_export
+from export_retention import EXPORT_NAME_RE
+from task_sources import iter_batches
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GAZETTEER_EXPORT_DIR = os.getenv('GAZETTEER_EXPORT_DIR', os.path.join(BASE_DIR, 'exports', 'annotations'))
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', os.path.join(BASE_DIR, 'data', 'gazetteer.json'))
+PREANNOTATE_LABELS = [label.strip() for label in os.getenv('PREANNOTATE_LABELS', 'INGREDIENTE,MARCA').split(',')
+                      if label.strip()]
+# Un término entra al gazetteer si se etiquetó al menos N veces y su etiqueta
+# mayoritaria cubre esa fracción de las veces
+GAZETTEER_MIN_COUNT = int(os.getenv('GAZETTEER_MIN_COUNT', '2'))
+GAZETTEER_MIN_SHARE = float(os.getenv('GAZETTEER_MIN_SHARE', '0.6'))
+GAZETTEER_MIN_LENGTH = 3
+PREANNOTATE_WORKERS = int(os.getenv('PREANNOTATE_WORKERS', str(os.cpu_count() or 1)))
+PREANNOTATE_CHUNK = int(os.getenv('PREANNOTATE_CHUNK', '2000'))
+# Por debajo de este tamaño de archivo no vale la pena levantar procesos
+PREANNOTATE_PROCESS_MIN_BYTES = int(os.getenv('PREANNOTATE_PROCESS_MIN_BYTES', str(20 * 1024 * 1024)))
+
+_VARIABLE_RE = re.compile(r'\$(\w+)')
+_UNSAFE_HTML_RE = re.compile(r'<|&(#\d+|#x[0-9a-fA-F]+|\w+);')
+
+
+def normalize_term(text):
+    """Forma de comparación: minúsculas, espacios colapsados, misma longitud que el original"""
+    text = ' '.join(unicodedata.normalize('NFC', text).split())
+    lowered = text.lower()
+    return lowered if len(lowered) == len(text) else text
+
+
+def normalize_with_offsets(text):
+    """
+    normalize_term aplicado a un texto de la task, con el offset en 'text' de
+    cada carácter del resultado (para llevar los matches al texto original).
+    """
+    composed = unicodedata.normalize('NFC', text)
+    if len(composed) != len(text):
+        composed = text  # la composición movería los offsets: se compara sin ella
+    chars, offsets = [], []
+    space = None
+    for position, char in enumerate(composed):
+        if char.isspace():
+            if chars and space is None:
+                space = position
+            continue
+        if space is not None:
+            chars.append(' ')
+            offsets.append(space)
+            space = None
+        chars.append(char)
+        offsets.append(position)
+    normalized = ''.join(chars)
+    lowered = normalized.lower()
+    return (lowered if len(lowered) == len(normalized) else normalized), offsets
+
+
+# --- Gazetteer ---
+
+def latest_snapshots(export_dir=GAZETTEER_EXPORT_DIR):
+    """Último snapshot JSON completo (no delta) de cada proyecto"""
+    latest = {}
+    names = os.listdir(export_dir) if os.path.isdir(export_dir) else []
+    for name in names:
+        match = EXPORT_NAME_RE.match(name)
+        if not match or match.group('delta') or '.json' not in name:
+            continue
+        project_id = match.group('project_id')
+        if project_id not in latest or match.group('timestamp') > latest[project_id][0]:
+            latest[project_id] = (match.group('timestamp'), name)
+    return sorted(name for _, name in latest.values())
+
+
+def iter_snapshot_tasks(path):
+    with open_export(path, 'rb') as f:
+        if ijson is None:
+            yield from json.load(f)
+            return
+        yield from ijson.items(f, 'item', use_float=True)
+
+
+def build_gazetteer(export_dir=GAZETTEER_EXPORT_DIR, labels=None, min_count=GAZETTEER_MIN_COUNT,
+                    min_share=GAZETTEER_MIN_SHARE):
+    """
+    Cuenta las etiquetas de cada texto etiquetado en los últimos snapshots y
+    retorna el gazetteer {"terms": {término: {label, count, share}}, ...}.
+    """
+    labels = set(labels or PREANNOTATE_LABELS)
+    snapshots = latest_snapshots(export_dir)
+    counts = {}
+    for name in snapshots:
+        for task in iter_snapshot_tasks(os.path.join(export_dir, name)):
+            for annotation in task.get('annotations') or []:
+                if annotation.get('was_cancelled'):
+                    continue
+                for item in annotation.get('result') or []:
+                    if item.get('type') not in ('labels', 'hypertextlabels'):
+                        continue
+                    value = item.get('value') or {}
+                    text = normalize_term(value.get('text') or '')
+                    for label in value.get('labels') or value.get('hypertextlabels') or []:
+                        if len(text) >= GAZETTEER_MIN_LENGTH:
+                            by_label = counts.setdefault(text, {})
+                            by_label[label] = by_label.get(label, 0) + 1
+    terms = {}
+    for text, by_label in counts.items():
+        label, count = max(by_label.items(), key=lambda item: item[1])
+        total = sum(by_label.values())
+        if label in labels and count >= min_count and count / total >= min_share:
+            terms[text] = {'label': label, 'count': count, 'share': round(count / total, 3)}
+    return {'labels': sorted(labels), 'snapshots': snapshots, 'terms': terms}
+
+
+def load_gazetteer(export_dir=GAZETTEER_EXPORT_DIR, path=GAZETTEER_PATH, labels=None, log=print):
+    """Gazetteer guardado en 'path', reconstruido si cambiaron los snapshots o las etiquetas"""
+    labels = sorted(set(labels or PREANNOTATE_LABELS))
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('snapshots') == latest_snapshots(export_dir) and cached.get('labels') == labels:
+            return cached
+    except (OSError, ValueError):
+        pass
+    gazetteer = build_gazetteer(export_dir, labels)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(gazetteer, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log(f"⚠️ No se pudo guardar el gazetteer en {path}: {e}")
+    return gazetteer
+
+
+def gazetteer_version(gazetteer):
+    digest = hashlib.sha256(json.dumps(gazetteer['terms'], sort_keys=True).encode('utf-8')).hexdigest()
+    return f"gazetteer-{digest[:8]}"
+
+
+# --- Aho-Corasick ---
+
+class TermAutomaton:
+    """
+    Autómata Aho-Corasick sobre los términos (ya normalizados). find() retorna
+    los matches (start, end, término) que caen en límites de palabra, sin
+    solapamientos y prefiriendo el más largo que empieza primero.
+    """
+
+    def __init__(self, terms):
+        self.size = len(terms)
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for term in terms:
+                self._automaton.add_word(term, term)
+            if terms:
+                self._automaton.make_automaton()
+            return
+        self._automaton = None
+        # Nodo = (transiciones, falla, términos que terminan acá)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for term in terms:
+            node = 0
+            for char in term:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = nxt
+            self._output[node].append(term)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def _raw_matches(self, text):
+        if self._automaton is not None:
+            for end, term in self._automaton.iter(text):
+                yield end + 1 - len(term), end + 1, term
+            return
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for term in output[node]:
+                yield position + 1 - len(term), position + 1, term
+
+    def find(self, text):
+        if not self.size or not text:
+            return []
+        candidates = []
+        for start, end, term in self._raw_matches(text):
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            candidates.append((start, end, term))
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        selected, last_end = [], 0
+        for start, end, term in candidates:
+            if start >= last_end:
+                selected.append((start, end, term))
+                last_end = end
+        return selected
+
+
+# --- Layout del objeto etiquetado (HyperText / Text) ---
+
+class _TemplateParser(HTMLParser):
+    """Tokeniza la plantilla HTML del HyperText (con los $variables sin reemplazar)"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.events = []
+
+    def handle_starttag(self, tag, attrs):
+        self.events.append(('start', tag))
+
+    def handle_startendtag(self, tag, attrs):
+        self.events.append(('start', tag))
+        self.events.append(('end', tag))
+
+    def handle_endtag(self, tag):
+        self.events.append(('end', tag))
+
+    def handle_data(self, data):
+        self.events.append(('text', data))
+
+
+VOID_TAGS = {'br', 'hr', 'img', 'input', 'meta', 'link', 'wbr'}
+
+
+class TextLayout:
+    """
+    Dónde termina cada variable de la task dentro del objeto a etiquetar.
+    segments(data) retorna, por cada aparición de una variable, el texto y
+    cómo ubicarlo: xpath del nodo de texto, offset dentro del nodo y offset
+    global (code points, un <br> cuenta como un salto de línea).
+    """
+
+    def __init__(self, object_tag, value, labels_name, to_name):
+        self.kind = 'hypertext' if object_tag.lower() == 'hypertext' else 'text'
+        self.value = value
+        self.labels_name = labels_name
+        self.to_name = to_name
+        self.events = []
+        if self.kind == 'hypertext':
+            parser = _TemplateParser()
+            parser.feed(value)
+            parser.close()
+            self.events = parser.events
+        self.variables = _VARIABLE_RE.findall(value)
+
+    @classmethod
+    def from_label_config(cls, label_config, labels=None):
+        """Layout del primer <Labels> que incluye alguna de 'labels' (o el primero)"""
+        root = ET.fromstring(label_config)
+        objects = {element.get('name'): element for element in root.iter()
+                   if element.tag in ('HyperText', 'Text') and element.get('name')}
+        wanted = set(labels or [])
+        for element in root.iter('Labels'):
+            values = {label.get('value') for label in element.iter('Label')}
+            target = objects.get(element.get('toName'))
+            if target is not None and (not wanted or values & wanted):
+                return cls(target.tag, target.get('value') or '', element.get('name'), element.get('toName'))
+        raise ValueError("El label config no tiene un <Labels> sobre un <HyperText> o <Text>")
+
+    def segments(self, data):
+        if self.kind == 'text':
+            match = _VARIABLE_RE.fullmatch(self.value.strip())
+            text = data.get(match.group(1)) if match else None
+            return [{'text': text, 'global': 0}] if isinstance(text, str) else []
+        for name in self.variables:
+            if _UNSAFE_HTML_RE.search(str(data.get(name) or '')):
+                return []  # el HTML del valor cambiaría los nodos: no se puede ubicar
+        segments = []
+        stack = []           # [(tag, índice xpath, {tag: hijos vistos}, nodos de texto vistos)]
+        root_children = {}
+        global_offset = 0
+        for kind, payload in self.events:
+            if kind == 'start':
+                siblings = stack[-1][2] if stack else root_children
+                siblings[payload] = siblings.get(payload, 0) + 1
+                if payload == 'br':
+                    global_offset += 1
+                if payload not in VOID_TAGS:
+                    stack.append([payload, siblings[payload], {}, 0])
+            elif kind == 'end':
+                if stack and stack[-1][0] == payload:
+                    stack.pop()
+            else:
+                rendered, spans, cursor = [], [], 0
+                for part in re.split(r'(\$\w+)', payload):
+                    if part.startswith('$') and part[1:] in self.variables:
+                        value = str(data.get(part[1:]) if data.get(part[1:]) is not None else '')
+                        spans.append((cursor, value))
+                        part = value
+                    rendered.append(part)
+                    cursor += len(part)
+                text = ''.join(rendered)
+                if not text or not stack:
+                    global_offset += len(text)
+                    continue
+                stack[-1][3] += 1
+                xpath = ''.join(f"/{tag}[{index}]" for tag, index, _, _ in stack) + f"/text()[{stack[-1][3]}]"
+                for node_offset, value in spans:
+                    segments.append({'text': value, 'xpath': xpath, 'node_offset': node_offset,
+                                     'global': global_offset + node_offset})
+                global_offset += len(text)
+        return segments
+
+
+# --- Pre-anotación ---
+
+class Preannotator:
+    """Agrega predictions del gazetteer a las tasks (dict plano o {"data": ...})"""
+
+    def __init__(self, gazetteer, layout):
+        self.gazetteer = gazetteer
+        self.terms = gazetteer['terms']
+        self.layout = layout
+        self.model_version = gazetteer_version(gazetteer)
+        self.automaton = TermAutomaton(list(self.terms))
+
+    def regions(self, data):
+        regions = []
+        for segment in self.layout.segments(data):
+            original = segment['text']
+            normalized, offsets = normalize_with_offsets(original)
+            for start, end, term in self.automaton.find(normalized):
+                # Los términos no empiezan ni terminan en espacio: los extremos caen en caracteres reales
+                start, end = offsets[start], offsets[end - 1] + 1
+                entry = self.terms[term]
+                value = {'text': original[start:end], 'labels': [entry['label']]}
+                if self.layout.kind == 'hypertext':
+                    value.update({
+                        'start': segment['xpath'], 'end': segment['xpath'],
+                        'startOffset': segment['node_offset'] + start, 'endOffset': segment['node_offset'] + end,
+                        'globalOffsets': {'start': segment['global'] + start, 'end': segment['global'] + end},
+                    })
+                else:
+                    value.update({'start': start, 'end': end})
+                regions.append({
+                    'id': uuid.uuid4().hex[:10],
+                    'from_name': self.layout.labels_name,
+                    'to_name': self.layout.to_name,
+                    'type': 'labels',
+                    'score': entry['share'],
+                    'value': value,
+                })
+        return regions
+
+    def annotate(self, task):
+        """La task con la predicción agregada (la misma task si no hubo matches)"""
+        data = task['data'] if isinstance(task.get('data'), dict) else task
+        regions = self.regions(data)
+        if not regions:
+            return task
+        prediction = {
+            'model_version': self.model_version,
+            'score': round(sum(region['score'] for region in regions) / len(regions), 3),
+            'result': regions,
+        }
+        if data is task:
+            return {'data': task, 'predictions': [prediction]}
+        return dict(task, predictions=list(task.get('predictions') or []) + [prediction])
+
+
+_worker_annotator = None
+
+
+def _init_worker(gazetteer, layout_args):
+    global _worker_annotator
+    _worker_annotator = Preannotator(gazetteer, TextLayout(*layout_args))
+
+
+def _annotate_batch(batch):
+    return [_worker_annotator.annotate(task) for task in batch]
+
+
+class PreannotatedSource:
+    """
+    Envuelve una fuente de tasks (TaskSource) y entrega cada task con sus
+    predictions, en el mismo orden. Con workers > 1 el escaneo se hace en
+    procesos, con hasta 2 lotes por proceso en vuelo.
+    """
+
+    def __init__(self, source, annotator, workers=1, chunk_size=PREANNOTATE_CHUNK):
+        self.source = source
+        self.annotator = annotator
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.annotated = 0
+        self.regions = 0
+
+    @property
+    def progress(self):
+        return getattr(self.source, 'progress', None)
+
+    def _count(self, task):
+        predictions = task.get('predictions') if isinstance(task.get('data'), dict) else None
+        if predictions and predictions[-1].get('model_version') == self.annotator.model_version:
+            self.annotated += 1
+            self.regions += len(predictions[-1]['result'])
+        return task
+
+    def __iter__(self):
+        if self.workers == 1:
+            for task in self.source:
+                yield self._count(self.annotator.annotate(task))
+            return
+        layout = self.annotator.layout
+        layout_args = ('HyperText' if layout.kind == 'hypertext' else 'Text', layout.value,
+                       layout.labels_name, layout.to_name)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.annotator.gazetteer, layout_args)) as pool:
+            pending = deque()
+            for batch in iter_batches(self.source, self.chunk_size):
+                pending.append(pool.submit(_annotate_batch, batch))
+                while len(pending) >= self.workers * 2:
+                    for task in pending.popleft().result():
+                        yield self._count(task)
+            while pending:
+                for task in pending.popleft().result():
+                    yield self._count(task)
+
+
+def preannotate_source(source, label_config, export_dir=GAZETTEER_EXPORT_DIR, labels=None,
+                       workers=PREANNOTATE_WORKERS, log=print):
+    """
+    Arma el gazetteer y el layout del proyecto y retorna la fuente envuelta
+    (o None si no hay términos o el label config no tiene dónde ubicarlos).
+    """
+    gazetteer = load_gazetteer(export_dir, labels=labels, log=log)
+    if not gazetteer['terms']:
+        return None
+    try:
+        layout = TextLayout.from_label_config(label_config, gazetteer['labels'])
+    except (ValueError, ET.ParseError) as e:
+        log(f"⚠️ Sin pre-anotación: {e}")
+        return None
+    size = getattr(source, 'size', 0) or 0
+    workers = workers if size >= PREANNOTATE_PROCESS_MIN_BYTES else 1
+    annotator = Preannotator(gazetteer, layout)
+    log(f"🏷️ Pre-anotación: {len(gazetteer['terms'])} términos ({', '.join(gazetteer['labels'])}) "
+        f"de {len(gazetteer['snapshots'])} snapshots, {workers} proceso(s)")
+    return PreannotatedSource(source, annotator, workers=workers)
+
+
+def main(argv):
+    if not argv or argv[0] not in ('build', 'preview'):
+        print(__doc__)
+        return 1
+    if argv[0] == 'build':
+        gazetteer = load_gazetteer()
+        terms = sorted(gazetteer['terms'].items(), key=lambda item: -item[1]['count'])
+        print(f"📚 Gazetteer: {len(terms)} términos de {len(gazetteer['snapshots'])} snapshots -> {GAZETTEER_PATH}")
+        for term, entry in terms[:20]:
+            print(f"   {term:<30} {entry['label']:<12} {entry['count']:>5} ({entry['share']:.0%})")
+        return 0
+
+    from task_sources import TaskSource
+    if len(argv) < 3:
+        print("Uso: python3 task_preannotate.py preview <archivo> <schema.xml> [n]")
+        return 1
+    with open(argv[2], 'r', encoding='utf-8') as f:
+        label_config = f.read()
+    limit = int(argv[3]) if len(argv) > 3 else 5
+    source = preannotate_source(TaskSource(argv[1]), label_config, workers=1)
+    if source is None:
+        print("❌ No hay términos en el gazetteer (¿hay snapshots exportados?)")
+        return 1
+    shown = 0
+    for task in source:
+        if 'predictions' in task and shown < limit:
+            shown += 1
+            for region in task['predictions'][-1]['result']:
+                print(f"   {region['value']['labels'][0]:<12} {region['value']['text']!r}")
+            print('-' * 32)
+    print(f"✅ {source.annotated} tasks con pre-anotaciones ({source.regions} regiones)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Fuentes de datos particionadas (shards JSONL con índice de offsets).
+
+Un data_source monolítico (arreglo JSON o JSONL) se convierte a un
+directorio con:
+
+    manifest.json        total de tasks, sha256 del contenido y la lista de shards
+    shard_00000.jsonl    una task por línea (JSON compacto)
+    shard_00000.idx      offsets de inicio de cada línea: uint64 little-endian,
+                         count + 1 valores (el último es el tamaño del shard)
+
+El lector mapea en memoria shards e índices: la task i se obtiene con una
+búsqueda en la lista de shards y dos lecturas del índice, sin parsear nada
+más; un rango o un shard completo se leen línea a línea desde el offset
+inicial, con memoria acotada. Cada shard es además un JSONL válido, así que
+varios importadores pueden trabajar en paralelo sobre shards distintos
+usando cada archivo como data_source, y el directorio completo también sirve
+como data_source en projects_index.json.
+
+Uso:
+    python3 task_shards.py convert <origen.json|jsonl> <directorio> [--shard-tasks N] [--force]
+    python3 task_shards.py info <directorio>
+    python3 task_shards.py get <directorio> <i>
+    python3 task_shards.py range <directorio> <desde> <hasta>
+    python3 task_shards.py sample <directorio> <n> [--seed S]
+"""
+
+import os
+import sys
+import mmap
+import json
+import bisect
+import random
+import shutil
+import struct
+import hashlib
+from datetime import datetime
+
+from task_sources import TaskSource, TaskSourceError
+
+MANIFEST_NAME = 'manifest.json'
+SHARD_TASKS = int(os.getenv('SHARD_TASKS', '100000'))
+SHARD_MAX_BYTES = int(os.getenv('SHARD_MAX_BYTES', str(256 * 1024 * 1024)))
+OFFSET_FORMAT = '<Q'
+OFFSET_SIZE = struct.calcsize(OFFSET_FORMAT)
+
+
+def is_sharded(path):
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise TaskSourceError(f"No se pudo leer el manifest de {directory}: {e}")
+
+
+class _ShardWriter:
+    def __init__(self, directory, number, first):
+        self.name = f"shard_{number:05d}"
+        self.first = first
+        self.count = 0
+        self.bytes = 0
+        self.data = open(os.path.join(directory, f"{self.name}.jsonl"), 'wb')
+        self.index = open(os.path.join(directory, f"{self.name}.idx"), 'wb')
+
+    def write(self, line):
+        self.index.write(struct.pack(OFFSET_FORMAT, self.bytes))
+        self.data.write(line)
+        self.bytes += len(line)
+        self.count += 1
+
+    def close(self):
+        self.index.write(struct.pack(OFFSET_FORMAT, self.bytes))
+        for f in (self.data, self.index):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        return {'file': f"{self.name}.jsonl", 'index': f"{self.name}.idx",
+                'first': self.first, 'count': self.count, 'bytes': self.bytes}
+
+
+def convert_to_shards(source_path, out_dir, shard_tasks=SHARD_TASKS, shard_bytes=SHARD_MAX_BYTES,
+                      force=False, log=print):
+    """
+    Lee 'source_path' en streaming y escribe los shards en 'out_dir'. Se arma
+    en un directorio temporal y se publica con un rename, así un lector nunca
+    ve un conjunto a medio escribir. Retorna el manifest.
+    """
+    out_dir = out_dir.rstrip(os.sep)
+    if os.path.exists(out_dir) and not force:
+        raise FileExistsError(f"{out_dir} ya existe (usa --force para reemplazarlo)")
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    hasher = hashlib.sha256()
+    shards = []
+    writer = None
+    total = 0
+    try:
+        for task in TaskSource(source_path):
+            if not isinstance(task, dict):
+                raise TaskSourceError(f"La task {total} de {source_path} no es un objeto JSON")
+            line = json.dumps(task, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+            if writer and (writer.count >= shard_tasks or writer.bytes + len(line) > shard_bytes):
+                shards.append(writer.close())
+                writer = None
+            if writer is None:
+                writer = _ShardWriter(tmp_dir, len(shards), total)
+            writer.write(line)
+            hasher.update(line)
+            total += 1
+            if total % 100000 == 0:
+                log(f"  📦 {total:,} tasks en {len(shards) + 1} shards...")
+        if writer:
+            shards.append(writer.close())
+        manifest = {
+            'version': 1,
+            'source': os.path.basename(source_path),
+            'created_at': datetime.now().isoformat(),
+            'total': total,
+            'bytes': sum(shard['bytes'] for shard in shards),
+            'sha256': hasher.hexdigest(),
+            'shard_tasks': shard_tasks,
+            'shards': shards,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        if os.path.exists(out_dir):
+            old_dir = f"{out_dir}.old-{os.getpid()}"
+            os.replace(out_dir, old_dir)
+            os.replace(tmp_dir, out_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+class ShardedTasks:
+    """
+    Acceso aleatorio a un directorio de shards. Los mmap se abren al primer
+    uso de cada shard y se reabren en un proceso hijo (no se heredan).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = read_manifest(directory)
+        self.shards = self.manifest['shards']
+        self.total = self.manifest['total']
+        self.size = self.manifest['bytes']
+        self._firsts = [shard['first'] for shard in self.shards]
+        self._maps = {}
+        self._pid = os.getpid()
+
+    def __len__(self):
+        return self.total
+
+    def _open(self, number):
+        if self._pid != os.getpid():
+            self._maps, self._pid = {}, os.getpid()
+        maps = self._maps.get(number)
+        if maps is None:
+            shard = self.shards[number]
+            maps = []
+            for name in (shard['file'], shard['index']):
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    # Un shard vacío no se puede mapear
+                    maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size
+                                else b'')
+            maps = self._maps[number] = tuple(maps)
+        return maps
+
+    def locate(self, i):
+        """(shard, posición dentro del shard) de la task global i"""
+        if i < 0:
+            i += self.total
+        if not 0 <= i < self.total:
+            raise IndexError(f"Task {i} fuera de rango (0..{self.total - 1})")
+        number = bisect.bisect_right(self._firsts, i) - 1
+        return number, i - self.shards[number]['first']
+
+    def _offsets(self, number, start, stop):
+        _, index = self._open(number)
+        return (struct.unpack_from(OFFSET_FORMAT, index, start * OFFSET_SIZE)[0],
+                struct.unpack_from(OFFSET_FORMAT, index, stop * OFFSET_SIZE)[0])
+
+    def raw(self, i):
+        """Bytes de la línea de la task i (sin el salto de línea)"""
+        number, local = self.locate(i)
+        begin, end = self._offsets(number, local, local + 1)
+        return self._open(number)[0][begin:end - 1]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.total)
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            return list(self.range(start, stop))
+        return json.loads(self.raw(i))
+
+    def _raw_range(self, start, stop):
+        """
+        Bytes de cada línea de [start, stop) (sin el salto de línea). El
+        recorrido secuencial no usa el mmap (las páginas tocadas quedarían en
+        el RSS): se busca el offset inicial en el índice y se lee el shard
+        línea a línea con un archivo con buffer, así la memoria no depende del
+        tamaño del shard.
+        """
+        position = max(0, start)
+        stop = min(stop, self.total)
+        while position < stop:
+            number, local = self.locate(position)
+            shard = self.shards[number]
+            local_stop = min(shard['count'], stop - shard['first'])
+            begin, _ = self._offsets(number, local, local)
+            with open(os.path.join(self.directory, shard['file']), 'rb') as f:
+                f.seek(begin)
+                for _ in range(local_stop - local):
+                    yield f.readline().rstrip(b'\n')
+            position = shard['first'] + local_stop
+
+    def range(self, start, stop):
+        """Tasks [start, stop), leídas línea a línea desde el offset del índice"""
+        for line in self._raw_range(start, stop):
+            yield json.loads(line)
+
+    def shard(self, number):
+        """Todas las tasks del shard 'number'"""
+        shard = self.shards[number]
+        return self.range(shard['first'], shard['first'] + shard['count'])
+
+    def shard_path(self, number):
+        """Ruta del JSONL del shard (sirve como data_source de un importador aparte)"""
+        return os.path.join(self.directory, self.shards[number]['file'])
+
+    def __iter__(self):
+        return self.range(0, self.total)
+
+    def close(self):
+        for maps in self._maps.values():
+            for mapped in maps:
+                if isinstance(mapped, mmap.mmap):
+                    mapped.close()
+        self._maps = {}
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] not in ('convert', 'info', 'get', 'range', 'sample'):
+        print(__doc__)
+        return 1
+    command = argv[0]
+    if command == 'convert':
+        if len(argv) < 3:
+            print("Uso: python3 task_shards.py convert <origen> <directorio> [--shard-tasks N] [--force]")
+            return 1
+        shard_tasks = int(argv[argv.index('--shard-tasks') + 1]) if '--shard-tasks' in argv else SHARD_TASKS
+        try:
+            manifest = convert_to_shards(argv[1], argv[2], shard_tasks=shard_tasks, force='--force' in argv)
+        except (FileExistsError, TaskSourceError) as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"✅ {manifest['total']:,} tasks en {len(manifest['shards'])} shards -> {argv[2]} "
+              f"({manifest['bytes']:,} bytes)")
+        return 0
+
+    try:
+        tasks = ShardedTasks(argv[1])
+    except TaskSourceError as e:
+        print(f"❌ {e}")
+        return 1
+    if command == 'info':
+        manifest = tasks.manifest
+        print(f"📦 {manifest['source']}: {tasks.total:,} tasks, {tasks.size:,} bytes, sha256 {manifest['sha256'][:16]}")
+        for number, shard in enumerate(tasks.shards):
+            print(f"   {number:>4} {shard['file']}  tasks {shard['first']:,}..{shard['first'] + shard['count'] - 1:,}  "
+                  f"{shard['bytes']:,} bytes")
+    elif command == 'get':
+        print(json.dumps(tasks[int(argv[2])], ensure_ascii=False, indent=2))
+    elif command == 'range':
+        for task in tasks.range(int(argv[2]), int(argv[3])):
+            print(json.dumps(task, ensure_ascii=False))
+    elif command == 'sample':
+        rng = random.Random(int(argv[argv.index('--seed') + 1]) if '--seed' in argv else None)
+        n = min(int(argv[2]), tasks.total)
+        for i in sorted(rng.sample(range(tasks.total), n)):
+            sys.stdout.write(tasks.raw(i).decode('utf-8') + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
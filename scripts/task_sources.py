@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Lectura en streaming de las fuentes de datos (data_source) de los proyectos.
+
+Soporta un arreglo JSON de nivel superior ([{...}, {...}]) leído de forma
+incremental con ijson, archivos JSONL (una task por línea) y directorios de
+shards generados por task_shards.py (ver ese módulo). Las tasks se
+entregan en lotes, de modo que la memoria queda acotada por el tamaño del lote
+y no por el tamaño del archivo.
+"""
+
+import os
+import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson')
+DEFAULT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+
+
+class TaskSourceError(ValueError):
+    """El archivo de datos no tiene el formato esperado"""
+
+
+def detect_format(path):
+    """Retorna 'json' (arreglo), 'jsonl' o 'sharded' según la extensión y el primer carácter"""
+    if os.path.isdir(path):
+        if not os.path.isfile(os.path.join(path, 'manifest.json')):
+            raise TaskSourceError(f"El directorio de datos no tiene manifest.json (¿falta task_shards.py convert?): {path}")
+        return 'sharded'
+    with open(path, 'rb') as f:
+        head = f.read(4096).lstrip()
+        while not head:
+            chunk = f.read(4096)
+            if not chunk:
+                raise TaskSourceError(f"El archivo de datos está vacío: {path}")
+            head = chunk.lstrip()
+
+    if path.lower().endswith(JSONL_EXTENSIONS):
+        return 'jsonl'
+    if head.startswith(b'['):
+        return 'json'
+    if head.startswith(b'{') and not path.lower().endswith('.json'):
+        return 'jsonl'
+    raise TaskSourceError(f"El archivo de datos debe contener una lista de tasks (e.g., [...]): {path}")
+
+
+class TaskSource:
+    """
+    Iterador de tasks sobre un archivo de datos. 'progress' indica la fracción
+    del archivo ya leída (sirve para mostrar avance sin conocer el total).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = detect_format(path)
+        self._file = None
+        self._shards = None
+        self._shard_bytes = 0
+        if self.format == 'sharded':
+            from task_shards import ShardedTasks
+            self._shards = ShardedTasks(path)
+            self.size = self._shards.size
+        else:
+            self.size = os.path.getsize(path)
+
+    @property
+    def progress(self):
+        if self._shards is not None:
+            return min(1.0, self._shard_bytes / self.size) if self.size else 0.0
+        if not self._file or not self.size:
+            return 0.0
+        if self._file.closed:
+            return 1.0
+        return min(1.0, self._file.tell() / self.size)
+
+    def __iter__(self):
+        if self._shards is not None:
+            yield from self._iter_shards()
+            return
+        with open(self.path, 'rb') as f:
+            self._file = f
+            if self.format == 'jsonl':
+                yield from self._iter_jsonl(f)
+            else:
+                yield from self._iter_json_array(f)
+
+    def _iter_jsonl(self, f):
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                task = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise TaskSourceError(f"JSON inválido en la línea {line_number} de {self.path}: {e}")
+            if not isinstance(task, dict):
+                raise TaskSourceError(f"La línea {line_number} de {self.path} no es un objeto JSON")
+            yield task
+
+    def _iter_shards(self):
+        self._shard_bytes = 0
+        for number, shard in enumerate(self._shards.shards):
+            yield from self._shards.shard(number)
+            self._shard_bytes += shard['bytes']
+
+    def _iter_json_array(self, f):
+        if ijson is None:
+            # Sin ijson no hay parser incremental: se carga el archivo completo
+            print("⚠️  ijson no está instalado; el archivo se cargará completo en memoria")
+            try:
+                tasks = json.load(f)
+            except json.JSONDecodeError as e:
+                raise TaskSourceError(f"Error decodificando JSON en {self.path}: {e}")
+            yield from tasks
+            return
+        try:
+            # use_float: los números llegan como float (Decimal no es serializable)
+            for task in ijson.items(f, 'item', use_float=True):
+                yield task
+        except ijson.JSONError as e:
+            raise TaskSourceError(f"Error decodificando JSON en {self.path}: {str(e).splitlines()[0]}")
+
+
+def iter_batches(tasks, batch_size=DEFAULT_BATCH_SIZE):
+    """Agrupa un iterable de tasks en listas de hasta 'batch_size' elementos"""
+    batch = []
+    for task in tasks:
+        batch.append(task)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def count_tasks(path):
+    """Cuenta las tasks de un archivo recorriéndolo en streaming"""
+    if os.path.isdir(path):
+        from task_shards import read_manifest
+        return read_manifest(path)['total']  # el manifest ya tiene el total
+    return sum(1 for _ in TaskSource(path))
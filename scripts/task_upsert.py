@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Sincronización (upsert) de tasks existentes contra un archivo de datos.
+
+Cada fila del archivo se empareja con la task existente por una clave natural
+de su 'data' (p. ej. "sentence_id") o, si no hay clave, por el hash del
+contenido. Se indexan las tasks del proyecto una sola vez (clave -> id + hash
+de data) y solo se envían las filas cuyo 'data' cambió; las filas sin task
+se crean con el importador por lotes.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from task_import import (
+    IDEMPOTENT_RETRYABLE_ERRORS, IMPORT_MAX_RETRIES, backoff_delay, classify_error, import_tasks_in_batches
+)
+from task_pages import TASK_PAGE_SIZE, iter_tasks
+from task_sources import TaskSource
+
+UPSERT_KEY = os.getenv('UPSERT_KEY', '')
+UPSERT_CONCURRENCY = int(os.getenv('UPSERT_CONCURRENCY', '8'))
+
+
+def task_data(row):
+    """El 'data' de una fila del archivo (acepta {"data": {...}} o el dict plano)"""
+    if isinstance(row.get('data'), dict):
+        return row['data']
+    return row
+
+
+def data_fingerprint(data):
+    """Hash estable del 'data' normalizado (claves ordenadas, sin espacios)"""
+    normalized = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+
+def parse_key_fields(key):
+    """'sentence_id' o claves compuestas 'menu_id,label' -> lista de campos"""
+    return [field.strip() for field in (key or '').split(',') if field.strip()]
+
+
+def task_key(data, key_fields):
+    """
+    Clave de emparejamiento: los valores de 'key_fields' en 'data', o el hash
+    del contenido si no hay clave configurada. None si falta algún campo.
+    """
+    if not key_fields:
+        return data_fingerprint(data)
+    values = []
+    for field in key_fields:
+        if field not in data or data[field] is None:
+            return None
+        values.append(data[field])
+    return json.dumps(values, ensure_ascii=False)
+
+
+def build_task_index(client, project_id, key_fields, page_size=TASK_PAGE_SIZE, log=print):
+    """
+    Recorre las tasks del proyecto (solo id y data) y arma el índice
+    clave -> (task_id, hash de data). Retorna (índice, duplicadas, sin_clave).
+    """
+    index = {}
+    duplicates = missing_key = 0
+    tasks = iter_tasks(client, project_id, include=('id', 'data'), page_size=page_size)
+    for count, task in enumerate(tasks, start=1):
+        data = task.data or {}
+        key = task_key(data, key_fields)
+        if key is None:
+            missing_key += 1
+        elif key in index:
+            duplicates += 1  # se conserva la primera task con esa clave
+        else:
+            index[key] = (task.id, data_fingerprint(data))
+        if count % 10000 == 0:
+            log(f"  🔍 {count} tasks indexadas...")
+    return index, duplicates, missing_key
+
+
+def update_task(client, task_id, data, max_retries=IMPORT_MAX_RETRIES):
+    """Actualiza el 'data' de una task reintentando errores transitorios. Retorna el error o None"""
+    retries = 0
+    while True:
+        try:
+            client.tasks.update(id=task_id, data=data)
+            return None
+        except Exception as e:
+            if classify_error(e) not in IDEMPOTENT_RETRYABLE_ERRORS or retries >= max_retries:
+                return e
+            time.sleep(backoff_delay(retries))
+            retries += 1
+
+
+def upsert_tasks(client, project_id, source, key=UPSERT_KEY, concurrency=UPSERT_CONCURRENCY,
+                 create_missing=True, dead_letter_path=None, log=print):
+    """
+    Sincroniza 'source' con las tasks del proyecto: actualiza solo las filas
+    cuyo 'data' cambió (hasta 'concurrency' en vuelo) y crea las que no tienen
+    task (si create_missing). Retorna un dict con el resumen.
+    """
+    key_fields = parse_key_fields(key)
+    started = time.monotonic()
+    stats = {'read': 0, 'unchanged': 0, 'updated': 0, 'created': 0, 'failed': 0,
+             'missing_key': 0, 'repeated_in_file': 0, 'head': []}
+
+    log(f"🔍 Indexando tasks existentes por {'clave ' + ', '.join(key_fields) if key_fields else 'hash de contenido'}...")
+    index, duplicates, missing_key = build_task_index(client, project_id, key_fields, log=log)
+    log(f"  ✅ {len(index)} tasks indexadas"
+        + (f" ({duplicates} con clave repetida, se usa la primera)" if duplicates else "")
+        + (f" ({missing_key} sin la clave)" if missing_key else ""))
+
+    seen = set()
+    in_flight = {}
+    new_rows = None  # JSONL temporal con las filas a crear
+
+    def handle(future):
+        task_id = in_flight.pop(future)
+        error = future.result()
+        if error is None:
+            stats['updated'] += 1
+        else:
+            stats['failed'] += 1
+            log(f"  ❌ Error actualizando task {task_id}: {error}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for row in source:
+                stats['read'] += 1
+                if len(stats['head']) < 2:
+                    stats['head'].append(row)
+                data = task_data(row)
+                row_key = task_key(data, key_fields)
+                if row_key is None:
+                    stats['missing_key'] += 1
+                    continue
+                if row_key in seen:
+                    stats['repeated_in_file'] += 1
+                    continue
+                seen.add(row_key)
+
+                existing = index.get(row_key)
+                if existing is None:
+                    if create_missing:
+                        if new_rows is None:
+                            new_rows = tempfile.NamedTemporaryFile(
+                                'w', encoding='utf-8', suffix='.jsonl', delete=False
+                            )
+                        new_rows.write(json.dumps(row, ensure_ascii=False) + '\n')
+                    continue
+                task_id, fingerprint = existing
+                if fingerprint == data_fingerprint(data):
+                    stats['unchanged'] += 1
+                    continue
+
+                future = executor.submit(update_task, client, task_id, data)
+                in_flight[future] = task_id
+                while len(in_flight) >= concurrency:
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for done_future in done:
+                        handle(done_future)
+
+                if stats['read'] % 10000 == 0:
+                    log(f"  🔄 {stats['read']} filas revisadas: {stats['updated']} actualizadas, "
+                        f"{stats['unchanged']} sin cambios")
+
+            for future in list(in_flight):
+                future.result()
+                handle(future)
+
+        if new_rows is not None:
+            new_rows.close()
+            log("🚀 Creando tasks nuevas...")
+            created = import_tasks_in_batches(
+                client, project_id, TaskSource(new_rows.name), dead_letter_path=dead_letter_path, log=log
+            )
+            stats['created'] = created['imported']
+            stats['failed'] += created['failed']
+    finally:
+        if new_rows is not None:
+            new_rows.close()
+            os.remove(new_rows.name)
+
+    stats['not_in_file'] = sum(1 for row_key in index if row_key not in seen)
+    stats['seconds'] = time.monotonic() - started
+    return stats